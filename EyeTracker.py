@@ -1,50 +1,62 @@
-import cv2
-import numpy as np
-import math
-from collections import deque
-
-class EyeTracker:
-    def __init__(self, smooth_window=5):
-        # Standard Mediapipe FaceMesh eye landmark indices
-        self.right_eye_idx = [362, 385, 387, 263, 373, 380]
-        self.left_eye_idx = [33, 160, 158, 133, 153, 144]
-
-        # Smoothing buffer for EAR values
-        self.smooth_window = smooth_window
-        self.ear_history = deque(maxlen=smooth_window)
-
-    def euclidean_distance(self, p1, p2):
-        return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
-
-    def calculate_ear(self, image, landmarks):
-        h, w, _ = image.shape
-
-        def get_point(idx):
-            lm = landmarks[idx]
-            return int(lm.x * w), int(lm.y * h)
-
-        # Extract points for right eye
-        r_points = [get_point(idx) for idx in self.right_eye_idx]
-        # Extract points for left eye
-        l_points = [get_point(idx) for idx in self.left_eye_idx]
-
-        # EAR formula for right eye
-        rEAR = (self.euclidean_distance(r_points[1], r_points[5]) +
-                self.euclidean_distance(r_points[2], r_points[4])) / (2.0 * self.euclidean_distance(r_points[0], r_points[3]))
-
-        # EAR formula for left eye
-        lEAR = (self.euclidean_distance(l_points[1], l_points[5]) +
-                self.euclidean_distance(l_points[2], l_points[4])) / (2.0 * self.euclidean_distance(l_points[0], l_points[3]))
-
-        ear = (rEAR + lEAR) / 2.0
-
-        # Apply smoothing
-        self.ear_history.append(ear)
-        smoothed_ear = sum(self.ear_history) / len(self.ear_history)
-
-        return smoothed_ear, r_points, l_points
-
-    def draw_eye_boxes(self, image, r_points, l_points):
-        # Draw contours around both eyes using landmarks
-        cv2.polylines(image, [np.array(r_points, dtype=np.int32)], True, (0, 255, 255), 1, cv2.LINE_AA)
-        cv2.polylines(image, [np.array(l_points, dtype=np.int32)], True, (0, 255, 255), 1, cv2.LINE_AA)
+import cv2
+import numpy as np
+import math
+from collections import deque
+
+from landmark_array import landmarks_to_array, to_pixels, eye_aspect_ratio
+
+class EyeTracker:
+    def __init__(self, smooth_window=5):
+        # Standard Mediapipe FaceMesh eye landmark indices
+        self.right_eye_idx = [362, 385, 387, 263, 373, 380]
+        self.left_eye_idx = [33, 160, 158, 133, 153, 144]
+        # (2, 6) index array: gathers both eyes in one fancy-indexing step
+        self.eye_idx = np.array([self.right_eye_idx, self.left_eye_idx])
+        self.used_idx = sorted(set(self.right_eye_idx + self.left_eye_idx))
+        self._eye_flat_idx = self.right_eye_idx + self.left_eye_idx
+
+        # Smoothing buffer for EAR values
+        self.smooth_window = smooth_window
+        self.ear_history = deque(maxlen=smooth_window)
+
+    def euclidean_distance(self, p1, p2):
+        return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+
+    def calculate_ear(self, image, landmarks):
+        h, w = image.shape[:2]
+        points = landmarks_to_array(landmarks, self.used_idx)
+        return self.calculate_ear_from_array(points, w, h)
+
+    def calculate_ear_from_array(self, points, img_w, img_h):
+        """Smoothed EAR from an (N, 3) landmark array"""
+        # One face is 12 points: plain floats beat NumPy's per-call overhead
+        # here (calculate_ear_batch is the vectorised path)
+        coords = points[self._eye_flat_idx, :2].tolist()
+        pixels = [(int(x * img_w), int(y * img_h)) for x, y in coords]
+        r_points, l_points = pixels[:6], pixels[6:]
+        ear = (self._eye_ear(r_points) + self._eye_ear(l_points)) / 2.0
+
+        # Apply smoothing
+        self.ear_history.append(ear)
+        smoothed_ear = sum(self.ear_history) / len(self.ear_history)
+
+        return smoothed_ear, r_points, l_points
+
+    @staticmethod
+    def _eye_ear(p):
+        """EAR of one eye's six (x, y) points ordered p1..p6"""
+        return (math.dist(p[1], p[5]) + math.dist(p[2], p[4])) / (2.0 * math.dist(p[0], p[3]))
+
+    def reset_tracking(self):
+        """Forget the smoothing history (e.g. when another person is tracked)"""
+        self.ear_history.clear()
+
+    def calculate_ear_batch(self, points, img_w, img_h):
+        """Raw (unsmoothed) EAR for (..., N, 3) landmarks, e.g. (frames, faces, N, 3)"""
+        eyes = to_pixels(points[..., self.eye_idx, :], img_w, img_h)
+        return eye_aspect_ratio(eyes).mean(axis=-1)
+
+    def draw_eye_boxes(self, image, r_points, l_points):
+        # Draw contours around both eyes using landmarks
+        cv2.polylines(image, [np.array(r_points, dtype=np.int32)], True, (0, 255, 255), 1, cv2.LINE_AA)
+        cv2.polylines(image, [np.array(l_points, dtype=np.int32)], True, (0, 255, 255), 1, cv2.LINE_AA)
@@ -1,42 +1,175 @@
-import cv2
-import mediapipe as mp
-
-
-class FaceMeshDetector:
-    
-    
-    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5):
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence
-        )
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.drawing_spec = self.mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
-    
-    def detect_landmarks(self, image):
-        
-        # Convert BGR to RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        rgb_image.flags.writeable = False
-        
-        # Get results
-        results = self.face_mesh.process(rgb_image)
-        
-        # Convert back to BGR
-        rgb_image.flags.writeable = True
-        
-        return results
-    
-    def draw_landmarks(self, image, results):
-        
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                self.mp_drawing.draw_landmarks(
-                    image=image,
-                    landmark_list=face_landmarks,
-                    connections=self.mp_face_mesh.FACEMESH_CONTOURS,
-                    landmark_drawing_spec=self.drawing_spec,
-                    connection_drawing_spec=self.drawing_spec
-                )
+import cv2
+import mediapipe as mp
+
+
+class FaceMeshDetector:
+    
+    
+    def __init__(self, min_detection_confidence=0.5, min_tracking_confidence=0.5, static_image_mode=False,
+                 roi_tracking=False, redetect_interval=30, roi_margin=0.25, roi_max_size=256, max_num_faces=1):
+        self.mp_face_mesh = mp.solutions.face_mesh
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        # >1 for cabins with passengers; FaceTracker picks the driver
+        self.max_num_faces = max_num_faces
+        # static_image_mode=True turns off MediaPipe's frame-to-frame tracking,
+        # which is required when one instance is shared between several streams
+        self.face_mesh = self.mp_face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
+            max_num_faces=max_num_faces,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence
+        )
+        self.mp_drawing = mp.solutions.drawing_utils
+        self.drawing_spec = self.mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
+
+        # ROI tracking: run FaceMesh on a downsized crop around the previous
+        # face instead of the full frame, with a full pass every N frames
+        self.roi_tracking = roi_tracking
+        self.redetect_interval = redetect_interval
+        self.roi_margin = roi_margin        # padding around the face box (fraction of box size)
+        self.roi_max_size = roi_max_size    # longest side of the crop fed to FaceMesh
+        self.roi = None                     # (x0, y0, x1, y1) in pixels for the next frame
+        self.frames_since_full = 0
+        self._roi_face_mesh = None
+        self._last_faces = []               # faces of the last tracked frame, for follow()
+        self._last_size = None
+        self.stats = {"full": 0, "roi": 0, "roi_lost": 0}
+
+        # One reusable RGB buffer per FaceMesh graph (full frame / ROI crop)
+        self._rgb_buffers = {}
+
+    def _process(self, face_mesh, image):
+        # Convert BGR to RGB into the graph's buffer (MediaPipe copies the
+        # input, so it can be overwritten by the next frame)
+        rgb_image = self._rgb_buffers.get(id(face_mesh))
+        if rgb_image is None or rgb_image.shape != image.shape:
+            rgb_image = self._rgb_buffers[id(face_mesh)] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        else:
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb_image)
+        rgb_image.flags.writeable = False
+        
+        # Get results
+        results = face_mesh.process(rgb_image)
+        
+        # Convert back to BGR
+        rgb_image.flags.writeable = True
+        
+        return results
+
+    def detect_landmarks(self, image):
+        if self.roi_tracking:
+            return self._detect_tracked(image)
+        return self._process(self.face_mesh, image)
+
+    def _detect_tracked(self, image):
+        img_h, img_w = image.shape[:2]
+
+        if self.roi is None or self.frames_since_full >= self.redetect_interval:
+            results = self._detect_full(image)
+        else:
+            results = self._detect_roi(image)
+            if results is None:
+                # Face left the crop: fall back to a full pass on this frame
+                self.stats["roi_lost"] += 1
+                results = self._detect_full(image)
+
+        self._last_faces = results.multi_face_landmarks or []
+        self._last_size = (img_w, img_h)
+        # A lone face is the driver; with several, follow() picks the one to crop
+        self.roi = self._next_roi(self._last_faces[0], img_w, img_h) if len(self._last_faces) == 1 else None
+        return results
+
+    def follow(self, face_index):
+        """Crop the next frame around face `face_index` of the last results
+        (the driver picked by FaceTracker). None means the driver is lost:
+        the next frame gets a full-frame pass."""
+        if not self.roi_tracking:
+            return
+        if face_index is None or face_index >= len(self._last_faces):
+            self.roi = None
+        else:
+            self.roi = self._next_roi(self._last_faces[face_index], *self._last_size)
+
+    def _detect_full(self, image):
+        self.frames_since_full = 0
+        self.stats["full"] += 1
+        return self._process(self.face_mesh, image)
+
+    def _detect_roi(self, image):
+        """FaceMesh on the crop from the previous frame, mapped back to
+        full-frame normalised coordinates. Returns None if tracking is lost."""
+        if self._roi_face_mesh is None:
+            # Separate graph so its tracker only ever sees (similar) crops
+            self._roi_face_mesh = self.mp_face_mesh.FaceMesh(
+                max_num_faces=self.max_num_faces,
+                min_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=self.min_tracking_confidence
+            )
+
+        img_h, img_w = image.shape[:2]
+        x0, y0, x1, y1 = self.roi
+        crop = image[y0:y1, x0:x1]
+        crop_w, crop_h = x1 - x0, y1 - y0
+
+        scale = self.roi_max_size / max(crop_w, crop_h)
+        if scale < 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        results = self._process(self._roi_face_mesh, crop)
+        if not results.multi_face_landmarks:
+            return None
+
+        # Low confidence proxy: the face box runs into the crop border, so
+        # part of the face is probably outside the crop
+        edge = 0.02
+        for face_landmarks in results.multi_face_landmarks:
+            xs = [lm.x for lm in face_landmarks.landmark]
+            ys = [lm.y for lm in face_landmarks.landmark]
+            if min(xs) < edge or min(ys) < edge or max(xs) > 1 - edge or max(ys) > 1 - edge:
+                self.frames_since_full = self.redetect_interval
+
+            # Normalised crop coordinates -> normalised frame coordinates
+            # (MediaPipe scales z with image width)
+            for lm in face_landmarks.landmark:
+                lm.x = (x0 + lm.x * crop_w) / img_w
+                lm.y = (y0 + lm.y * crop_h) / img_h
+                lm.z = lm.z * crop_w / img_w
+
+        self.frames_since_full += 1
+        self.stats["roi"] += 1
+        return results
+
+    def _next_roi(self, face_landmarks, img_w, img_h):
+        """Square, padded box (pixels) around one face to crop on the next frame"""
+        xs = [lm.x for lm in face_landmarks.landmark]
+        ys = [lm.y for lm in face_landmarks.landmark]
+
+        cx = (min(xs) + max(xs)) / 2 * img_w
+        cy = (min(ys) + max(ys)) / 2 * img_h
+        size = max((max(xs) - min(xs)) * img_w, (max(ys) - min(ys)) * img_h) * (1 + 2 * self.roi_margin)
+        half = size / 2
+
+        x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+        x1, y1 = min(img_w, int(cx + half)), min(img_h, int(cy + half))
+        if x1 - x0 < 32 or y1 - y0 < 32:
+            return None
+        return x0, y0, x1, y1
+
+    def reset_tracking(self):
+        self.roi = None
+        self._last_faces = []
+        self.frames_since_full = 0
+
+    def draw_landmarks(self, image, results):
+        
+        
+        if results.multi_face_landmarks:
+            for face_landmarks in results.multi_face_landmarks:
+                self.mp_drawing.draw_landmarks(
+                    image=image,
+                    landmark_list=face_landmarks,
+                    connections=self.mp_face_mesh.FACEMESH_CONTOURS,
+                    landmark_drawing_spec=self.drawing_spec,
+                    connection_drawing_spec=self.drawing_spec
+                )
@@ -1,108 +1,270 @@
-import cv2
-import numpy as np
-from enum import Enum
-
-
-class HeadPoseState(Enum):
-    FORWARD = "Looking Forward"
-    UP = "Looking Up"
-    DOWN = "Looking Down"
-    LEFT = "Looking Left"
-    RIGHT = "Looking Right"
-
-
-class HeadPoseEstimator:
-    def __init__(self):
-        # Key facial landmarks for head pose estimation
-        self.pose_landmarks = [33, 263, 1, 61, 291, 199]
-
-        # Thresholds (in degrees, relative to calibration)
-        self.pitch_up_threshold = 23     # Above this = Up
-        self.pitch_down_threshold = -8   # Below this = Down
-        self.yaw_threshold = 20          # Left/Right
-        self.forward_tolerance = 10      # ±10° = Forward
-
-        # Calibration
-        self.calibration_offset = {'pitch': 0, 'yaw': 0, 'roll': 0}
-        self.is_calibrated = False
-
-        # Last known state
-        self.last_state = HeadPoseState.FORWARD
-
-    def estimate_pose(self, image, landmarks):
-        """Estimate head pose and return angles + head direction"""
-        img_h, img_w, _ = image.shape
-        face_2d = []
-        face_3d = []
-        nose_2d = None
-        nose_3d = None
-
-        # Extract pose landmarks
-        for idx, lm in enumerate(landmarks):
-            if idx in self.pose_landmarks:
-                if idx == 1:  # Nose tip
-                    nose_2d = (lm.x * img_w, lm.y * img_h)
-                    nose_3d = (lm.x * img_w, lm.y * img_h, lm.z * 3000)
-
-                x, y = int(lm.x * img_w), int(lm.y * img_h)
-                face_2d.append([x, y])
-                face_3d.append([x, y, lm.z])
-
-        if len(face_2d) < 6:  # safety check
-            return None
-
-        # Convert to numpy arrays
-        face_2d = np.array(face_2d, dtype=np.float64)
-        face_3d = np.array(face_3d, dtype=np.float64)
-
-        # Camera matrix
-        focal_length = 1 * img_w
-        cam_matrix = np.array([
-            [focal_length, 0, img_h / 2],
-            [0, focal_length, img_w / 2],
-            [0, 0, 1]
-        ])
-
-        # Distortion parameters
-        dist_matrix = np.zeros((4, 1), dtype=np.float64)
-
-        # Solve PnP
-        success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
-
-        if success:
-            # Get rotation matrix and angles
-            rmat, _ = cv2.Rodrigues(rot_vec)
-            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
-
-            # Convert to degrees and apply calibration offset
-            pitch = (angles[0] * 360) - self.calibration_offset['pitch']
-            yaw = (angles[1] * 360) - self.calibration_offset['yaw']
-            roll = (angles[2] * 360) - self.calibration_offset['roll']
-
-            # Classify head direction
-            direction = self.classify_head_pose(pitch, yaw)
-
-            return {
-                'angles': (pitch, yaw, roll),
-                'direction': direction,
-                'nose_2d': nose_2d
-            }
-
-        return None
-    
-
-    def classify_head_pose(self, pitch, yaw):
-        """Classify head direction from pitch & yaw"""
-        if pitch > self.pitch_up_threshold:
-            self.last_state = HeadPoseState.UP
-        elif pitch < self.pitch_down_threshold:
-            self.last_state = HeadPoseState.DOWN
-        elif yaw > self.yaw_threshold:
-            self.last_state = HeadPoseState.RIGHT
-        elif yaw < -self.yaw_threshold:
-            self.last_state = HeadPoseState.LEFT
-        else:
-            if abs(pitch) <= self.forward_tolerance and abs(yaw) <= self.forward_tolerance:
-                self.last_state = HeadPoseState.FORWARD
-
-        return self.last_state.value
+import cv2
+import numpy as np
+from collections import deque
+from enum import Enum
+
+from landmark_array import landmarks_to_array
+
+
+# Canonical 3D face model (mm) for the pose landmarks, nose tip at the origin.
+# Camera-aligned axes: x to the image right, y down, z away from the camera,
+# so a driver facing the camera has zero rotation.
+CANONICAL_FACE_MODEL = {
+    1: (0.0, 0.0, 0.0),          # nose tip
+    33: (-43.3, -32.7, 26.0),    # eye outer corner (image left)
+    263: (43.3, -32.7, 26.0),    # eye outer corner (image right)
+    61: (-28.9, 28.9, 24.1),     # mouth corner (image left)
+    291: (28.9, 28.9, 24.1),     # mouth corner (image right)
+    199: (0.0, 63.6, 12.5),      # chin
+}
+
+
+def rotation_vectors_to_euler(rvecs):
+    """Vectorised Rodrigues + Euler decomposition for (T, 3) rotation vectors.
+
+    Returns (T, 3) angles in degrees with the same convention as
+    cv2.RQDecomp3x3 (R = Rz @ Ry @ Rx).
+    """
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    safe = np.where(theta > 1e-12, theta, 1.0)
+    kx, ky, kz = (rvecs / safe[:, None]).T
+    s, c = np.sin(theta), np.cos(theta)
+    v = 1 - c
+
+    r00 = c + kx * kx * v
+    r10 = kz * s + kx * ky * v
+    r20 = -ky * s + kx * kz * v
+    r21 = kx * s + ky * kz * v
+    r22 = c + kz * kz * v
+
+    ex = np.arctan2(r21, r22)
+    ey = np.arctan2(-r20, np.hypot(r21, r22))
+    ez = np.arctan2(r10, r00)
+    return np.degrees(np.stack([ex, ey, ez], axis=1))
+
+
+class HeadPoseState(Enum):
+    FORWARD = "Looking Forward"
+    UP = "Looking Up"
+    DOWN = "Looking Down"
+    LEFT = "Looking Left"
+    RIGHT = "Looking Right"
+
+
+class HeadPoseEstimator:
+    def __init__(self, pose_model="canonical", smooth_window=3, warm_start=None):
+        # Key facial landmarks for head pose estimation
+        self.pose_landmarks = [33, 263, 1, 61, 291, 199]
+        # Gathered in ascending index order, matching the original landmark scan
+        self.pose_idx = np.array(sorted(self.pose_landmarks))
+        self.nose_idx = 1
+
+        # "canonical": fixed 3D face model, angles in true degrees.
+        # "legacy": pixel x, y + raw lm.z as the 3D model (original solver).
+        self.pose_model = pose_model
+        self.model_points = np.array([CANONICAL_FACE_MODEL[idx] for idx in self.pose_idx],
+                                     dtype=np.float64)
+
+        # Thresholds in true degrees, relative to calibration. The legacy
+        # solver's angles are ~0.3x true degrees and keep their original
+        # cut-offs; applied to true degrees those flag a relaxed posture as "Down".
+        if pose_model == "legacy":
+            self.pitch_up_threshold, self.pitch_down_threshold = 23, -8
+            self.yaw_threshold, self.forward_tolerance = 20, 10
+        else:
+            self.pitch_up_threshold = 30     # Above this = Up
+            self.pitch_down_threshold = -20  # Below this = Down
+            self.yaw_threshold = 30          # Left/Right
+            self.forward_tolerance = 15      # ±15° = Forward
+
+        # Calibration
+        self.calibration_offset = {'pitch': 0, 'yaw': 0, 'roll': 0}
+        self.is_calibrated = False
+
+        # Camera intrinsics cached per (width, height)
+        self._camera_cache = {}
+        self.dist_matrix = np.zeros((4, 1), dtype=np.float64)
+
+        # Previous PnP solution. SQPnP solves the 6-point model outright
+        # faster than an LM refinement from the last pose, so warm starting
+        # (useExtrinsicGuess) is only the default on OpenCV builds without it.
+        self.warm_start = not hasattr(cv2, "SOLVEPNP_SQPNP") if warm_start is None else warm_start
+        self.cold_flags = getattr(cv2, "SOLVEPNP_SQPNP", cv2.SOLVEPNP_EPNP)
+        self.rot_vec = None
+        self.trans_vec = None
+
+        # Moving average over the last rotation vectors to damp landmark jitter
+        self.rot_history = deque(maxlen=smooth_window)
+
+        # Last known state
+        self.last_state = HeadPoseState.FORWARD
+
+    def camera_matrix(self, img_w, img_h):
+        """Pinhole intrinsics (focal length = width, centred), built once per resolution"""
+        key = (img_w, img_h)
+        cam_matrix = self._camera_cache.get(key)
+        if cam_matrix is None:
+            focal_length = 1 * img_w
+            if self.pose_model == "legacy":
+                # The original matrix (principal point axes swapped) so legacy
+                # angles stay comparable with earlier recordings
+                cam_matrix = np.array([
+                    [focal_length, 0, img_h / 2],
+                    [0, focal_length, img_w / 2],
+                    [0, 0, 1]
+                ], dtype=np.float64)
+            else:
+                cam_matrix = np.array([
+                    [focal_length, 0, img_w / 2],
+                    [0, focal_length, img_h / 2],
+                    [0, 0, 1]
+                ], dtype=np.float64)
+            self._camera_cache[key] = cam_matrix
+            # A new resolution invalidates the previous extrinsics
+            self.reset_tracking()
+        return cam_matrix
+
+    def reset_tracking(self):
+        """Forget the previous solution (e.g. after the face was lost)"""
+        self.rot_vec = None
+        self.trans_vec = None
+        self.rot_history.clear()
+
+    def estimate_pose(self, image, landmarks):
+        """Estimate head pose and return angles + head direction"""
+        img_h, img_w = image.shape[:2]
+        points = landmarks_to_array(landmarks, self.pose_idx.tolist())
+        return self.estimate_pose_from_array(points, img_w, img_h)
+
+    def gather_pose_points(self, points, img_w, img_h):
+        """2D/3D solvePnP inputs for (..., N, 3) landmarks (batches allowed)"""
+        # C order keeps each frame's (6, 2) slice contiguous for cv2.solvePnP
+        selected = np.ascontiguousarray(points[..., self.pose_idx, :], dtype=np.float64)
+        face_2d = np.ascontiguousarray(np.trunc(selected[..., :2] * (img_w, img_h)))
+        face_3d = np.concatenate([face_2d, selected[..., 2:3]], axis=-1)
+        return face_2d, face_3d
+
+    def solve_pnp(self, face_2d, cam_matrix):
+        """Canonical-model PnP for one frame. Returns the smoothed rotation
+        vector or None."""
+        if self.rot_vec is None or not self.warm_start:
+            success, rot_vec, trans_vec = cv2.solvePnP(
+                self.model_points, face_2d, cam_matrix, self.dist_matrix, flags=self.cold_flags)
+        else:
+            # Warm start: last frame's pose is a few LM iterations away
+            success, rot_vec, trans_vec = cv2.solvePnP(
+                self.model_points, face_2d, cam_matrix, self.dist_matrix,
+                self.rot_vec, self.trans_vec, useExtrinsicGuess=True, flags=cv2.SOLVEPNP_ITERATIVE)
+
+        # A solution behind the camera means PnP fell into the mirror minimum
+        if not success or trans_vec[2, 0] <= 0:
+            self.reset_tracking()
+            return None
+
+        self.rot_vec, self.trans_vec = rot_vec, trans_vec
+        self.rot_history.append(rot_vec)
+        if len(self.rot_history) == 1:
+            return rot_vec
+        return sum(self.rot_history) / len(self.rot_history)
+
+    def solve(self, face_2d, face_3d, cam_matrix):
+        """Solve PnP for one frame; returns (pitch, yaw, roll) in degrees or None"""
+        if self.pose_model == "legacy":
+            success, rot_vec, _ = cv2.solvePnP(face_3d, face_2d, cam_matrix, self.dist_matrix)
+            if not success:
+                return None
+            rmat, _ = cv2.Rodrigues(rot_vec)
+            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+            return angles[0] * 360, angles[1] * 360, angles[2] * 360
+
+        rot_vec = self.solve_pnp(face_2d, cam_matrix)
+        if rot_vec is None:
+            return None
+        rmat, _ = cv2.Rodrigues(rot_vec)
+        angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+        # Model axes put +x rotation at "chin back" and +y at "nose to image
+        # left"; flip so that up and image-right are positive
+        return -angles[0], -angles[1], angles[2]
+
+    def estimate_pose_from_array(self, points, img_w, img_h):
+        """Estimate head pose from an (N, 3) landmark array"""
+        if points.shape[0] <= self.pose_idx[-1]:  # safety check
+            return None
+
+        face_2d, face_3d = self.gather_pose_points(points, img_w, img_h)
+        if np.isnan(face_2d).any():
+            self.reset_tracking()
+            return None
+        nose = points[self.nose_idx]
+        nose_2d = (nose[0] * img_w, nose[1] * img_h)
+
+        angles = self.solve(face_2d, face_3d, self.camera_matrix(img_w, img_h))
+        if angles is None:
+            return None
+
+        # Apply calibration offset
+        pitch = angles[0] - self.calibration_offset['pitch']
+        yaw = angles[1] - self.calibration_offset['yaw']
+        roll = angles[2] - self.calibration_offset['roll']
+
+        # Classify head direction
+        direction = self.classify_head_pose(pitch, yaw)
+
+        return {
+            'angles': (pitch, yaw, roll),
+            'direction': direction,
+            'nose_2d': nose_2d
+        }
+
+    def estimate_pose_batch(self, points, img_w, img_h):
+        """Head pose for a (T, N, 3) landmark sequence (offline footage).
+
+        Frames are solved in order so smoothing (and warm starting) carry
+        over from one frame to the next; gathering, Euler decomposition and calibration are vectorised.
+        Returns (T, 3) pitch/yaw/roll (NaN where PnP failed) and the list of
+        directions.
+        """
+        face_2d, face_3d = self.gather_pose_points(points, img_w, img_h)
+        cam_matrix = self.camera_matrix(img_w, img_h)
+        angles = np.full((len(points), 3), np.nan)
+
+        if self.pose_model == "legacy":
+            for i in range(len(points)):
+                solved = self.solve(face_2d[i], face_3d[i], cam_matrix)
+                if solved is not None:
+                    angles[i] = solved
+        else:
+            rvecs = np.full((len(points), 3), np.nan)
+            for i in range(len(points)):
+                if np.isnan(face_2d[i]).any():
+                    self.reset_tracking()
+                    continue
+                rot_vec = self.solve_pnp(face_2d[i], cam_matrix)
+                if rot_vec is not None:
+                    rvecs[i] = rot_vec.ravel()
+            valid = ~np.isnan(rvecs[:, 0])
+            euler = rotation_vectors_to_euler(rvecs[valid])
+            angles[valid] = euler * (-1, -1, 1)
+
+        angles -= (self.calibration_offset['pitch'], self.calibration_offset['yaw'],
+                   self.calibration_offset['roll'])
+        directions = [self.classify_head_pose(p, y) if not np.isnan(p) else None
+                      for p, y in angles[:, :2].tolist()]
+        return angles, directions
+
+    def classify_head_pose(self, pitch, yaw):
+        """Classify head direction from pitch & yaw"""
+        if pitch > self.pitch_up_threshold:
+            self.last_state = HeadPoseState.UP
+        elif pitch < self.pitch_down_threshold:
+            self.last_state = HeadPoseState.DOWN
+        elif yaw > self.yaw_threshold:
+            self.last_state = HeadPoseState.RIGHT
+        elif yaw < -self.yaw_threshold:
+            self.last_state = HeadPoseState.LEFT
+        else:
+            if abs(pitch) <= self.forward_tolerance and abs(yaw) <= self.forward_tolerance:
+                self.last_state = HeadPoseState.FORWARD
+
+        return self.last_state.value
@@ -1,113 +1,366 @@
-from fastapi import FastAPI
-import cv2
-import numpy as np
-import requests
-import threading
-
-# import your detection modules
-from FaceMeshDetector import FaceMeshDetector
-from HeadPoseEstimator import HeadPoseEstimator
-from EyeTracker import EyeTracker
-from main import EnhancedDrowsinessDetector
-
-app = FastAPI(title="Drowsiness Detection Service")
-
-# ---------- Init Models ----------
-face_detector = FaceMeshDetector()
-head_pose_estimator = HeadPoseEstimator()
-eye_tracker = EyeTracker()
-drowsiness_detector = EnhancedDrowsinessDetector()
-
-# ---------- Config ----------
-MODULE1_URL = "http://module1:8000/enhance_frame/"   # talk to Module 1 inside docker-compose
-
-# ---------- Shared State ----------
-latest_result = {"drowsiness_level": "Not Started"}
-running = False
-thread = None
-
-
-def get_enhanced_frame(frame: np.ndarray) -> np.ndarray:
-    """Send raw frame to Module 1 and get enhanced frame"""
-    _, buffer = cv2.imencode(".jpg", frame)
-    files = {"file": ("frame.jpg", buffer.tobytes(), "image/jpeg")}
-    resp = requests.post(MODULE1_URL, files=files)
-    if resp.status_code == 200:
-        arr = np.asarray(bytearray(resp.content), dtype=np.uint8)
-        return cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    else:
-        print("⚠️ Enhancement failed:", resp.text)
-        return frame
-
-
-def process_frame(image: np.ndarray) -> dict:
-    """Run detection pipeline on enhanced frame"""
-    results = face_detector.detect_landmarks(image)
-    head_direction, ear = "Unknown", 0.0
-
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            landmarks = face_landmarks.landmark
-            pose_data = head_pose_estimator.estimate_pose(image, landmarks)
-            if pose_data:
-                head_direction = head_pose_estimator.get_head_direction(pose_data['angles'])
-            ear, _, _ = eye_tracker.calculate_ear(image, landmarks)
-
-    # update blink/drowsiness state
-    drowsiness_detector.update_blink(ear)
-    drowsiness_detector.update_state()
-    drowsiness_level, _, blinks = drowsiness_detector.get_status()
-
-    return {
-        "drowsiness_level": drowsiness_level,
-        "head_direction": head_direction,
-        "ear": round(ear, 3),
-        "blinks": blinks
-    }
-
-
-def detection_loop():
-    global running, latest_result
-    cap = cv2.VideoCapture(0)
-
-    while running and cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            continue
-
-        # enhance with Module 1
-        enhanced = get_enhanced_frame(frame)
-
-        # detect drowsiness
-        result = process_frame(enhanced)
-        latest_result = result
-
-    cap.release()
-    running = False
-
-
-@app.get("/start_detection")
-def start_detection():
-    """Start detection in background thread"""
-    global running, thread
-    if running:
-        return {"message": "Detection already running"}
-
-    running = True
-    thread = threading.Thread(target=detection_loop, daemon=True)
-    thread.start()
-    return {"message": "Detection started"}
-
-
-@app.get("/status")
-def get_status():
-    """Get latest detection result"""
-    return latest_result
-
-
-@app.get("/stop_detection")
-def stop_detection():
-    """Stop detection loop"""
-    global running
-    running = False
-    return {"message": "Detection stopped", "last_result": latest_result}
+from typing import List, Optional
+import math
+import time
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+import numpy as np
+
+# import your detection modules
+from enhancement_client import EnhancementClient
+from session_manager import SessionManager, SessionLimitError
+from calibration import ProfileStore
+from metrics import REGISTRY, STAGE_SECONDS
+from landmark_backend import ProcessPoolLandmarkBackend
+from preview import MJPEG_CONTENT_TYPE, mjpeg_stream
+from event_log import EventStore, LEVELS
+
+app = FastAPI(title="Drowsiness Detection Service")
+
+# ---------- Config ----------
+MODULE1_URL = "http://module1:8000/enhance_frame/"   # talk to Module 1 inside docker-compose
+MODULE1_DEADLINE = 0.15      # seconds to wait before falling back to the raw frame
+MODULE1_MAX_IN_FLIGHT = 8    # pooled connections / concurrent requests, per stream
+MODULE1_WIRE_FORMAT = "jpeg" # "jpeg", "png" or "raw"
+MODULE1_JPEG_QUALITY = 80
+MAX_STREAMS = 64          # admission limit for concurrent streams
+NUM_WORKERS = None        # FaceMesh workers, None = one per CPU core
+WARM_MODELS = 2           # FaceMesh instances built and warmed at startup (/ready waits for them)
+BATCH_WORKERS = None      # processes for POST /frames, None = one per CPU core
+MAX_BATCH_FRAMES = 256
+DEFAULT_STREAM = "default"
+PROFILE_DIR = "profiles"  # per-driver calibration profiles (JSON)
+MAX_FACES = 3             # faces detected per frame (driver + passengers)
+DRIVER_POLICY = "largest" # driver = "largest" face, or the one nearest the "left"/"right" edge
+EVENT_DIR = "events"      # per-stream event / telemetry history (binary segments)
+EVENT_SEGMENT_SECONDS = 3600
+EVENT_TELEMETRY_INTERVAL = 0.5   # seconds between stored telemetry records
+PREVIEW_WIDTH = 640       # preview frames are scaled to this width (None = source size)
+PREVIEW_JPEG_QUALITY = 70
+PREVIEW_FPS = 10          # max preview frames encoded per second per stream
+
+# ---------- Init Models ----------
+def new_enhancer():
+    return EnhancementClient(MODULE1_URL, deadline=MODULE1_DEADLINE,
+                             max_in_flight=MODULE1_MAX_IN_FLIGHT,
+                             wire_format=MODULE1_WIRE_FORMAT,
+                             jpeg_quality=MODULE1_JPEG_QUALITY)
+
+
+# Capture streams get a client each (see start_detection); this one serves get_enhanced_frame
+enhancer = new_enhancer()
+
+# Loaded once here; new streams pick up their driver's profile from memory
+profile_store = ProfileStore(PROFILE_DIR)
+event_store = EventStore(EVENT_DIR, segment_seconds=EVENT_SEGMENT_SECONDS,
+                         telemetry_interval=EVENT_TELEMETRY_INTERVAL)
+
+# FaceMesh runs on a shared worker pool; every stream keeps its own
+# EAR smoothing, PERCLOS history and head-pose state. No model is built
+# at import: the pool warms up after startup, the rest on demand.
+sessions = SessionManager(max_streams=MAX_STREAMS, num_workers=NUM_WORKERS, profile_store=profile_store,
+                          preview_settings={"width": PREVIEW_WIDTH, "quality": PREVIEW_JPEG_QUALITY,
+                                            "fps": PREVIEW_FPS},
+                          max_faces=MAX_FACES, driver_policy=DRIVER_POLICY, event_store=event_store,
+                          warm_models=WARM_MODELS)
+# Batched uploads bypass the GIL by running FaceMesh in worker processes
+batch_backend = ProcessPoolLandmarkBackend(num_workers=BATCH_WORKERS, max_num_faces=MAX_FACES)
+
+REGISTRY.gauge("drowsiness_active_streams", "Streams with a live session").set_function(lambda: len(sessions))
+
+
+def get_enhanced_frame(frame: np.ndarray) -> np.ndarray:
+    """Send raw frame to Module 1 and get enhanced frame (raw frame if Module 1 is slow)"""
+    return enhancer.enhance(frame)
+
+
+def parse_source(source: str):
+    """Camera indices arrive as strings; anything else is a file/URL"""
+    return int(source) if source.isdigit() else source
+
+
+@app.on_event("startup")
+def startup():
+    sessions.pool.models.start_warm_up()
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the warm FaceMesh instances have run
+    their first inference, 503 before (or if warm-up failed)"""
+    models = sessions.pool.models.summary()
+    if not models["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, "models": models})
+    return {"ready": True, "models": models}
+
+
+@app.get("/start_detection")
+def start_detection(stream_id: str = DEFAULT_STREAM, source: str = "0", driver_id: Optional[str] = None):
+    """Start detection for a stream in a background thread.
+
+    `driver_id` selects the calibration profile (defaults to the stream ID).
+    """
+    try:
+        # Several frames of the stream can be at Module 1 at once, on its own
+        # client so a slow stream can't queue up or cool down the others
+        started = sessions.start(stream_id, parse_source(source), driver_id=driver_id,
+                                 enhancer_factory=new_enhancer)
+    except SessionLimitError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    if not started:
+        return {"message": "Detection already running", "stream_id": stream_id}
+    return {"message": "Detection started", "stream_id": stream_id}
+
+
+@app.get("/status")
+def get_status(stream_id: str = DEFAULT_STREAM):
+    """Get latest detection result for a stream"""
+    session = sessions.get(stream_id)
+    if session is None:
+        return {"drowsiness_level": "Not Started"}
+    return session.latest_result
+
+
+@app.websocket("/streams/{stream_id}/ws")
+async def stream_results_ws(websocket: WebSocket, stream_id: str, rate: float = 2.0):
+    """Push a stream's results: state changes immediately, telemetry
+    (EAR, PERCLOS, angles) at most `rate` times per second"""
+    session = sessions.get(stream_id)
+    if session is None:
+        await websocket.close(code=1008, reason=f"Unknown stream '{stream_id}'")
+        return
+
+    await websocket.accept()
+    try:
+        async for message in session.channel.subscribe(rate):
+            if message is None:
+                message = '{"type": "keepalive"}'
+            # A slow client only holds up its own send; the detection loop
+            # never waits and intermediate telemetry is coalesced
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/streams/{stream_id}/events")
+async def stream_results_sse(stream_id: str, rate: float = 2.0):
+    """Server-Sent Events version of the /ws push channel"""
+    session = sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+
+    async def events():
+        async for message in session.channel.subscribe(rate):
+            yield ": keepalive\n\n" if message is None else f"data: {message}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/streams/{stream_id}/preview.mjpg")
+async def stream_preview(stream_id: str):
+    """MJPEG of the stream with overlays. Frames are rendered and encoded
+    only while someone watches, once per frame for all viewers."""
+    session = sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+    return StreamingResponse(mjpeg_stream(session.preview), media_type=MJPEG_CONTENT_TYPE,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/streams/{stream_id}/snapshot.jpg")
+def stream_snapshot(stream_id: str, timeout: float = 2.0):
+    """Latest frame with overlays as a single JPEG (waits for the next
+    processed frame if none was rendered recently)"""
+    session = sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+    jpeg = session.preview.snapshot(timeout)
+    if jpeg is None:
+        raise HTTPException(status_code=504, detail="No frame processed within the timeout")
+    return Response(jpeg, media_type="image/jpeg", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/streams/{stream_id}/history")
+def stream_history(stream_id: str, query: str = "summary", start: Optional[float] = None,
+                   end: Optional[float] = None, level: str = "MEDIUM", max_points: int = 1000):
+    """Query a stream's stored history (also after the stream has stopped).
+
+    `query` is one of summary, transitions, blinks, alerts_per_hour,
+    time_to_first (per trip, for `level`) or telemetry (thinned to
+    `max_points`); `start` / `end` are epoch seconds.
+    """
+    session = sessions.get(stream_id)
+    if session is not None and session.event_log is not None:
+        session.event_log.flush()
+    reader = event_store.reader(stream_id)
+    if not reader.segments():
+        raise HTTPException(status_code=404, detail=f"No history for stream '{stream_id}'")
+
+    if query == "summary":
+        data = reader.summary(start, end)
+    elif query == "transitions":
+        data = reader.transitions(start, end)
+    elif query == "blinks":
+        data = reader.blinks(start, end)
+    elif query == "alerts_per_hour":
+        data = [{"hour": hour, **counts} for hour, counts in reader.alerts_per_hour(start, end).items()]
+    elif query == "time_to_first":
+        if level not in LEVELS:
+            raise HTTPException(status_code=422, detail=f"level must be one of {LEVELS}")
+        data = reader.time_to_first(level, start, end)
+    elif query == "telemetry":
+        data = reader.telemetry(start, end, max_points)
+    else:
+        raise HTTPException(status_code=422, detail="query must be summary, transitions, blinks, "
+                                                    "alerts_per_hour, time_to_first or telemetry")
+    return {"stream_id": stream_id, "query": query, "result": data}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, drop / face-loss /
+    enhancement-failure counters, queue depth and FPS gauges"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stop_detection")
+def stop_detection(stream_id: str = DEFAULT_STREAM):
+    """Stop detection loop for a stream"""
+    session = sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+    sessions.stop(stream_id)
+    return {"message": "Detection stopped", "last_result": session.latest_result}
+
+
+@app.get("/streams")
+def list_streams():
+    """List active streams and their latest results"""
+    return {"max_streams": sessions.max_streams, "streams": sessions.list_sessions()}
+
+
+@app.delete("/streams/{stream_id}")
+def remove_stream(stream_id: str):
+    """Stop a stream and free its state"""
+    session = sessions.remove(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+    return {"message": "Stream removed", "last_result": session.latest_result}
+
+
+@app.post("/streams/{stream_id}/calibrate")
+def recalibrate(stream_id: str):
+    """Learn the stream's driver again from the next seconds of forward-facing frames"""
+    session = sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown stream '{stream_id}'")
+    session.calibrator.start()
+    return {"message": "Calibration started", "calibration": session.calibrator.summary()}
+
+
+@app.post("/frames")
+def ingest_frames(frames: List[UploadFile] = File(...), stream_ids: Optional[str] = Form(None),
+                  timestamps: Optional[str] = Form(None), fps: Optional[float] = Form(None)):
+    """Process a batch of JPEG/PNG frames for one or more streams.
+
+    `stream_ids` is a comma-separated list with either one ID for the whole
+    batch or one ID per frame. `timestamps` gives each frame's capture time
+    (seconds, comma-separated); per stream they must increase, also across
+    requests. Without it, a stream with several frames in the batch needs
+    `fps`: its frames are then spaced 1/fps apart, ending on arrival (and
+    never before the stream's previous frame); a single frame is stamped
+    on arrival. Frames of the same stream are applied in
+    upload order; results come back in upload order with per-frame timings.
+    """
+    received = time.time()
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FRAMES} frames per request")
+
+    ids = [s.strip() for s in stream_ids.split(",")] if stream_ids else [DEFAULT_STREAM]
+    if len(ids) == 1:
+        ids = ids * len(frames)
+    elif len(ids) != len(frames):
+        raise HTTPException(status_code=422, detail="stream_ids must have one entry or one per frame")
+
+    if timestamps:
+        try:
+            frame_times = [float(t) for t in timestamps.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=422, detail="timestamps must be numbers")
+        if not all(math.isfinite(t) for t in frame_times):
+            raise HTTPException(status_code=422, detail="timestamps must be finite")
+        if len(frame_times) != len(frames):
+            raise HTTPException(status_code=422, detail="timestamps must have one entry per frame")
+    elif fps is not None and fps <= 0:
+        raise HTTPException(status_code=422, detail="fps must be positive")
+    elif fps is None and len(set(ids)) < len(ids):
+        # Identical times would collapse blink, PERCLOS and head-pose durations to zero
+        raise HTTPException(status_code=422, detail="timestamps or fps are required when a stream "
+                                                    "has more than one frame in the batch")
+
+    try:
+        stream_sessions = {sid: sessions.get_or_create(sid) for sid in ids}
+    except SessionLimitError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    if timestamps:
+        # Blink, PERCLOS and head-pose windows assume each stream's time only moves forward
+        last = {sid: session.last_timestamp for sid, session in stream_sessions.items()}
+        for sid, t in zip(ids, frame_times):
+            if last[sid] is not None and t <= last[sid]:
+                raise HTTPException(status_code=422, detail=f"timestamps of stream '{sid}' must increase "
+                                                            f"({t} does not follow {last[sid]})")
+            last[sid] = t
+    else:
+        frame_times = [received] * len(frames)
+        if fps is not None:
+            for sid, session in stream_sessions.items():
+                indices = [i for i, frame_id in enumerate(ids) if frame_id == sid]
+                first = received - (len(indices) - 1) / fps
+                if session.last_timestamp is not None:
+                    first = max(first, session.last_timestamp + 1.0 / fps)
+                for k, i in enumerate(indices):
+                    frame_times[i] = first + k / fps
+
+    batch_start = time.perf_counter()
+    decoded = batch_backend.decode_batch([f.file.read() for f in frames])
+    valid = [i for i, (image, _) in enumerate(decoded) if image is not None]
+    detections = dict(zip(valid, batch_backend.detect_batch([decoded[i][0] for i in valid])))
+
+    results = []
+    for i, (image, decode_time) in enumerate(decoded):
+        entry = {"index": i, "stream_id": ids[i], "filename": frames[i].filename}
+        if image is None:
+            entry["error"] = "could not decode frame"
+            results.append(entry)
+            continue
+
+        faces, inference_time = detections[i]
+        update_start = time.perf_counter()
+        entry.update(stream_sessions[ids[i]].update_faces(image, faces, frame_times[i]))
+        update_time = time.perf_counter() - update_start
+        STAGE_SECONDS.labels(stage="decode").observe(decode_time)
+        STAGE_SECONDS.labels(stage="inference").observe(inference_time)
+        STAGE_SECONDS.labels(stage="update").observe(update_time)
+        entry["faces"] = len(faces)
+        entry["timings_ms"] = {
+            "decode": round(decode_time * 1000, 2),
+            "inference": round(inference_time * 1000, 2),
+            "update": round(update_time * 1000, 2),
+        }
+        results.append(entry)
+
+    return {
+        "frames": len(frames),
+        "batch_ms": round((time.perf_counter() - batch_start) * 1000, 2),
+        "results": results,
+    }
+
+
+@app.on_event("shutdown")
+def shutdown():
+    sessions.shutdown()
+    batch_backend.shutdown()
+    enhancer.close()
@@ -0,0 +1,299 @@
+"""Headless batch processing of recorded dashcam footage.
+
+    python batch_process.py footage/ --output-dir results/ --workers 8
+
+Every video is decoded by a prefetching reader thread and run through the
+FaceMesh -> pose/EAR -> EnhancedDrowsinessDetector chain as fast as the
+CPU allows, using the video's own timestamps so decisions match a live
+run. Files are spread over worker processes. One table per video is
+written with a row per frame (EAR, pitch/yaw/roll, PERCLOS, level) to
+Parquet when pyarrow is installed, otherwise to compressed NPZ.
+
+With --save-traces the driver's landmarks are also written as replay
+traces (see replay.py), so the footage can be re-run through changed
+decision logic without FaceMesh.
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = None
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mpg", ".mpeg")
+
+
+class VideoFrameReader:
+    """Decodes a video on a background thread, `prefetch` frames ahead.
+
+    Iterating yields (frame_index, timestamp_seconds, frame). Timestamps come
+    from the container when available, otherwise from the nominal FPS.
+    """
+
+    def __init__(self, path, prefetch=64, max_frames=None):
+        self.path = path
+        self.prefetch = prefetch
+        self.max_frames = max_frames
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video '{path}'")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+
+    def _read_loop(self):
+        index = 0
+        while not self._stop.is_set():
+            if self.max_frames is not None and index >= self.max_frames:
+                break
+            success, frame = self.cap.read()
+            if not success:
+                break
+            pos_msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            timestamp = pos_msec / 1000.0 if pos_msec > 0 or index == 0 else index / self.fps
+            self._queue.put((index, timestamp, frame))
+            index += 1
+        self._queue.put(None)
+
+    def __iter__(self):
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        # Unblock the reader if it is waiting on a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                self._thread.join(timeout=0.05)
+        self.cap.release()
+
+
+def process_video(path, output_dir, output_format="npz", prefetch=64, max_frames=None,
+                  roi_tracking=False, max_faces=1, driver_policy="largest", trace_dir=None, name=None):
+    """Run the detection chain over one video and write its per-frame table.
+
+    `name` is the output path relative to `output_dir` / `trace_dir`,
+    without extension (see output_names); defaults to the video's stem.
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    # One worker per core; keep OpenCV from adding threads of its own
+    cv2.setNumThreads(1)
+
+    from FaceMeshDetector import FaceMeshDetector
+    from HeadPoseEstimator import HeadPoseEstimator
+    from EyeTracker import EyeTracker
+    from drowsiness_logic import EnhancedDrowsinessDetector
+    from calibration import AutoCalibrator
+    from face_tracker import FaceTracker
+    from landmark_array import landmarks_to_array
+
+    face_detector = FaceMeshDetector(roi_tracking=roi_tracking, max_num_faces=max_faces)
+    face_tracker = FaceTracker(driver_policy)
+    head_pose_estimator = HeadPoseEstimator()
+    eye_tracker = EyeTracker()
+    drowsiness_detector = EnhancedDrowsinessDetector()
+    # Each video learns its own driver's neutral pose and EAR threshold, as a live session would
+    calibrator = AutoCalibrator(head_pose_estimator, drowsiness_detector)
+    used_landmarks = sorted(set(eye_tracker.used_idx) | set(head_pose_estimator.pose_idx.tolist()))
+    # Replay trace: the landmarks the chain reads, NaN while there is no driver
+    trace_points = [] if trace_dir else None
+    driver_changes = []     # frames where another person became the driver
+    no_face = np.full((len(used_landmarks), 3), np.nan, dtype=np.float32)
+
+    columns = {name: [] for name in ("frame", "timestamp", "face", "faces", "driver_id", "ear", "pitch", "yaw",
+                                     "roll", "head_direction", "perclos", "drowsiness_level", "microsleep")}
+    start = time.perf_counter()
+    reader = VideoFrameReader(path, prefetch=prefetch, max_frames=max_frames)
+
+    for index, timestamp, image in reader:
+        results = face_detector.detect_landmarks(image)
+        faces = results.multi_face_landmarks or []
+        driver = face_tracker.update(faces)
+        # Next ROI around the driver only; full frame once they are lost
+        face_detector.follow(driver)
+        head_direction, ear = "Unknown", 0.0
+        pitch = yaw = roll = np.nan
+
+        if driver is None or face_tracker.driver_changed:
+            # Face lost or another person: don't smooth with their pose
+            head_pose_estimator.reset_tracking()
+        new_driver = driver is not None and face_tracker.driver_changed
+        if new_driver:
+            # Nor with their EAR, and drop their half-collected calibration
+            eye_tracker.reset_tracking()
+            if calibrator.calibrating:
+                calibrator.start()
+        img_h, img_w = image.shape[:2]
+        if driver is not None:
+            points = landmarks_to_array(faces[driver].landmark, used_landmarks)
+            pose_data = head_pose_estimator.estimate_pose_from_array(points, img_w, img_h)
+            if pose_data:
+                pitch, yaw, roll = pose_data['angles']
+                head_direction = pose_data['direction']
+            ear, _, _ = eye_tracker.calculate_ear_from_array(points, img_w, img_h)
+            if pose_data:
+                calibrator.update(pose_data['angles'], ear, timestamp)
+        if trace_points is not None:
+            trace_points.append(points[used_landmarks] if driver is not None else no_face)
+            driver_changes.append(new_driver)
+        drowsiness_detector.update_blink(ear, head_direction, timestamp)
+        drowsiness_detector.update_state(head_direction, timestamp)
+        drowsiness_level, _, perclos = drowsiness_detector.get_status()
+
+        for column, value in (("frame", index), ("timestamp", timestamp),
+                            ("face", driver is not None), ("faces", len(faces)),
+                            ("driver_id", face_tracker.driver_id or 0), ("ear", ear),
+                            ("pitch", pitch), ("yaw", yaw), ("roll", roll),
+                            ("head_direction", head_direction), ("perclos", perclos),
+                            ("drowsiness_level", drowsiness_level),
+                            ("microsleep", drowsiness_detector.blink_detector.in_microsleep(timestamp))):
+            columns[column].append(value)
+
+    elapsed = time.perf_counter() - start
+    output_path = write_table(columns, name, output_dir, output_format)
+    if trace_dir and trace_points:
+        from replay import save_trace
+        trace_path = os.path.join(trace_dir, f"{name}.npz")
+        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        save_trace(trace_path, columns["timestamp"], np.stack(trace_points),
+                   img_w, img_h, indices=used_landmarks, driver_changes=driver_changes)
+
+    frames = len(columns["frame"])
+    duration = columns["timestamp"][-1] if frames else 0.0
+    return {"video": path, "output": output_path, "frames": frames,
+            "seconds": elapsed, "realtime_factor": duration / elapsed if elapsed > 0 else 0.0}
+
+
+def write_table(columns, name, output_dir, output_format):
+    stem = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(stem), exist_ok=True)
+    arrays = {
+        "frame": np.asarray(columns["frame"], dtype=np.int32),
+        "timestamp": np.asarray(columns["timestamp"], dtype=np.float64),
+        "face": np.asarray(columns["face"], dtype=bool),
+        "faces": np.asarray(columns["faces"], dtype=np.int8),
+        "driver_id": np.asarray(columns["driver_id"], dtype=np.int32),
+        "ear": np.asarray(columns["ear"], dtype=np.float32),
+        "pitch": np.asarray(columns["pitch"], dtype=np.float32),
+        "yaw": np.asarray(columns["yaw"], dtype=np.float32),
+        "roll": np.asarray(columns["roll"], dtype=np.float32),
+        "perclos": np.asarray(columns["perclos"], dtype=np.float32),
+        "head_direction": np.asarray(columns["head_direction"], dtype=str),
+        "drowsiness_level": np.asarray(columns["drowsiness_level"], dtype=str),
+        "microsleep": np.asarray(columns["microsleep"], dtype=bool),
+    }
+
+    if output_format == "parquet":
+        output_path = f"{stem}.parquet"
+        table = pa.table({
+            name: (pa.array(values.tolist()).dictionary_encode() if values.dtype.kind == "U"
+                   else pa.array(values))
+            for name, values in arrays.items()
+        })
+        pq.write_table(table, output_path, compression="zstd")
+    else:
+        output_path = f"{stem}.npz"
+        np.savez_compressed(output_path, **arrays)
+    return output_path
+
+
+def find_videos(inputs, extensions=VIDEO_EXTENSIONS):
+    """(path, name) per video. `name` is the output path without extension:
+    the path relative to the input directory it was found in (so a/clip.mp4
+    and b/clip.mp4 don't overwrite each other), or the stem for files given
+    directly, numbered when two of those collide."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for f in sorted(files):
+                    if f.lower().endswith(extensions):
+                        path = os.path.join(root, f)
+                        found.append((path, os.path.splitext(os.path.relpath(path, item))[0]))
+        else:
+            found.append((item, os.path.splitext(os.path.basename(item))[0]))
+
+    videos, paths, names = [], set(), {}
+    for path, name in found:
+        if os.path.abspath(path) in paths:
+            continue
+        paths.add(os.path.abspath(path))
+        count = names[name] = names.get(name, 0) + 1
+        videos.append((path, name if count == 1 else f"{name}_{count}"))
+    return videos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="video files and/or directories")
+    parser.add_argument("--output-dir", default="batch_results")
+    parser.add_argument("--format", choices=("auto", "parquet", "npz"), default="auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="videos processed in parallel")
+    parser.add_argument("--prefetch", type=int, default=64, help="decoded frames buffered per video")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--roi-tracking", action="store_true", help="crop FaceMesh to the tracked face")
+    parser.add_argument("--max-faces", type=int, default=1, help="faces to detect (driver + passengers)")
+    parser.add_argument("--driver-policy", choices=("largest", "left", "right"), default="largest",
+                        help="how the driver is picked when several faces are visible")
+    parser.add_argument("--save-traces", metavar="DIR", help="also write replay traces (see replay.py) here")
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format == "auto":
+        output_format = "parquet" if pa is not None else "npz"
+    elif output_format == "parquet" and pa is None:
+        parser.error("--format parquet requires pyarrow")
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        parser.error("no videos found")
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.save_traces:
+        os.makedirs(args.save_traces, exist_ok=True)
+
+    print(f"Processing {len(videos)} video(s) on {args.workers} worker(s) -> {args.output_dir} ({output_format})")
+    start = time.perf_counter()
+    total_frames = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_video, video, args.output_dir, output_format,
+                                   args.prefetch, args.max_frames, args.roi_tracking, args.max_faces,
+                                   args.driver_policy, args.save_traces, name): video
+                   for video, name in videos}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as exc:
+                print(f"⚠️ {futures[future]}: {exc}")
+                continue
+            total_frames += summary["frames"]
+            print(f"{summary['video']}: {summary['frames']} frames in {summary['seconds']:.1f}s "
+                  f"({summary['realtime_factor']:.1f}x real time) -> {summary['output']}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total_frames} frames in {elapsed:.1f}s ({total_frames / elapsed if elapsed else 0:.0f} fps overall)")
+
+
+if __name__ == "__main__":
+    main()
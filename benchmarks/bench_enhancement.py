@@ -0,0 +1,92 @@
+"""Benchmark the Module 1 enhancement hop against the local stub.
+
+    python benchmarks/bench_enhancement.py --frames 300 --delay-ms 20
+
+Starts benchmarks/module1_stub.py in a subprocess, then compares the old
+one-`requests.post`-per-frame path with EnhancementClient for each wire
+format and in-flight depth.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from enhancement_client import EnhancementClient  # noqa: E402
+
+
+def legacy_enhance(url, frame):
+    """The original get_enhanced_frame round trip"""
+    _, buffer = cv2.imencode(".jpg", frame)
+    files = {"file": ("frame.jpg", buffer.tobytes(), "image/jpeg")}
+    resp = requests.post(url, files=files)
+    arr = np.asarray(bytearray(resp.content), dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+
+def wait_for_server(url, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url.rsplit("/", 2)[0] + "/docs", timeout=0.5)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("Stub server did not start")
+
+
+def report(name, frames, elapsed, stats=None):
+    line = f"{name:<28} {frames / elapsed:8.1f} fps  {1000 * elapsed / frames:7.2f} ms/frame"
+    if stats:
+        line += f"  enhanced={stats['enhanced']} fallbacks={stats['fallbacks']}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--deadline", type=float, default=1.0, help="client fallback deadline (s)")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}/enhance_frame/"
+    stub = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "module1_stub.py"),
+                             "--port", str(args.port), "--delay-ms", str(args.delay_ms)])
+    try:
+        wait_for_server(url)
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+        frames = [frame] * args.frames
+
+        start = time.perf_counter()
+        for f in frames:
+            legacy_enhance(url, f)
+        report("legacy requests.post", args.frames, time.perf_counter() - start)
+
+        for wire_format in ("jpeg", "png", "raw"):
+            for in_flight in (1, 4, 8):
+                client = EnhancementClient(url, deadline=args.deadline, max_in_flight=in_flight,
+                                           wire_format=wire_format)
+                start = time.perf_counter()
+                for _ in client.enhance_stream(frames):
+                    pass
+                report(f"client {wire_format} x{in_flight}", args.frames,
+                       time.perf_counter() - start, client.stats)
+                client.close()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark the event log: write cost per frame and query time over long histories.
+
+    python benchmarks/bench_event_log.py --days 28 --hours-per-day 10
+
+Writes a synthetic per-vehicle history (camera-rate telemetry, downsampled
+by EventLog, plus level transitions) into a temporary directory, then
+times the EventReader queries over the whole range and reports the peak
+traced Python allocations of each, which stay far below the on-disk size
+because segments are memory-mapped one at a time.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_log import EventLog, EventReader  # noqa: E402
+
+LEVELS = ("NOT DROWSY", "MEDIUM", "NOT DROWSY", "CRITICAL")
+
+
+def write_history(directory, days, hours_per_day, fps, telemetry_interval):
+    log = EventLog(directory, telemetry_interval=telemetry_interval)
+    rng = np.random.default_rng(0)
+    start = 1_700_000_000.0
+    frames = 0
+    level = "NOT DROWSY"
+    t0 = time.perf_counter()
+    for day in range(days):
+        trip_start = start + day * 86400
+        n = int(hours_per_day * 3600 * fps)
+        ears = rng.uniform(0.18, 0.34, n)
+        for i in range(n):
+            timestamp = trip_start + i / fps
+            # A level change every ~20 minutes
+            if i % int(1200 * fps) == int(600 * fps):
+                new = LEVELS[(i // int(1200 * fps)) % len(LEVELS)]
+                if new != level:
+                    log.level_changed(timestamp, level, new, 0.3)
+                    level = new
+            log.telemetry(timestamp, level, "Looking Forward", ears[i], 0.1, (0.0, 0.0, 0.0))
+        frames += n
+    log.close()
+    return frames, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--hours-per-day", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--telemetry-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="event_log_bench_")
+    try:
+        frames, elapsed = write_history(directory, args.days, args.hours_per_day, args.fps,
+                                        args.telemetry_interval)
+        reader = EventReader(directory)
+        size = sum(os.path.getsize(path) for _, path in reader.segments())
+        print(f"wrote {frames} frames in {elapsed:.1f}s ({elapsed / frames * 1e6:.2f} us/frame), "
+              f"{len(reader.segments())} segments, {size / 1e6:.1f} MB")
+
+        queries = {
+            "summary": lambda: reader.summary(),
+            "alerts_per_hour": lambda: reader.alerts_per_hour(),
+            "time_to_first": lambda: reader.time_to_first("MEDIUM"),
+            "telemetry": lambda: reader.telemetry(max_points=1000),
+            "one_hour_range": lambda: reader.telemetry(1_700_000_000.0 + 7 * 86400,
+                                                       1_700_000_000.0 + 7 * 86400 + 3600, max_points=0),
+        }
+        print(f"{'query':<16} {'ms':>9} {'peak KiB':>9}")
+        for name, query in queries.items():
+            tracemalloc.start()
+            start = time.perf_counter()
+            query()
+            ms = (time.perf_counter() - start) * 1000
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            print(f"{name:<16} {ms:9.1f} {peak:9.0f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
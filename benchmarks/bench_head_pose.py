@@ -0,0 +1,98 @@
+"""Benchmark the head-pose solver: legacy vs canonical model, SQPnP vs warm-started PnP.
+
+    python benchmarks/bench_head_pose.py --frames 3000 --noise-px 0.7
+
+Projects the canonical face model along a known pitch/yaw trajectory,
+adds pixel noise, and feeds the landmarks to HeadPoseEstimator. Reports
+per-frame cost for each mode, plus angle error against the ground truth
+and frame-to-frame jitter (std of the residual change between frames).
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from HeadPoseEstimator import HeadPoseEstimator  # noqa: E402
+from synthetic import pose_rotation as rotation  # noqa: E402
+
+
+def make_sequence(frames, width, height, noise_px, seed=0):
+    rng = np.random.default_rng(seed)
+    estimator = HeadPoseEstimator()
+    cam = estimator.camera_matrix(width, height)
+    t = np.arange(frames) / 30.0
+    truth = np.stack([12 * np.sin(2 * np.pi * t / 9.0), 25 * np.sin(2 * np.pi * t / 6.0)], axis=1)
+
+    points = np.zeros((frames, 468, 3))
+    for i, (pitch, yaw) in enumerate(truth):
+        projected, _ = cv2.projectPoints(estimator.model_points, rotation(pitch, yaw),
+                                         np.array([0.0, 0.0, 650.0]), cam, np.zeros(4))
+        projected = projected.reshape(-1, 2) + rng.normal(0, noise_px, (6, 2))
+        points[i, estimator.pose_idx, :2] = projected / (width, height)
+        points[i, estimator.pose_idx, 2] = rng.normal(0, 0.01, 6)
+    return points, truth
+
+
+def run_per_frame(estimator, points, width, height):
+    angles = np.full((len(points), 3), np.nan)
+    start = time.perf_counter()
+    for i in range(len(points)):
+        result = estimator.estimate_pose_from_array(points[i], width, height)
+        if result:
+            angles[i] = result['angles']
+    return (time.perf_counter() - start) / len(points), angles
+
+
+def accuracy(angles, truth):
+    """RMS error and jitter in degrees. Each axis is first mapped onto the
+    truth with a least-squares linear fit, so the legacy solver (arbitrary
+    scale and sign) can be compared too."""
+    rms, jitter = [], []
+    for axis in range(2):
+        valid = ~np.isnan(angles[:, axis])
+        fit = np.polyfit(angles[valid, axis], truth[valid, axis], 1)
+        err = np.full(len(angles), np.nan)
+        err[valid] = np.polyval(fit, angles[valid, axis]) - truth[valid, axis]
+        rms.append(np.sqrt(np.nanmean(err ** 2)))
+        jitter.append(np.nanstd(np.diff(err)))
+    return rms, jitter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--noise-px", type=float, default=0.7)
+    args = parser.parse_args()
+
+    points, truth = make_sequence(args.frames, args.width, args.height, args.noise_px)
+    w, h = args.width, args.height
+
+    legacy_time, legacy = run_per_frame(HeadPoseEstimator(pose_model="legacy"), points, w, h)
+    raw_time, raw = run_per_frame(HeadPoseEstimator(smooth_window=1), points, w, h)
+    smooth_time, smooth = run_per_frame(HeadPoseEstimator(), points, w, h)
+    warm_time, warm = run_per_frame(HeadPoseEstimator(smooth_window=1, warm_start=True), points, w, h)
+
+    start = time.perf_counter()
+    batch, _ = HeadPoseEstimator().estimate_pose_batch(points, w, h)
+    batch_time = (time.perf_counter() - start) / len(points)
+
+    print(f"{'mode':<22} {'us/frame':>9} {'rms err p/y (deg)':>20} {'jitter p/y (deg)':>18}")
+    for name, t, angles in (("legacy", legacy_time, legacy), ("canonical sqpnp", raw_time, raw),
+                            ("canonical smoothed", smooth_time, smooth), ("canonical warm LM", warm_time, warm),
+                            ("canonical batch", batch_time, batch)):
+        rms, jitter = accuracy(angles, truth)
+        failed = np.isnan(angles[:, 0]).mean()
+        print(f"{name:<22} {t * 1e6:9.1f} {rms[0]:9.2f} /{rms[1]:6.2f}    {jitter[0]:7.2f} /{jitter[1]:6.2f}"
+              f"   failed {failed:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Micro-benchmark for the NumPy landmark-array stage.
+
+    python benchmarks/bench_landmark_array.py --iterations 2000
+
+Replays synthetic FaceMesh landmarks (no camera or MediaPipe needed) and
+compares the per-landmark Python code that EyeTracker/HeadPoseEstimator
+used before with the array path, for single frames and for batches.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from EyeTracker import EyeTracker  # noqa: E402
+from HeadPoseEstimator import HeadPoseEstimator  # noqa: E402
+from landmark_array import landmarks_to_array  # noqa: E402
+
+Landmark = namedtuple("Landmark", ["x", "y", "z"])
+IMG_W, IMG_H = 1280, 720
+
+
+def synthetic_landmarks(rng, n=468):
+    pts = rng.uniform(0.3, 0.7, (n, 3))
+    pts[:, 2] = rng.normal(0, 0.02, n)
+    return [Landmark(*row) for row in pts.tolist()]
+
+
+def legacy_ear(landmarks, right_idx, left_idx):
+    """EyeTracker.calculate_ear before the array stage (without smoothing)"""
+    def get_point(idx):
+        lm = landmarks[idx]
+        return int(lm.x * IMG_W), int(lm.y * IMG_H)
+
+    def dist(p1, p2):
+        return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+
+    r = [get_point(i) for i in right_idx]
+    l = [get_point(i) for i in left_idx]
+    r_ear = (dist(r[1], r[5]) + dist(r[2], r[4])) / (2.0 * dist(r[0], r[3]))
+    l_ear = (dist(l[1], l[5]) + dist(l[2], l[4])) / (2.0 * dist(l[0], l[3]))
+    return (r_ear + l_ear) / 2.0
+
+
+def legacy_pose_points(landmarks, pose_landmarks):
+    """Landmark scan from HeadPoseEstimator.estimate_pose before the array stage"""
+    face_2d, face_3d = [], []
+    for idx, lm in enumerate(landmarks):
+        if idx in pose_landmarks:
+            x, y = int(lm.x * IMG_W), int(lm.y * IMG_H)
+            face_2d.append([x, y])
+            face_3d.append([x, y, lm.z])
+    return np.array(face_2d, dtype=np.float64), np.array(face_3d, dtype=np.float64)
+
+
+def timeit(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=256, help="frames per batch")
+    parser.add_argument("--faces", type=int, default=2, help="faces per frame in the batch test")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    landmarks = synthetic_landmarks(rng)
+    eye, pose = EyeTracker(smooth_window=1), HeadPoseEstimator()
+    points = landmarks_to_array(landmarks)
+    used = sorted(set(eye.used_idx) | set(pose.pose_idx.tolist()))
+
+    # Same numbers from both paths
+    assert abs(legacy_ear(landmarks, eye.right_eye_idx, eye.left_eye_idx)
+               - eye.calculate_ear_from_array(points, IMG_W, IMG_H)[0]) < 1e-9
+    legacy_2d, legacy_3d = legacy_pose_points(landmarks, pose.pose_landmarks)
+    new_2d, new_3d = pose.gather_pose_points(points, IMG_W, IMG_H)
+    assert np.array_equal(legacy_2d, new_2d) and np.allclose(legacy_3d, new_3d)
+
+    n = args.iterations
+    rows = [
+        ("to_array (all 468)", timeit(lambda: landmarks_to_array(landmarks), n)),
+        (f"to_array ({len(used)} used)", timeit(lambda: landmarks_to_array(landmarks, used), n)),
+        ("EAR legacy", timeit(lambda: legacy_ear(landmarks, eye.right_eye_idx, eye.left_eye_idx), n)),
+        ("EAR array", timeit(lambda: eye.calculate_ear_from_array(points, IMG_W, IMG_H), n)),
+        ("pose points legacy", timeit(lambda: legacy_pose_points(landmarks, pose.pose_landmarks), n)),
+        ("pose points array", timeit(lambda: pose.gather_pose_points(points, IMG_W, IMG_H), n)),
+        ("per frame legacy", timeit(lambda: (legacy_pose_points(landmarks, pose.pose_landmarks),
+                                             legacy_ear(landmarks, eye.right_eye_idx, eye.left_eye_idx)), n)),
+        ("per frame array", timeit(lambda: (lambda p: (pose.gather_pose_points(p, IMG_W, IMG_H),
+                                                       eye.calculate_ear_from_array(p, IMG_W, IMG_H)))(
+                                       landmarks_to_array(landmarks, used)), n)),
+    ]
+    for name, us in rows:
+        print(f"{name:<28} {us:8.2f} us/frame")
+
+    batch = rng.uniform(0.3, 0.7, (args.batch, args.faces, 468, 3))
+    batch_us = timeit(lambda: eye.calculate_ear_batch(batch, IMG_W, IMG_H), max(1, n // 20))
+    print(f"{'EAR batch':<28} {batch_us / (args.batch * args.faces):8.2f} us/face "
+          f"({args.batch} frames x {args.faces} faces)")
+
+
+if __name__ == "__main__":
+    main()
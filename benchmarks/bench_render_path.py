@@ -0,0 +1,140 @@
+"""Benchmark the per-frame capture -> flip -> RGB -> overlay path at 1080p.
+
+    python benchmarks/bench_render_path.py --frames 300 --width 1920 --height 1080
+
+Compares the original path (cv2.flip and cv2.cvtColor allocating new
+frames, every overlay string drawn with putText) with the pooled one
+(frames recycled through FrameBufferPool, in-place flip, cvtColor into a
+reused buffer, cached overlay sprites). Reports time, traced allocations
+and gen-0 GC collections per frame, and checks that draw_info still
+produces exactly the same pixels as before.
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import DisplayManager  # noqa: E402
+from pipeline import FrameBufferPool  # noqa: E402
+
+DIRECTIONS = ("Looking Forward", "Looking Left", "Looking Down")
+LEVELS = (("NOT DROWSY", (0, 255, 0)), ("MEDIUM", (0, 255, 255)))
+
+
+def legacy_draw_info(image, head_direction, ear, drowsiness_level, color, fps, perclos):
+    """DisplayManager.draw_info before overlay sprites"""
+    cv2.putText(image, f"Head Direction: {head_direction}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
+    cv2.putText(image, f'EAR: {np.round(ear, 3)}', (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    box_x, box_y = 20, 90
+    box_width, box_height = 300, 80
+    cv2.rectangle(image, (box_x, box_y), (box_x + box_width, box_y + box_height), (50, 50, 50), -1)
+    cv2.rectangle(image, (box_x, box_y), (box_x + box_width, box_y + box_height), color, 3)
+    text = f"DROWSINESS: {drowsiness_level}"
+    text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+    text_x = box_x + (box_width - text_size[0]) // 2
+    text_y = box_y + (box_height + text_size[1]) // 2
+    cv2.putText(image, text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    cv2.putText(image, f'FPS: {int(fps)}', (20, 320), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    cv2.putText(image, f'PERCLOS: {perclos*100:.1f}%', (20, 360), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 2)
+
+
+class FakeCapture:
+    """cv2.VideoCapture.read semantics: fill `image` if it fits, else allocate"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def read(self, image=None):
+        if image is None or image.shape != self.source.shape:
+            return True, self.source.copy()
+        np.copyto(image, self.source)
+        return True, image
+
+
+def frame_args(i):
+    level, color = LEVELS[(i // 50) % 2]
+    return DIRECTIONS[(i // 30) % 3], 0.2 + (i % 17) / 100, level, color, 25 + i % 6, (i % 40) / 100
+
+
+def legacy_frame(cap, i, state):
+    _, image = cap.read()
+    image = cv2.flip(image, 1)
+    cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    legacy_draw_info(image, *frame_args(i))
+
+
+def pooled_frame(cap, i, state):
+    pool, rgb = state["pool"], state.get("rgb")
+    _, image = cap.read(pool.acquire())
+    cv2.flip(image, 1, dst=image)
+    if rgb is None or rgb.shape != image.shape:
+        rgb = state["rgb"] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    else:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb)
+    DisplayManager.draw_info(image, *frame_args(i))
+    pool.release(image)
+
+
+def measure(step, cap, frames):
+    state = {"pool": FrameBufferPool()}
+    for i in range(10):
+        step(cap, i, state)
+
+    gc.collect()
+    gc0 = gc.get_stats()[0]["collections"]
+    start = time.perf_counter()
+    for i in range(frames):
+        step(cap, i, state)
+    elapsed = time.perf_counter() - start
+    gc0 = gc.get_stats()[0]["collections"] - gc0
+
+    tracemalloc.start()
+    peaks = []
+    for i in range(min(frames, 100)):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        step(cap, i, state)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return elapsed / frames * 1000, np.mean(peaks) / 1024, gc0 / frames * 1000
+
+
+def check_identical(source, frames=200):
+    for i in range(frames):
+        expected, actual = source.copy(), source.copy()
+        legacy_draw_info(expected, *frame_args(i))
+        DisplayManager.draw_info(actual, *frame_args(i))
+        if not np.array_equal(expected, actual):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    source = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    cap = FakeCapture(source)
+
+    print(f"{args.width}x{args.height}, {args.frames} frames")
+    print(f"{'path':<8} {'ms/frame':>9} {'KiB/frame':>10} {'gc0/1k':>7}")
+    for name, step in (("legacy", legacy_frame), ("pooled", pooled_frame)):
+        ms, kib, gc0 = measure(step, cap, args.frames)
+        print(f"{name:<8} {ms:9.2f} {kib:10.1f} {gc0:7.1f}")
+    print("draw_info pixel-identical:", check_identical(source))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark the golden-trace replay: throughput and a threshold change diff.
+
+    python benchmarks/bench_replay.py --traces 200 --duration 120 --workers 8
+
+Writes synthetic traces (alert drives, and drowsy ones where long
+closures start part-way through) with their drowsy_onset labels, saves
+golden timelines for the default settings, then replays again with a
+lower PERCLOS MEDIUM level and reports how many traces change and what
+it does to latency-to-alert and false alerts.
+
+With --head-pose the traces script head movements instead: relaxed
+posture shifts a few degrees down (alert), head drops (labelled) and
+long turns to the side. Golden timelines are saved for the current
+HeadPoseEstimator thresholds and compared with the legacy-unit
+cut-offs, showing the false CRITICAL alerts those give on true degrees.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import synthetic_sequence  # noqa: E402
+from replay import save_trace  # noqa: E402
+
+# Drowsy onsets and head drops come after 20 s of calibration / alert driving
+MIN_DURATION = 40.0
+
+
+def write_traces(directory, count, duration, fps):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        drowsy = i % 2 == 1
+        drowsy_from = float(rng.uniform(20, duration / 2)) if drowsy else 0.0
+        sequence = synthetic_sequence(duration=duration, fps=fps, drowsy=drowsy, seed=i, drowsy_from=drowsy_from)
+        save_trace(os.path.join(directory, f"trace_{i:05d}.npz"), sequence["timestamps"], sequence["landmarks"],
+                   sequence["width"], sequence["height"], drowsy_onset=sequence["drowsy_onset"])
+
+
+def write_head_pose_traces(directory, count, duration, fps):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        kind = ("posture", "drop", "turn")[i % 3]
+        onset = np.nan
+        if kind == "posture":
+            glances, t = [], 5.0
+            while t < duration - 10:
+                glances.append((t, rng.uniform(3, 10), rng.uniform(-16, -8), rng.uniform(-8, 8)))
+                t += glances[-1][1] + rng.uniform(5, 12)
+        elif kind == "drop":
+            onset = float(rng.uniform(20, duration - 20))
+            glances = [(onset, 5.0, float(rng.uniform(-40, -28)), 0.0)]
+        else:
+            start = float(rng.uniform(20, duration - 20))
+            glances = [(start, 6.0, 0.0, float(rng.choice([-1, 1]) * rng.uniform(40, 60)))]
+        sequence = synthetic_sequence(duration=duration, fps=fps, seed=i, glances=glances)
+        save_trace(os.path.join(directory, f"{kind}_{i:05d}.npz"), sequence["timestamps"], sequence["landmarks"],
+                   sequence["width"], sequence["height"], drowsy_onset=None if kind == "turn" else onset)
+
+
+def replay(directory, workers, *extra):
+    command = [sys.executable, os.path.join(ROOT, "replay.py"), directory, "--workers", str(workers), *extra]
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    print(f"$ replay.py {' '.join(extra)}  [{time.perf_counter() - start:.1f}s, exit {proc.returncode}]")
+    print(proc.stdout.rstrip())
+    if proc.returncode not in (0, 1):
+        print(proc.stderr.rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traces", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--head-pose", action="store_true", help="head-movement traces and pose thresholds")
+    args = parser.parse_args()
+    if args.duration < MIN_DURATION:
+        parser.error(f"--duration must be at least {MIN_DURATION:.0f}s")
+
+    directory = tempfile.mkdtemp(prefix="replay_bench_")
+    try:
+        start = time.perf_counter()
+        write = write_head_pose_traces if args.head_pose else write_traces
+        write(directory, args.traces, args.duration, args.fps)
+        print(f"wrote {args.traces} traces of {args.duration:.0f}s in {time.perf_counter() - start:.1f}s")
+        golden = os.path.join(directory, "golden.json")
+        if args.head_pose:
+            levels = ("--alert-levels", "CRITICAL", "DISTRACTION")
+            replay(directory, args.workers, "--save", golden, *levels)
+            legacy = ("pitch_up_threshold=23", "pitch_down_threshold=-8", "yaw_threshold=20", "forward_tolerance=10")
+            replay(directory, args.workers, "--compare", golden, "--show", "1", *levels,
+                   *(arg for setting in legacy for arg in ("--set", f"pose.{setting}")))
+            return
+        replay(directory, args.workers, "--save", golden)
+        replay(directory, args.workers, "--compare", golden, "--show", "2")
+        replay(directory, args.workers, "--compare", golden, "--show", "2", "--set", "detector.perclos_medium=0.18")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
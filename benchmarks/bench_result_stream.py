@@ -0,0 +1,81 @@
+"""Benchmark result fan-out: publish cost vs number of push subscribers.
+
+    python benchmarks/bench_result_stream.py --subscribers 1 100 500 --seconds 3
+
+A producer thread publishes synthetic results at camera rate (with a state
+change every `--state-every` frames) into one ResultChannel while N
+asyncio subscribers consume telemetry at `--rate` Hz. Reports the
+producer's per-publish cost, which should stay flat as N grows, and how
+many state changes / telemetry messages each subscriber received.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from result_stream import ResultChannel  # noqa: E402
+
+
+def produce(channel, fps, seconds, state_every, publish_times):
+    levels = ("NOT DROWSY", "MEDIUM")
+    frames = int(fps * seconds)
+    start = time.perf_counter()
+    for i in range(frames):
+        result = {"stream_id": "bench", "timestamp": i / fps, "drowsiness_level": levels[(i // state_every) % 2],
+                  "head_direction": "Looking Forward", "ear": 0.3, "perclos": 0.1, "angles": [0.0, 0.0, 0.0]}
+        t0 = time.perf_counter_ns()
+        channel.publish(result, state_changed=i % state_every == 0)
+        publish_times.append(time.perf_counter_ns() - t0)
+        time.sleep(max(0.0, start + (i + 1) / fps - time.perf_counter()))
+    channel.close()
+
+
+async def consume(channel, rate, counts):
+    async for message in channel.subscribe(rate):
+        if message is not None:
+            counts["state" if message.startswith('{"type": "state"') else "telemetry"] += 1
+
+
+async def run(subscribers, args):
+    channel = ResultChannel()
+    counts = [{"state": 0, "telemetry": 0} for _ in range(subscribers)]
+    tasks = [asyncio.create_task(consume(channel, args.rate, c)) for c in counts]
+    await asyncio.sleep(0.1)   # let every subscriber attach
+
+    publish_times = []
+    producer = threading.Thread(target=produce, args=(channel, args.fps, args.seconds, args.state_every,
+                                                      publish_times))
+    producer.start()
+    await asyncio.gather(*tasks)
+    producer.join()
+
+    us = np.array(publish_times) / 1000
+    state = np.mean([c["state"] for c in counts])
+    telemetry = np.mean([c["telemetry"] for c in counts])
+    print(f"{subscribers:>11} {np.percentile(us, 50):11.1f} {np.percentile(us, 99):11.1f} "
+          f"{state:9.1f} / {channel.transition_seq:<5} {telemetry:10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 100, 500])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--rate", type=float, default=2.0, help="telemetry Hz per subscriber")
+    parser.add_argument("--state-every", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>11} {'publish p50':>11} {'p99 (us)':>11} {'state msgs/sub':>17} {'telemetry':>10}")
+    for n in args.subscribers:
+        asyncio.run(run(n, args))
+
+
+if __name__ == "__main__":
+    main()
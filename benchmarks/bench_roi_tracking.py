@@ -0,0 +1,88 @@
+"""Compare full-frame FaceMesh with ROI tracking mode.
+
+    python benchmarks/bench_roi_tracking.py --video drive.mp4 --frames 600
+
+Each frame of the clip is upscaled/downscaled to 720p and 1080p and run
+through FaceMeshDetector with and without `roi_tracking`. Reports ms per
+frame, the share of full-frame passes, and how far the ROI EAR drifts
+from the full-frame EAR on the same frames.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from FaceMeshDetector import FaceMeshDetector  # noqa: E402
+from EyeTracker import EyeTracker  # noqa: E402
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def load_frames(source, limit):
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    frames = []
+    while len(frames) < limit:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"No frames read from {source}")
+    return frames
+
+
+def run(detector, frames):
+    """Return (seconds per frame, raw EAR per frame or NaN)"""
+    tracker = EyeTracker(smooth_window=1)
+    ears, elapsed = [], 0.0
+    for frame in frames:
+        start = time.perf_counter()
+        results = detector.detect_landmarks(frame)
+        elapsed += time.perf_counter() - start
+
+        if results.multi_face_landmarks:
+            ear, _, _ = tracker.calculate_ear(frame, results.multi_face_landmarks[0].landmark)
+            ears.append(ear)
+        else:
+            ears.append(np.nan)
+    return elapsed / len(frames), np.array(ears)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", required=True, help="video file or camera index")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--redetect-interval", type=int, default=30)
+    parser.add_argument("--roi-max-size", type=int, default=256)
+    args = parser.parse_args()
+
+    source_frames = load_frames(args.video, args.frames)
+
+    for name, size in RESOLUTIONS.items():
+        frames = [cv2.resize(f, size) for f in source_frames]
+
+        full_time, full_ear = run(FaceMeshDetector(), frames)
+        roi = FaceMeshDetector(roi_tracking=True, redetect_interval=args.redetect_interval,
+                               roi_max_size=args.roi_max_size)
+        roi_time, roi_ear = run(roi, frames)
+
+        both = ~np.isnan(full_ear) & ~np.isnan(roi_ear)
+        ear_err = np.abs(full_ear[both] - roi_ear[both])
+        full_share = roi.stats["full"] / len(frames)
+
+        print(f"{name:>5}: full {1000 * full_time:6.2f} ms | roi {1000 * roi_time:6.2f} ms "
+              f"({full_time / roi_time:4.2f}x) | full passes {full_share:5.1%} "
+              f"| EAR |err| mean {ear_err.mean() if both.any() else float('nan'):.4f} "
+              f"max {ear_err.max() if both.any() else float('nan'):.4f} "
+              f"| face found full/roi {np.mean(~np.isnan(full_ear)):.1%}/{np.mean(~np.isnan(roi_ear)):.1%}")
+
+
+if __name__ == "__main__":
+    main()
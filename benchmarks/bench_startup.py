@@ -0,0 +1,100 @@
+"""Benchmark service startup: import time, time to ready and first-frame latency.
+
+    python benchmarks/bench_startup.py --repeat 5 --warm 2 --image frame.jpg
+
+Every measurement runs in a fresh interpreter, as a new pod would:
+
+  import  -- `import app` only (no FaceMesh should be built or imported)
+  cold    -- import, then the first frame through the pool with no warm-up
+  warm    -- import, warm_up() the pool (what /ready waits for), then the
+             first frame
+
+For each it reports the median import time, time until the pool is ready,
+first-frame latency and peak RSS. Without --image a blank frame is used,
+which exercises model loading and face detection but not the landmark
+model.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+MODES = ("import", "cold", "warm")
+
+
+def child(mode, warm, image_path):
+    start = time.perf_counter()
+    import app
+    import numpy as np
+    result = {"import_s": time.perf_counter() - start,
+              "mediapipe_at_import": "mediapipe" in sys.modules}
+
+    if mode != "import":
+        if image_path:
+            import cv2
+            frame = cv2.imread(image_path)
+        else:
+            frame = np.zeros((480, 640, 3), np.uint8)
+        models = app.sessions.pool.models
+        if mode == "warm":
+            models.warm = min(warm, models.size)
+            start = time.perf_counter()
+            if not models.warm_up():
+                raise SystemExit(f"warm-up failed: {models.error}")
+            result["ready_s"] = time.perf_counter() - start
+        start = time.perf_counter()
+        app.sessions.pool.detect(frame)
+        result["first_frame_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        app.sessions.pool.detect(frame)
+        result["second_frame_ms"] = (time.perf_counter() - start) * 1000
+        app.sessions.shutdown()
+
+    # ru_maxrss is KiB on Linux
+    result["rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+
+def run(mode, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, "--warm", str(args.warm)]
+    if args.image:
+        command += ["--image", args.image]
+    proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"{mode} run failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warm", type=int, default=2, help="FaceMesh instances warmed in 'warm' mode")
+    parser.add_argument("--image", help="frame for the first inference (default: blank)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.warm, args.image)
+        return
+
+    columns = ("import_s", "ready_s", "first_frame_ms", "second_frame_ms", "rss_mib")
+    print(f"{'mode':<8} " + " ".join(f"{c:>15}" for c in columns) + "  mediapipe at import")
+    for mode in args.modes:
+        runs = [run(mode, args) for _ in range(args.repeat)]
+        cells = []
+        for column in columns:
+            values = [r[column] for r in runs if column in r]
+            cells.append(f"{statistics.median(values):15.3f}" if values else f"{'-':>15}")
+        loaded = any(r["mediapipe_at_import"] for r in runs)
+        print(f"{mode:<8} " + " ".join(cells) + f"  {'yes' if loaded else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
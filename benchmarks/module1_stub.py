@@ -0,0 +1,54 @@
+"""Local stand-in for the Module 1 enhancement service.
+
+    python benchmarks/module1_stub.py --port 8001 --delay-ms 20
+
+Accepts the same multipart upload as Module 1 (JPEG, PNG or raw pixels with
+an X-Frame-Shape header), applies a cheap brightness/contrast boost and
+replies in the same format after an optional artificial delay.
+"""
+import argparse
+import asyncio
+
+import cv2
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.responses import Response
+
+app = FastAPI(title="Module 1 stub")
+app.state.delay_ms = 0.0
+
+
+@app.post("/enhance_frame/")
+async def enhance_frame(request: Request, file: UploadFile = File(...)):
+    data = await file.read()
+    shape = request.headers.get("X-Frame-Shape")
+
+    if shape:
+        h, w, c = (int(v) for v in shape.split(","))
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(h, w, c)
+    else:
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    enhanced = cv2.convertScaleAbs(frame, alpha=1.2, beta=10)
+
+    if app.state.delay_ms:
+        await asyncio.sleep(app.state.delay_ms / 1000)
+
+    if shape:
+        return Response(enhanced.tobytes(), media_type="application/octet-stream",
+                        headers={"X-Frame-Shape": shape})
+    ext, media_type = (".png", "image/png") if file.content_type == "image/png" else (".jpg", "image/jpeg")
+    _, buffer = cv2.imencode(ext, enhanced)
+    return Response(buffer.tobytes(), media_type=media_type)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="artificial processing delay")
+    args = parser.parse_args()
+
+    app.state.delay_ms = args.delay_ms
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,233 @@
+"""Per-stage benchmark harness.
+
+    python benchmarks/run_benchmarks.py --save baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json
+
+Times every pipeline stage on its own: BGR->RGB conversion, FaceMesh
+(with --facemesh), landmark conversion, estimate_pose/solvePnP,
+calculate_ear, PERCLOS/update_state and DisplayManager.draw_info. The
+logic stages replay a synthetic landmark stream (or a recorded fixture
+via --fixture), so no camera is needed.
+
+For each stage it reports p50/p95/p99 latency, the mean peak of traced
+allocations per frame (tracemalloc) and gen-0 GC collections per 1000
+frames. Results can be saved as JSON and compared against a baseline
+from another commit; --compare exits non-zero when a stage's p50 is
+slower than the baseline by more than --tolerance.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import synthetic_sequence, load_fixture  # noqa: E402
+from EyeTracker import EyeTracker  # noqa: E402
+from HeadPoseEstimator import HeadPoseEstimator  # noqa: E402
+from drowsiness_logic import EnhancedDrowsinessDetector  # noqa: E402
+from landmark_array import landmarks_to_array  # noqa: E402
+
+Landmark = namedtuple("Landmark", ["x", "y", "z"])
+
+
+def measure(fn, n_inputs, iterations, warmup=20, alloc_iterations=200):
+    """Time fn(i) for i cycling over the inputs; returns a metrics dict"""
+    for i in range(min(warmup, iterations)):
+        fn(i % n_inputs)
+
+    times = np.empty(iterations)
+    gc0_before = gc.get_stats()[0]["collections"]
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(i % n_inputs)
+        times[i] = time.perf_counter_ns() - start
+    gc0 = gc.get_stats()[0]["collections"] - gc0_before
+
+    # Separate pass: tracemalloc slows everything down, so it is not timed
+    peaks = []
+    tracemalloc.start()
+    for i in range(min(alloc_iterations, iterations)):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(i % n_inputs)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    us = times / 1000.0
+    return {
+        "p50_us": float(np.percentile(us, 50)),
+        "p95_us": float(np.percentile(us, 95)),
+        "p99_us": float(np.percentile(us, 99)),
+        "mean_us": float(us.mean()),
+        "alloc_peak_kib": float(np.mean(peaks) / 1024) if peaks else 0.0,
+        "gc0_per_1k_frames": 1000.0 * gc0 / iterations,
+    }
+
+
+def build_stages(sequence, args):
+    """Return {name: (fn(i), n_inputs)} for every stage that can run here"""
+    w, h = sequence["width"], sequence["height"]
+    timestamps = sequence["timestamps"]
+    landmarks = sequence["landmarks"].astype(np.float64)
+    n = len(timestamps)
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+
+    eye_tracker = EyeTracker()
+    head_pose = HeadPoseEstimator()
+    detector = EnhancedDrowsinessDetector()
+    used = sorted(set(eye_tracker.used_idx) | set(head_pose.pose_idx.tolist()))
+
+    # Per-frame inputs for the logic stages, computed once up front
+    objects = [[Landmark(*row) for row in landmarks[i].tolist()] for i in range(min(n, 300))]
+    ears = [EyeTracker(smooth_window=1).calculate_ear_from_array(landmarks[i], w, h)[0] for i in range(n)]
+    poses = [head_pose.estimate_pose_from_array(landmarks[i], w, h) for i in range(n)]
+    directions = [p['direction'] if p else "Unknown" for p in poses]
+
+    # Replayed timestamps keep increasing across passes over the sequence
+    period = float(timestamps[-1] + timestamps[1] - timestamps[0]) if n > 1 else 1.0
+    state_calls = [0]
+
+    def update_state(i):
+        t = timestamps[i] + period * (state_calls[0] // n)
+        state_calls[0] += 1
+        detector.update_blink(ears[i], directions[i], t)
+        detector.update_state(directions[i], t)
+        return detector.get_status()
+
+    stages = {
+        "bgr_to_rgb": (lambda i: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1),
+        "landmarks_to_array": (lambda i: landmarks_to_array(objects[i], used), len(objects)),
+        "estimate_pose": (lambda i: head_pose.estimate_pose_from_array(landmarks[i], w, h), n),
+        "calculate_ear": (lambda i: eye_tracker.calculate_ear_from_array(landmarks[i], w, h), n),
+        "perclos_update_state": (update_state, n),
+    }
+
+    try:
+        from main import DisplayManager
+        stages["draw_info"] = (lambda i: DisplayManager.draw_info(
+            frame, directions[i], ears[i], "NOT DROWSY", (0, 255, 0), 30.0, 0.1), n)
+    except ImportError as exc:
+        print(f"skipping draw_info: {exc}")
+
+    if args.facemesh:
+        from FaceMeshDetector import FaceMeshDetector
+        face_detector = FaceMeshDetector()
+        frames = load_video_frames(args.video, w, h) if args.video else [frame]
+        stages["facemesh"] = (lambda i: face_detector.detect_landmarks(frames[i]), len(frames))
+
+    return stages
+
+
+def load_video_frames(path, w, h, limit=300):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        success, image = cap.read()
+        if not success:
+            break
+        frames.append(cv2.resize(image, (w, h)))
+    cap.release()
+    return frames
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print p50 deltas against a baseline; return names of regressed stages"""
+    regressions = []
+    print(f"\nvs baseline {baseline['environment'].get('commit', '?')}:")
+    for name, metrics in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = metrics["p50_us"] / old["p50_us"] if old["p50_us"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  <-- REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<22} p50 {old['p50_us']:9.1f} -> {metrics['p50_us']:9.1f} us ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fixture", help="recorded landmark fixture (.npz) instead of synthetic data")
+    parser.add_argument("--facemesh", action="store_true", help="also benchmark MediaPipe FaceMesh")
+    parser.add_argument("--video", help="frames for the FaceMesh stage (default: noise image)")
+    parser.add_argument("--stages", help="comma-separated subset of stages to run")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 slowdown (fraction)")
+    args = parser.parse_args()
+
+    if args.fixture:
+        sequence = load_fixture(args.fixture)
+    else:
+        sequence = synthetic_sequence(duration=60.0, width=args.width, height=args.height)
+
+    stages = build_stages(sequence, args)
+    if args.stages:
+        wanted = args.stages.split(",")
+        stages = {name: stage for name, stage in stages.items() if name in wanted}
+
+    results = {}
+    print(f"{'stage':<22} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'alloc KiB':>10} {'gc0/1k':>7}")
+    for name, (fn, n_inputs) in stages.items():
+        iterations = min(args.iterations, 200) if name == "facemesh" else args.iterations
+        metrics = measure(fn, n_inputs, iterations)
+        results[name] = metrics
+        print(f"{name:<22} {metrics['p50_us']:9.1f} {metrics['p95_us']:9.1f} {metrics['p99_us']:9.1f} "
+              f"{metrics['alloc_peak_kib']:10.1f} {metrics['gc0_per_1k_frames']:7.1f}")
+
+    report = {
+        "environment": environment(),
+        "config": {"iterations": args.iterations, "width": args.width, "height": args.height,
+                   "fixture": args.fixture},
+        "results": results,
+    }
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Synthetic FaceMesh landmark streams and recorded fixtures for benchmarks.
+
+Sequences are plain dicts with the same keys as recorded fixtures, so
+logic-only benchmarks can replay either without a camera or MediaPipe:
+
+    timestamps  (T,)        float64 seconds
+    landmarks   (T, 468, 3) float32 normalised x, y, z (one face per frame)
+    width, height           frame size the landmarks refer to
+"""
+import cv2
+import numpy as np
+
+NUM_LANDMARKS = 468
+
+# FaceMesh indices used by EyeTracker (p1..p6) and HeadPoseEstimator
+RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+LEFT_EYE = [33, 160, 158, 133, 153, 144]
+POSE_POINTS = {1: (0.50, 0.50, -0.05), 61: (0.46, 0.60, 0.0),
+               291: (0.54, 0.60, 0.0), 199: (0.50, 0.70, 0.0)}
+
+EYE_WIDTH = 0.04      # normalised (x) width of each eye
+OPEN_EAR = 0.30
+CLOSED_EAR = 0.08
+
+
+def _place_eye(points, idx, x0, cy, ear, img_w, img_h):
+    """Write a 6-point eye contour whose EAR is exactly `ear`"""
+    width_px = EYE_WIDTH * img_w
+    half_h = ear * width_px / 2 / img_h    # vertical half-opening, normalised y
+    xs = [x0, x0 + EYE_WIDTH / 3, x0 + 2 * EYE_WIDTH / 3, x0 + EYE_WIDTH,
+          x0 + 2 * EYE_WIDTH / 3, x0 + EYE_WIDTH / 3]
+    ys = [cy, cy - half_h, cy - half_h, cy, cy + half_h, cy + half_h]
+    points[idx, 0] = xs
+    points[idx, 1] = ys
+    points[idx, 2] = 0.0
+
+
+def ear_schedule(timestamps, drowsy=False, seed=0, drowsy_from=0.0):
+    """Ground-truth EAR per frame: regular short blinks, plus long slow
+    closures from `drowsy_from` seconds on when `drowsy`"""
+    rng = np.random.default_rng(seed)
+    ear = np.full(len(timestamps), OPEN_EAR)
+    duration = timestamps[-1] if len(timestamps) else 0.0
+
+    t = rng.uniform(0.5, 3.0)
+    while t < duration:
+        if drowsy and t >= drowsy_from and rng.random() < 0.6:
+            length = rng.uniform(0.6, 1.5)      # microsleep-like closure
+            gap = rng.uniform(0.5, 2.0)
+        else:
+            length = rng.uniform(0.1, 0.25)     # normal blink
+            gap = rng.uniform(2.0, 5.0)
+        ear[(timestamps >= t) & (timestamps < t + length)] = CLOSED_EAR
+        t += length + gap
+
+    return ear + rng.normal(0, 0.01, len(ear))
+
+
+def pose_rotation(pitch_up, yaw_right):
+    """Rotation vector for HeadPoseEstimator's sign convention (degrees)"""
+    a, b = np.radians(-pitch_up), np.radians(-yaw_right)
+    rx = np.array([[1, 0, 0], [0, np.cos(a), -np.sin(a)], [0, np.sin(a), np.cos(a)]])
+    ry = np.array([[np.cos(b), 0, np.sin(b)], [0, 1, 0], [-np.sin(b), 0, np.cos(b)]])
+    return cv2.Rodrigues(rx @ ry)[0]
+
+
+def _project_pose(pitch, yaw, width, height):
+    """Normalised image positions of the canonical model's pose landmarks
+    for a head turned by (pitch, yaw) degrees, 650 mm from the camera"""
+    from HeadPoseEstimator import CANONICAL_FACE_MODEL
+    idx = sorted(CANONICAL_FACE_MODEL)
+    model = np.array([CANONICAL_FACE_MODEL[i] for i in idx], dtype=np.float64)
+    cam = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1]], dtype=np.float64)
+    projected, _ = cv2.projectPoints(model, pose_rotation(pitch, yaw), np.array([0.0, 0.0, 650.0]), cam, np.zeros(4))
+    return dict(zip(idx, (projected.reshape(-1, 2) / (width, height)).tolist()))
+
+
+def synthetic_sequence(duration=60.0, fps=30.0, width=1280, height=720, drowsy=False, seed=0, drowsy_from=0.0,
+                       glances=()):
+    """Single-face landmark stream with blinks, small head sway and jitter.
+
+    `glances` is a list of (start, seconds, pitch, yaw): the head is turned
+    by that many degrees for that long. When given, the pose landmarks
+    come from projecting the canonical face model every frame.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(0, duration, 1.0 / fps)
+    ear = ear_schedule(timestamps, drowsy, seed, drowsy_from)
+
+    # Static face template: filler landmarks inside the face box
+    template = np.empty((NUM_LANDMARKS, 3))
+    template[:, 0] = rng.uniform(0.40, 0.60, NUM_LANDMARKS)
+    template[:, 1] = rng.uniform(0.35, 0.75, NUM_LANDMARKS)
+    template[:, 2] = rng.normal(0, 0.02, NUM_LANDMARKS)
+    for idx, xyz in POSE_POINTS.items():
+        template[idx] = xyz
+
+    landmarks = np.empty((len(timestamps), NUM_LANDMARKS, 3), dtype=np.float32)
+    sway = 0.01 * np.sin(2 * np.pi * timestamps / 7.0)
+    for i, t in enumerate(timestamps):
+        frame = template.copy()
+        if glances:
+            pitch = yaw = 0.0
+            for start, length, glance_pitch, glance_yaw in glances:
+                if start <= t < start + length:
+                    pitch, yaw = glance_pitch, glance_yaw
+            pose = _project_pose(pitch, yaw, width, height)
+            for idx, (x, y) in pose.items():
+                frame[idx, :2] = x, y
+            # Eye contours start at the projected outer corners (33, 263)
+            _place_eye(frame, LEFT_EYE, pose[33][0], pose[33][1], ear[i], width, height)
+            _place_eye(frame, RIGHT_EYE, pose[263][0] - EYE_WIDTH, pose[263][1], ear[i], width, height)
+        else:
+            _place_eye(frame, LEFT_EYE, 0.44, 0.42, ear[i], width, height)
+            _place_eye(frame, RIGHT_EYE, 0.52, 0.42, ear[i], width, height)
+        frame[:, 0] += sway[i]
+        frame[:, :2] += rng.normal(0, 0.0005, (NUM_LANDMARKS, 2))
+        landmarks[i] = frame
+
+    return {"timestamps": timestamps, "landmarks": landmarks,
+            "width": width, "height": height, "ear": ear,
+            "drowsy_onset": drowsy_from if drowsy else np.nan}
+
+
+def load_fixture(path):
+    """Load a recorded landmark fixture (.npz with the keys above)"""
+    with np.load(path) as data:
+        return {"timestamps": data["timestamps"], "landmarks": data["landmarks"],
+                "width": int(data["width"]), "height": int(data["height"])}
+
+
+def save_fixture(path, sequence):
+    np.savez_compressed(path, timestamps=sequence["timestamps"], landmarks=sequence["landmarks"],
+                        width=sequence["width"], height=sequence["height"])
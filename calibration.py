@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from metrics import RateLimitedLog
+
+# Startup and calibration-end events only: every one is worth a line
+log = RateLimitedLog("drowsiness.calibration", interval=0.0)
+
+
+class RunningStats:
+    """Welford's running mean / variance over scalars or fixed-size vectors"""
+
+    def __init__(self, size=None):
+        self._shape = () if size is None else (size,)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = np.zeros(self._shape)
+        self._m2 = np.zeros(self._shape)
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self._m2)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class ProfileStore:
+    """Per-driver calibration profiles as JSON files, cached in memory.
+
+    Every profile in `directory` is read once at startup; lookups after that
+    never touch the disk, and saves write through to both.
+    """
+
+    def __init__(self, directory="profiles"):
+        self.directory = directory
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.load_all()
+
+    def _path(self, driver_id):
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", str(driver_id))
+        return os.path.join(self.directory, f"{safe_id}.json")
+
+    def load_all(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profile = json.load(f)
+                self._validate(profile)
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                log.warning("profile_skipped", file=name, error=f"{type(exc).__name__}: {exc}")
+                continue
+            with self._lock:
+                self._cache[profile["driver_id"]] = profile
+
+    @staticmethod
+    def _validate(profile):
+        """Raise if a profile lacks what AutoCalibrator.apply() reads"""
+        hash(profile["driver_id"])
+        for axis in ("pitch", "yaw", "roll"):
+            float(profile["pose_offset"][axis])
+        float(profile["ear_threshold"])
+
+    def get(self, driver_id):
+        with self._lock:
+            return self._cache.get(driver_id)
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile["driver_id"])
+        # Write-then-rename so a crash never leaves a half-written profile
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f, indent=2)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._cache[profile["driver_id"]] = profile
+
+    def __contains__(self, driver_id):
+        return self.get(driver_id) is not None
+
+
+class AutoCalibrator:
+    """Learns a driver's neutral head pose and open-eye EAR.
+
+    Feeds on the first seconds of steady, forward-facing, eyes-open frames
+    and then writes the results into the HeadPoseEstimator
+    (`calibration_offset`, `is_calibrated`) and the drowsiness detector
+    (`ear_threshold`). A stored profile for the driver skips the whole
+    process.
+    """
+
+    def __init__(self, head_pose_estimator, drowsiness_detector, driver_id="default", store=None,
+                 duration=5.0, min_samples=60, forward_gate=30.0, steady_gate=12.0,
+                 min_open_ear=0.15, ear_ratio=0.75, ear_threshold_range=(0.15, 0.30)):
+        self.head_pose_estimator = head_pose_estimator
+        self.drowsiness_detector = drowsiness_detector
+        self.driver_id = driver_id
+        self.store = store
+
+        self.duration = duration                    # seconds of accepted frames required
+        self.min_samples = min_samples
+        self.forward_gate = forward_gate            # |raw pitch/yaw| (degrees) to count as forward
+        self.steady_gate = steady_gate              # max distance from the running neutral pose
+        self.min_open_ear = min_open_ear            # below this the eyes are treated as closed
+        self.ear_ratio = ear_ratio                  # threshold = open-eye EAR * ratio
+        self.ear_threshold_range = ear_threshold_range
+
+        self.pose_stats = RunningStats(3)
+        self.ear_stats = RunningStats()
+        self.first_sample_time = None
+        self.profile = None
+        self.calibrating = True
+
+        profile = store.get(driver_id) if store is not None else None
+        if profile is not None:
+            self.apply(profile)
+
+    @property
+    def is_calibrated(self):
+        return self.profile is not None
+
+    def start(self):
+        """Discard running statistics and learn the driver again"""
+        self.pose_stats.reset()
+        self.ear_stats.reset()
+        self.first_sample_time = None
+        self.calibrating = True
+
+    def update(self, angles, ear, timestamp):
+        """Offer one frame (calibrated pitch/yaw/roll, smoothed EAR).
+        Returns True on the frame calibration completes."""
+        if not self.calibrating:
+            return False
+
+        # Undo the current offset so a recalibration sees raw angles
+        offset = self.head_pose_estimator.calibration_offset
+        raw = np.array((angles[0] + offset['pitch'], angles[1] + offset['yaw'],
+                        angles[2] + offset['roll']))
+        if np.abs(raw[:2]).max() > self.forward_gate or ear < self.min_open_ear:
+            return False
+
+        if self.pose_stats.count >= 10:
+            # Skip glances and blinks once a rough baseline exists
+            if np.abs(raw[:2] - self.pose_stats.mean[:2]).max() > self.steady_gate:
+                return False
+            if ear < self.ear_stats.mean - 2.5 * float(self.ear_stats.std):
+                return False
+
+        self.pose_stats.update(raw)
+        self.ear_stats.update(ear)
+        if self.first_sample_time is None:
+            self.first_sample_time = timestamp
+
+        if (self.pose_stats.count >= self.min_samples
+                and timestamp - self.first_sample_time >= self.duration):
+            self.finish()
+            return True
+        return False
+
+    def finish(self):
+        pitch, yaw, roll = self.pose_stats.mean.tolist()
+        open_ear = float(self.ear_stats.mean)
+        low, high = self.ear_threshold_range
+        profile = {
+            "driver_id": self.driver_id,
+            "pose_offset": {"pitch": pitch, "yaw": yaw, "roll": roll},
+            "pose_std": self.pose_stats.std.tolist(),
+            "open_ear": open_ear,
+            "open_ear_std": float(self.ear_stats.std),
+            "ear_threshold": min(max(open_ear * self.ear_ratio, low), high),
+            "samples": self.pose_stats.count,
+            "calibrated_at": time.time(),
+        }
+        self.apply(profile)
+
+        if self.store is not None:
+            try:
+                self.store.save(profile)
+            except OSError as exc:
+                log.warning("profile_save_failed", driver_id=self.driver_id, error=exc)
+        return profile
+
+    def apply(self, profile):
+        """Push a profile into the pose estimator and drowsiness detector"""
+        self.head_pose_estimator.calibration_offset = dict(profile["pose_offset"])
+        self.head_pose_estimator.is_calibrated = True
+        self.drowsiness_detector.ear_threshold = profile["ear_threshold"]
+        self.profile = profile
+        self.calibrating = False
+
+    def summary(self):
+        return {
+            "driver_id": self.driver_id,
+            "calibrated": self.is_calibrated,
+            "calibrating": self.calibrating,
+            "samples": self.pose_stats.count if self.calibrating else self.profile["samples"],
+            "ear_threshold": self.drowsiness_detector.ear_threshold,
+        }
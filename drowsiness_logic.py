@@ -1,116 +1,352 @@
-import time
-from collections import deque
-
-class EnhancedDrowsinessDetector:
-    def __init__(self, ear_threshold=0.26, window_seconds=20):
-        self.ear_threshold = ear_threshold
-        self.drowsiness_level = "NOT DROWSY"
-        self.color = (0, 255, 0)
-
-        # Store (timestamp, is_closed) for last `window_seconds`
-        self.window_seconds = window_seconds
-        self.eye_history = deque()
-
-        # Head direction tracking
-        self.last_direction = "Looking Forward"
-        self.direction_start_time = time.time()
-        self.away_start_time = None
-        self.away_period = 1.0  # seconds
-        self.min_perclos_time = 12  # seconds of forward data required
-        self.avg_fps = 20           # based on your measured FPS
-
-
-
-    def update_blink(self, ear, head_direction):
-    
-     now = time.time()
-     is_closed = ear < self.ear_threshold
-
-     if head_direction == "Looking Forward":
-        # Reset away timer since we're back to forward
-        self.away_start_time = None  
-
-        # Track closure history
-        self.eye_history.append((now, is_closed))
-
-        # Keep only recent frames
-        while self.eye_history and now - self.eye_history[0][0] > self.window_seconds:
-            self.eye_history.popleft()
-
-     else:
-        # Start grace period timer if just looked away
-        if self.away_start_time is None:
-            self.away_start_time = now
-
-        # If away longer than grace period → reset PERCLOS
-        if now - self.away_start_time > self.away_period:
-            self.eye_history.clear()
-
-    def calculate_perclos(self):
-        if not self.eye_history:
-         return 0.0
-
-        now = time.time()
-        weighted_closed = 0
-        weighted_total = 0
-
-        for t, closed in self.eye_history:
-         age = now - t
-        # weight recent frames higher
-         weight = 2 if age <= 10 else 1
-         weighted_total += weight
-         if closed:
-            weighted_closed += weight
-
-        return weighted_closed / weighted_total if weighted_total > 0 else 0.0
-
-    def update_head_direction(self, head_direction):
-        """Track sustained head direction."""
-        now = time.time()
-        if head_direction != self.last_direction:
-            self.last_direction = head_direction
-            self.direction_start_time = now
-
-        sustained_time = now - self.direction_start_time
-        return head_direction, sustained_time
-
-    def update_state(self, head_direction):
-     head_direction, sustained_time = self.update_head_direction(head_direction)
-     perclos = self.calculate_perclos()
-     #eyes_closed_now = self.eye_history[-1][1] if self.eye_history else False
-
-    # ---- Critical: head down/up too long ----
-     if head_direction in ["Looking Down", "Looking Up"] and sustained_time > 2.5:
-        self.drowsiness_level = "CRITICAL"
-        self.color = (0, 0, 255)
-
-    # ---- Distraction: left/right too long ----
-     elif head_direction in ["Looking Left", "Looking Right"] and sustained_time > 3:
-        self.drowsiness_level = "DISTRACTION"
-        self.color = (0, 165, 255)
-
-     elif head_direction == "Looking Forward":
-      min_frames_required = int(self.min_perclos_time * self.avg_fps)
-
-      if len(self.eye_history) >= min_frames_required:
-        if perclos > 0.40:
-            self.drowsiness_level = "CRITICAL"
-            self.color = (0, 0, 255)
-        elif perclos > 0.25:
-            self.drowsiness_level = "MEDIUM"
-            self.color = (0, 255, 255)
-        else:
-            self.drowsiness_level = "NOT DROWSY"
-            self.color = (0, 255, 0)
-      else:
-        # Not enough data yet → safe default
-        self.drowsiness_level = "NOT DROWSY"
-        self.color = (0, 255, 0)
-
-     else:
-        # If no valid state, stay normal
-        self.drowsiness_level = "NOT DROWSY"
-        self.color = (0, 255, 0)
-
-    def get_status(self):
-        return self.drowsiness_level, self.color, self.calculate_perclos()
+import time
+from array import array
+from collections import deque, namedtuple
+
+# One completed eye closure; `microsleep` when it lasted microsleep_seconds or more
+BlinkEvent = namedtuple("BlinkEvent", ["start", "end", "duration", "microsleep"])
+
+
+class ClosureHistory:
+    """Ring buffer of (timestamp, is_closed) samples for PERCLOS.
+
+    Timestamps live in a packed float array and closure flags in a
+    bytearray. Two moving boundaries split the buffer into "older than
+    `recent_seconds`" and "recent" samples, and running counts are kept for
+    both, so appending, expiring and computing the weighted PERCLOS are all
+    O(1) amortised instead of a scan over the whole window.
+
+    Each sample also carries the number of camera frames it stands for
+    (1 + frames skipped before it), and the counts are frame counts, so
+    PERCLOS is unchanged when inference runs on a subset of frames.
+    """
+
+    def __init__(self, window_seconds=20, recent_seconds=10, capacity=1024):
+        self.window_seconds = window_seconds
+        self.recent_seconds = recent_seconds
+        self._capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._closed = bytearray(capacity)
+        self._weights = array('H', bytes(2 * capacity))
+        self.clear()
+
+    def clear(self):
+        # Absolute sample counters; slot = counter % capacity
+        self._start = 0          # oldest sample inside the window
+        self._recent_start = 0   # oldest sample inside the recent window
+        self._end = 0            # one past the newest sample
+        self._frame_count = 0
+        self._closed_count = 0
+        self._recent_frames = 0
+        self._recent_closed = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def span(self, now):
+        """Seconds of history covered, from the oldest sample up to `now`"""
+        if self._end == self._start:
+            return 0.0
+        return now - self._times[self._start % self._capacity]
+
+    def __iter__(self):
+        for i in range(self._start, self._end):
+            slot = i % self._capacity
+            yield self._times[slot], bool(self._closed[slot])
+
+    def _grow(self):
+        # Re-lay the live samples out from slot 0 in a buffer twice the size
+        times = array('d', bytes(16 * self._capacity))
+        closed = bytearray(2 * self._capacity)
+        weights = array('H', bytes(4 * self._capacity))
+        for j, i in enumerate(range(self._start, self._end)):
+            slot = i % self._capacity
+            times[j] = self._times[slot]
+            closed[j] = self._closed[slot]
+            weights[j] = self._weights[slot]
+
+        self._recent_start -= self._start
+        self._end -= self._start
+        self._start = 0
+        self._capacity *= 2
+        self._times, self._closed, self._weights = times, closed, weights
+
+    def append(self, timestamp, is_closed, frames=1):
+        """Add a sample standing for `frames` camera frames"""
+        if len(self) == self._capacity:
+            self._grow()
+
+        frames = max(1, min(frames, 0xFFFF))
+        slot = self._end % self._capacity
+        self._times[slot] = timestamp
+        self._closed[slot] = 1 if is_closed else 0
+        self._weights[slot] = frames
+        self._end += 1
+        self._frame_count += frames
+        self._recent_frames += frames
+        if is_closed:
+            self._closed_count += frames
+            self._recent_closed += frames
+
+    def _advance_recent(self, now):
+        while self._recent_start < self._end:
+            slot = self._recent_start % self._capacity
+            if now - self._times[slot] <= self.recent_seconds:
+                break
+            self._recent_frames -= self._weights[slot]
+            self._recent_closed -= self._closed[slot] * self._weights[slot]
+            self._recent_start += 1
+
+    def expire(self, now):
+        """Drop samples older than the window"""
+        self._advance_recent(now)
+        # The recent boundary is always at or ahead of the window boundary
+        while self._start < self._recent_start:
+            slot = self._start % self._capacity
+            if now - self._times[slot] <= self.window_seconds:
+                break
+            self._frame_count -= self._weights[slot]
+            self._closed_count -= self._closed[slot] * self._weights[slot]
+            self._start += 1
+
+    def perclos(self, now):
+        """Closed fraction with recent samples counted twice"""
+        if self._end == self._start:
+            return 0.0
+
+        self._advance_recent(now)
+        weighted_total = self._frame_count + self._recent_frames
+        weighted_closed = self._closed_count + self._recent_closed
+        return weighted_closed / weighted_total
+
+
+class BlinkDetector:
+    """Streaming blink segmentation on the smoothed EAR.
+
+    Eyes count as closed when EAR drops below the EAR threshold and as
+    open again only once it rises above threshold * (1 + hysteresis), so
+    noise around the threshold does not split one blink into several.
+    Each closure becomes a BlinkEvent with its duration; a closure that
+    reaches `microsleep_seconds` raises `microsleep` while it is still
+    going on and for `microsleep_hold` seconds after the eyes reopen.
+    Blink rate is per minute over the last `rate_window` seconds. Every
+    update is O(1) amortised.
+    """
+
+    def __init__(self, hysteresis=0.10, microsleep_seconds=0.5, microsleep_hold=2.0, rate_window=60.0):
+        self.hysteresis = hysteresis
+        self.microsleep_seconds = microsleep_seconds
+        self.microsleep_hold = microsleep_hold
+        self.rate_window = rate_window
+        self.reset()
+
+    def reset(self):
+        self.closed_since = None        # start of the closure in progress
+        self.last_event = None
+        self.blink_count = 0
+        self.microsleep_count = 0
+        self.microsleep_until = None    # end of the current microsleep hold
+        self.first_time = None
+        self._blink_times = deque()     # end times of blinks inside rate_window
+
+    def update(self, ear, threshold, timestamp):
+        """Feed one frame; returns a BlinkEvent when a closure ends"""
+        if self.first_time is None:
+            self.first_time = timestamp
+        event = None
+        if self.closed_since is None:
+            if ear < threshold:
+                self.closed_since = timestamp
+        elif ear > threshold * (1 + self.hysteresis):
+            duration = timestamp - self.closed_since
+            event = BlinkEvent(self.closed_since, timestamp, duration, duration >= self.microsleep_seconds)
+            self.closed_since = None
+            self.last_event = event
+            if event.microsleep:
+                self.microsleep_count += 1
+                self.microsleep_until = timestamp + self.microsleep_hold
+            else:
+                self.blink_count += 1
+                self._blink_times.append(timestamp)
+
+        if self.closed_since is not None and timestamp - self.closed_since >= self.microsleep_seconds:
+            # Still closed: keep the flag up from the moment the closure qualifies
+            self.microsleep_until = timestamp + self.microsleep_hold
+        self._expire(timestamp)
+        return event
+
+    def interrupt(self):
+        """Drop a closure in progress (EAR unreliable, e.g. looking away)"""
+        self.closed_since = None
+
+    def _expire(self, now):
+        while self._blink_times and now - self._blink_times[0] > self.rate_window:
+            self._blink_times.popleft()
+
+    def in_microsleep(self, now):
+        return self.microsleep_until is not None and now < self.microsleep_until
+
+    def closed_duration(self, now):
+        return now - self.closed_since if self.closed_since is not None else 0.0
+
+    def blink_rate(self, now):
+        """Blinks per minute over the last rate_window seconds (or since the first frame)"""
+        if self.first_time is None:
+            return 0.0
+        self._expire(now)
+        span = min(self.rate_window, now - self.first_time)
+        return len(self._blink_times) * 60.0 / span if span > 0 else 0.0
+
+
+class EnhancedDrowsinessDetector:
+    def __init__(self, ear_threshold=0.26, window_seconds=20):
+        self.ear_threshold = ear_threshold
+        self.drowsiness_level = "NOT DROWSY"
+        self.color = (0, 255, 0)
+
+        # Store (timestamp, is_closed) for last `window_seconds`
+        self.window_seconds = window_seconds
+        self.eye_history = ClosureHistory(window_seconds, recent_seconds=10)
+
+        # Head direction tracking
+        self.last_direction = "Looking Forward"
+        self.direction_start_time = None   # set by the first frame
+        self.away_start_time = None
+        self.away_period = 1.0  # seconds
+        self.min_perclos_time = 12  # seconds of forward data required
+        self.critical_head_time = 2.5   # seconds looking down/up before CRITICAL
+        self.distraction_time = 3       # seconds looking left/right before DISTRACTION
+
+        # PERCLOS levels (tunable, e.g. by replay.py over recorded traces)
+        self.perclos_critical = 0.40
+        self.perclos_medium = 0.25
+
+        # All windows are measured on frame capture timestamps when callers
+        # pass them, so live, overloaded and faster-than-real-time replay
+        # runs make the same decisions. Without timestamps the wall clock
+        # is used, as before.
+        self.last_timestamp = None
+
+        # Blink events, blink rate and microsleeps from the same EAR stream
+        self.blink_detector = BlinkDetector()
+
+        # Optional EventLog that receives every level transition and blink
+        self.event_log = None
+
+    def _now(self, timestamp=None):
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+            return timestamp
+        if self.last_timestamp is not None:
+            return self.last_timestamp
+        return time.time()
+
+
+    def update_blink(self, ear, head_direction, timestamp=None, skipped_frames=0):
+     # `skipped_frames`: camera frames dropped since the last call (frame
+     # skipping / overload); they are assumed to look like this one
+     now = self._now(timestamp)
+     is_closed = ear < self.ear_threshold
+
+     if head_direction == "Looking Forward":
+        # Reset away timer since we're back to forward
+        self.away_start_time = None  
+
+        blink = self.blink_detector.update(ear, self.ear_threshold, now)
+        if blink is not None and self.event_log is not None:
+            self.event_log.blink(blink.end, blink.duration, blink.microsleep)
+
+        # Track closure history
+        self.eye_history.append(now, is_closed, 1 + skipped_frames)
+
+        # Keep only recent frames
+        self.eye_history.expire(now)
+
+     else:
+        # EAR is unreliable off-axis: don't count this as part of a blink
+        self.blink_detector.interrupt()
+
+        # Start grace period timer if just looked away
+        if self.away_start_time is None:
+            self.away_start_time = now
+
+        # If away longer than grace period → reset PERCLOS
+        if now - self.away_start_time > self.away_period:
+            self.eye_history.clear()
+
+    def calculate_perclos(self, timestamp=None):
+        # Frames from the last 10 s weigh double; O(1) via running counts
+        return self.eye_history.perclos(self._now(timestamp))
+
+    def update_head_direction(self, head_direction, timestamp=None):
+        """Track sustained head direction."""
+        now = self._now(timestamp)
+        if self.direction_start_time is None:
+            self.direction_start_time = now
+        if head_direction != self.last_direction:
+            self.last_direction = head_direction
+            self.direction_start_time = now
+
+        sustained_time = now - self.direction_start_time
+        return head_direction, sustained_time
+
+    def update_state(self, head_direction, timestamp=None):
+     now = self._now(timestamp)
+     head_direction, sustained_time = self.update_head_direction(head_direction, now)
+     perclos = self.calculate_perclos(now)
+     previous_level = self.drowsiness_level
+     #eyes_closed_now = self.eye_history[-1][1] if self.eye_history else False
+
+    # ---- Critical: head down/up too long ----
+     if head_direction in ["Looking Down", "Looking Up"] and sustained_time > self.critical_head_time:
+        self.drowsiness_level = "CRITICAL"
+        self.color = (0, 0, 255)
+
+    # ---- Distraction: left/right too long ----
+     elif head_direction in ["Looking Left", "Looking Right"] and sustained_time > self.distraction_time:
+        self.drowsiness_level = "DISTRACTION"
+        self.color = (0, 165, 255)
+
+     elif head_direction == "Looking Forward":
+      # A microsleep alerts straight away, without waiting for PERCLOS
+      if self.blink_detector.in_microsleep(now):
+        self.drowsiness_level = "CRITICAL"
+        self.color = (0, 0, 255)
+      # Enough forward history, measured in seconds rather than frames
+      elif self.eye_history.span(now) >= self.min_perclos_time:
+        if perclos > self.perclos_critical:
+            self.drowsiness_level = "CRITICAL"
+            self.color = (0, 0, 255)
+        elif perclos > self.perclos_medium:
+            self.drowsiness_level = "MEDIUM"
+            self.color = (0, 255, 255)
+        else:
+            self.drowsiness_level = "NOT DROWSY"
+            self.color = (0, 255, 0)
+      else:
+        # Not enough data yet → safe default
+        self.drowsiness_level = "NOT DROWSY"
+        self.color = (0, 255, 0)
+
+     else:
+        # If no valid state, stay normal
+        self.drowsiness_level = "NOT DROWSY"
+        self.color = (0, 255, 0)
+
+     if self.event_log is not None and self.drowsiness_level != previous_level:
+        self.event_log.level_changed(now, previous_level, self.drowsiness_level, perclos)
+
+    def get_status(self, timestamp=None):
+        return self.drowsiness_level, self.color, self.calculate_perclos(timestamp)
+
+    def blink_status(self, timestamp=None):
+        """Blink counters, rolling rate (per minute) and microsleep flag"""
+        now = self._now(timestamp)
+        blinks = self.blink_detector
+        last = blinks.last_event
+        return {
+            "blinks": blinks.blink_count,
+            "blink_rate": round(blinks.blink_rate(now), 1),
+            "last_blink_ms": round(last.duration * 1000) if last is not None else None,
+            "microsleep": bool(blinks.in_microsleep(now)),
+            "microsleeps": blinks.microsleep_count,
+        }
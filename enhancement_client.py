@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import ENHANCEMENT_FAILURES, RateLimitedLog
+
+log = RateLimitedLog("drowsiness.enhancement")
+
+
+WIRE_FORMATS = ("jpeg", "png", "raw")
+
+
+def encode_frame(frame, wire_format="jpeg", jpeg_quality=80, png_compression=1):
+    """Encode a BGR frame for the wire; returns (payload, content_type, headers)"""
+    if wire_format == "jpeg":
+        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        return buffer.tobytes(), "image/jpeg", {}
+    if wire_format == "png":
+        _, buffer = cv2.imencode(".png", frame, [cv2.IMWRITE_PNG_COMPRESSION, png_compression])
+        return buffer.tobytes(), "image/png", {}
+    if wire_format == "raw":
+        # Uncompressed pixels; the shape travels in a header
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        return np.ascontiguousarray(frame).tobytes(), "application/octet-stream", {"X-Frame-Shape": f"{h},{w},{c}"}
+    raise ValueError(f"Unknown wire format '{wire_format}', expected one of {WIRE_FORMATS}")
+
+
+def decode_response(resp):
+    """Decode Module 1's reply, either raw pixels or an encoded image"""
+    shape = resp.headers.get("X-Frame-Shape")
+    if shape:
+        h, w, c = (int(v) for v in shape.split(","))
+        return np.frombuffer(resp.content, dtype=np.uint8).reshape(h, w, c)
+    arr = np.frombuffer(resp.content, dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+
+class EnhancementClient:
+    """Connection-pooled client for the Module 1 enhancement hop.
+
+    Requests run on a small thread pool sharing one keep-alive session, so
+    up to `max_in_flight` frames can be on the wire at once. No frame is
+    waited for longer than `deadline` seconds after it was submitted: if
+    Module 1 is slow or failing the raw frame is returned instead. After `max_failures` consecutive failures
+    or missed deadlines the client stops calling Module 1 for `cooldown`
+    seconds.
+    """
+
+    def __init__(self, url, deadline=0.15, connect_timeout=1.0, read_timeout=1.0,
+                 max_in_flight=4, retries=1, wire_format="jpeg", jpeg_quality=80,
+                 max_failures=5, cooldown=5.0):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format '{wire_format}', expected one of {WIRE_FORMATS}")
+
+        self.url = url
+        self.deadline = deadline
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_in_flight = max_in_flight
+        self.wire_format = wire_format
+        self.jpeg_quality = jpeg_quality
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+
+        self.session = requests.Session()
+        # Only connection errors are retried; a slow reply is handled by the deadline
+        retry = Retry(total=retries, connect=retries, read=0, status=0, allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="enhance")
+
+        self.consecutive_failures = 0
+        self.disabled_until = 0.0
+        self.stats = {"requests": 0, "enhanced": 0, "fallbacks": 0, "errors": 0, "deadlines": 0}
+        # Streams call in from their own capture threads
+        self._lock = threading.Lock()
+        self._failures = {reason: ENHANCEMENT_FAILURES.labels(reason=reason)
+                          for reason in ("cooldown", "deadline", "error")}
+
+    def _post(self, frame):
+        payload, content_type, headers = encode_frame(frame, self.wire_format, self.jpeg_quality)
+        files = {"file": (f"frame.{self.wire_format}", payload, content_type)}
+        resp = self.session.post(self.url, files=files, headers=headers, timeout=self.timeout)
+        resp.raise_for_status()
+        enhanced = decode_response(resp)
+        if enhanced is None:
+            raise ValueError("Module 1 returned an undecodable frame")
+        return enhanced
+
+    def submit(self, frame):
+        """Start enhancing a frame and return a Future (None while cooling down)"""
+        if time.monotonic() < self.disabled_until:
+            return None
+        self._count("requests")
+        future = self._executor.submit(self._post, frame)
+        # The deadline runs from here, not from when result() is called
+        future.submitted_at = time.monotonic()
+        return future
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def result(self, future, frame, timeout=None):
+        """Resolve a Future from `submit`, falling back to the raw frame"""
+        if future is None:
+            self._count("fallbacks")
+            self._failures["cooldown"].inc()
+            return frame
+        if timeout is None:
+            timeout = max(0.0, future.submitted_at + self.deadline - time.monotonic())
+        try:
+            enhanced = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            # A Module 1 that is always slow must cool down too, or every
+            # frame waits out the whole deadline
+            self._record_failure("deadlines", f"no reply within {self.deadline * 1000:.0f} ms")
+            self._failures["deadline"].inc()
+            return frame
+        except Exception as exc:
+            self._record_failure("errors", exc)
+            self._failures["error"].inc()
+            return frame
+
+        with self._lock:
+            self.consecutive_failures = 0
+            self.stats["enhanced"] += 1
+        return enhanced
+
+    def _record_failure(self, stat, reason):
+        with self._lock:
+            self.stats["fallbacks"] += 1
+            self.stats[stat] += 1
+            self.consecutive_failures += 1
+            # Requests still in flight when the cooldown started don't restart it
+            if self.consecutive_failures < self.max_failures or time.monotonic() < self.disabled_until:
+                return
+            self.disabled_until = time.monotonic() + self.cooldown
+            self.consecutive_failures = 0
+        log.warning("enhancement_cooldown", reason=reason, cooldown_s=self.cooldown)
+
+    def enhance(self, frame):
+        """Blocking call bounded by the deadline"""
+        return self.result(self.submit(frame), frame)
+
+    async def enhance_async(self, frame):
+        """asyncio-friendly variant of `enhance`"""
+        future = self.submit(frame)
+        if future is None:
+            self._count("fallbacks")
+            self._failures["cooldown"].inc()
+            return frame
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.deadline)
+        except (asyncio.TimeoutError, Exception):
+            pass
+        return self.result(future, frame, timeout=0)
+
+    def enhance_stream(self, frames):
+        """Enhance an iterable of frames with up to `max_in_flight` requests
+        outstanding, yielding results in input order"""
+        pending = deque()
+        for frame in frames:
+            pending.append((self.submit(frame), frame))
+            if len(pending) >= self.max_in_flight:
+                future, raw = pending.popleft()
+                yield self.result(future, raw)
+        while pending:
+            future, raw = pending.popleft()
+            yield self.result(future, raw)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,348 @@
+"""Append-only per-stream event and telemetry log.
+
+Records are fixed-width (RECORD_DTYPE, 36 bytes) so a segment file is just
+a header followed by a packed array:
+
+    events/<stream_id>/<segment start, ms since epoch>.evl
+
+A writer starts a new segment every `segment_seconds`; segment names are
+the coarse time index, and since records inside a segment are in time
+order, a binary search over the memory-mapped timestamp column finds any
+time range while touching only a few pages. EventReader maps one segment
+at a time, so queries over weeks of history run in bounded memory.
+
+    log = EventLog("events/truck-7")
+    detector.event_log = log              # level transitions
+    log.telemetry(ts, level, direction, ear, perclos, angles)
+    EventReader("events/truck-7").alerts_per_hour(start, end)
+"""
+import math
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"DDEVLOG1"
+HEADER = struct.Struct("<8sII")       # magic, record size, reserved
+RECORD = struct.Struct("<dBBBBffffff")
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("kind", "u1"),          # KINDS index
+    ("level", "u1"),         # LEVELS index (new level for transitions)
+    ("direction", "u1"),     # DIRECTIONS index
+    ("prev_level", "u1"),    # transitions: level before
+    ("ear", "<f4"),
+    ("perclos", "<f4"),
+    ("pitch", "<f4"),
+    ("yaw", "<f4"),
+    ("roll", "<f4"),
+    ("value", "<f4"),        # blink / microsleep: closure seconds; otherwise NaN
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+KINDS = ("telemetry", "level", "blink", "microsleep")
+LEVELS = ("NOT DROWSY", "MEDIUM", "CRITICAL", "DISTRACTION")
+ALERT_LEVELS = ("MEDIUM", "CRITICAL", "DISTRACTION")
+DIRECTIONS = ("Looking Forward", "Looking Left", "Looking Right", "Looking Up", "Looking Down", "Unknown")
+UNKNOWN = 255
+
+SEGMENT_SUFFIX = ".evl"
+
+_KIND_CODES = {name: code for code, name in enumerate(KINDS)}
+_LEVEL_CODES = {name: code for code, name in enumerate(LEVELS)}
+_DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+
+def _name(table, code):
+    return table[code] if code < len(table) else None
+
+
+class EventLog:
+    """Writer for one stream's log; called from its detection thread.
+
+    Records are packed into a buffer and written every `flush_interval`
+    seconds, so the hot path never touches the disk. Telemetry is kept
+    at most once per `telemetry_interval` seconds (0 = every frame);
+    transitions are always kept. A timestamp older than the last record
+    on disk (restarted writer, client clocks) is clamped to it, so every
+    segment stays sorted.
+    """
+
+    def __init__(self, directory, segment_seconds=3600.0, telemetry_interval=0.5, flush_interval=1.0):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.telemetry_interval = telemetry_interval
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.records_written = 0
+        self._buffer = bytearray()
+        self._file = None
+        self._segment_end = -math.inf
+        # A restarted writer must not append before what is already on disk
+        self._last_timestamp = self._tail_timestamp()
+        self._last_telemetry = -math.inf
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, kind, timestamp, level=None, direction=None, prev_level=None, ear=math.nan,
+               perclos=math.nan, angles=None, value=math.nan):
+        pitch, yaw, roll = angles if angles is not None else (math.nan, math.nan, math.nan)
+        # Segments must stay time-ordered for the reader's binary search
+        timestamp = max(timestamp, self._last_timestamp)
+        self._last_timestamp = timestamp
+        record = RECORD.pack(timestamp, _KIND_CODES[kind], _LEVEL_CODES.get(level, UNKNOWN),
+                             _DIRECTION_CODES.get(direction, UNKNOWN), _LEVEL_CODES.get(prev_level, UNKNOWN),
+                             ear, perclos, pitch, yaw, roll, value)
+        with self._lock:
+            if timestamp >= self._segment_end:
+                self._rotate(timestamp)
+            self._buffer += record
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def telemetry(self, timestamp, level, direction, ear, perclos, angles=None):
+        """Per-frame metrics, downsampled to `telemetry_interval`"""
+        if timestamp - self._last_telemetry < self.telemetry_interval:
+            return
+        self._last_telemetry = timestamp
+        self.append("telemetry", timestamp, level, direction, ear=ear, perclos=perclos, angles=angles)
+
+    def level_changed(self, timestamp, previous, level, perclos):
+        self.append("level", timestamp, level, prev_level=previous, perclos=perclos)
+
+    def blink(self, timestamp, duration, microsleep=False):
+        self.append("microsleep" if microsleep else "blink", timestamp, value=duration)
+
+    def _rotate(self, timestamp):
+        self._flush()
+        if self._file is not None:
+            self._file.close()
+        # Segments start on a multiple of segment_seconds
+        start = math.floor(timestamp / self.segment_seconds) * self.segment_seconds
+        self._segment_end = start + self.segment_seconds
+        path = os.path.join(self.directory, f"{int(start * 1000):015d}{SEGMENT_SUFFIX}")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < HEADER.size:
+            self._file = open(path, "wb")
+            self._file.write(HEADER.pack(MAGIC, RECORD.size, 0))
+            return
+        self._file = open(path, "ab")
+        # Drop a record cut short by a crash so new records stay aligned
+        partial = (size - HEADER.size) % RECORD.size
+        if partial:
+            self._file.truncate(size - partial)
+
+    def _tail_timestamp(self):
+        """Timestamp of the last complete record in the newest segment"""
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+        for name in reversed(names):
+            path = os.path.join(self.directory, name)
+            count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+            if count > 0:
+                with open(path, "rb") as f:
+                    f.seek(HEADER.size + (count - 1) * RECORD.size)
+                    return RECORD.unpack(f.read(RECORD.size))[0]
+        return -math.inf
+
+    def _flush(self):
+        if self._file is not None and self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self.records_written += len(self._buffer) // RECORD.size
+            self._buffer.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._segment_end = -math.inf
+
+
+class EventStore:
+    """One EventLog per stream under `root`"""
+
+    def __init__(self, root="events", **log_kwargs):
+        self.root = root
+        self.log_kwargs = log_kwargs
+
+    def path(self, stream_id):
+        # Stream IDs come from clients; keep them inside root
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in stream_id).lstrip(".")
+        return os.path.join(self.root, safe or "_")
+
+    def writer(self, stream_id):
+        return EventLog(self.path(stream_id), **self.log_kwargs)
+
+    def reader(self, stream_id):
+        return EventReader(self.path(stream_id))
+
+
+class EventReader:
+    """Memory-mapped queries over one stream's segments"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        """[(start_timestamp, path)] in time order"""
+        if not os.path.isdir(self.directory):
+            return []
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit():
+                segments.append((int(name[:-len(SEGMENT_SUFFIX)]) / 1000, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _map(self, path):
+        count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        if count <= 0:
+            return None
+        with open(path, "rb") as f:
+            magic, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not an event log segment")
+        # A partially written trailing record is ignored
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+    def chunks(self, start=None, end=None, kinds=None):
+        """Yield record arrays for [start, end), one segment at a time.
+        Without `kinds` the arrays are views into the mapped files."""
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        segments = self.segments()
+        codes = [_KIND_CODES[k] for k in kinds] if kinds else None
+        for i, (seg_start, path) in enumerate(segments):
+            seg_end = segments[i + 1][0] if i + 1 < len(segments) else math.inf
+            if seg_end <= start or seg_start >= end:
+                continue
+            records = self._map(path)
+            if records is None:
+                continue
+            timestamps = records["timestamp"]
+            lo = np.searchsorted(timestamps, start, side="left") if start > seg_start else 0
+            hi = np.searchsorted(timestamps, end, side="left") if end < seg_end else len(records)
+            if lo >= hi:
+                continue
+            chunk = records[lo:hi]
+            if codes is not None:
+                chunk = chunk[np.isin(chunk["kind"], codes)]
+            if len(chunk):
+                yield chunk
+
+    def transitions(self, start=None, end=None):
+        return [
+            {"timestamp": timestamp, "from": _name(LEVELS, prev_level), "to": _name(LEVELS, level),
+             "perclos": _float(perclos)}
+            for chunk in self.chunks(start, end, ("level",))
+            for timestamp, prev_level, level, perclos in zip(chunk["timestamp"].tolist(), chunk["prev_level"].tolist(),
+                                                             chunk["level"].tolist(), chunk["perclos"].tolist())
+        ]
+
+    def blinks(self, start=None, end=None):
+        microsleep = _KIND_CODES["microsleep"]
+        return [
+            {"timestamp": timestamp, "duration": round(duration, 3), "microsleep": kind == microsleep}
+            for chunk in self.chunks(start, end, ("blink", "microsleep"))
+            for timestamp, kind, duration in zip(chunk["timestamp"].tolist(), chunk["kind"].tolist(),
+                                                 chunk["value"].tolist())
+        ]
+
+    def alerts_per_hour(self, start=None, end=None, levels=ALERT_LEVELS):
+        """{hour start: {level: count}} of transitions into alert levels"""
+        codes = [_LEVEL_CODES[level] for level in levels]
+        counts = {}
+        for chunk in self.chunks(start, end, ("level",)):
+            alerts = chunk[np.isin(chunk["level"], codes)]
+            hours = (alerts["timestamp"] // 3600).astype(np.int64)
+            for hour, level in zip(hours.tolist(), alerts["level"].tolist()):
+                bucket = counts.setdefault(hour * 3600, {})
+                name = LEVELS[level]
+                bucket[name] = bucket.get(name, 0) + 1
+        return dict(sorted(counts.items()))
+
+    def time_to_first(self, level="MEDIUM", start=None, end=None, trip_gap=1800.0):
+        """Per trip (records separated by less than `trip_gap` seconds):
+        seconds from the trip's first record to its first `level`"""
+        code = _LEVEL_CODES[level]
+        trips = []
+        trip = None
+        last = None
+        for chunk in self.chunks(start, end):
+            timestamps = chunk["timestamp"]
+            # Trip boundaries inside this chunk (and against the previous one)
+            gaps = np.flatnonzero(np.diff(timestamps) >= trip_gap) + 1
+            bounds = [0] + gaps.tolist() + [len(chunk)]
+            if last is None or timestamps[0] - last >= trip_gap:
+                trip = None
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                if lo > 0:
+                    trip = None
+                if trip is None:
+                    trip = {"trip_start": float(timestamps[lo]), "first_at": None, "seconds": None}
+                    trips.append(trip)
+                if trip["first_at"] is None:
+                    hits = np.flatnonzero((chunk["kind"][lo:hi] == _KIND_CODES["level"])
+                                          & (chunk["level"][lo:hi] == code))
+                    if len(hits):
+                        first = float(timestamps[lo + hits[0]])
+                        trip["first_at"] = first
+                        trip["seconds"] = round(first - trip["trip_start"], 3)
+            last = float(timestamps[-1])
+        return trips
+
+    def telemetry(self, start=None, end=None, max_points=1000):
+        """Telemetry series, evenly thinned to at most `max_points`"""
+        code = _KIND_CODES["telemetry"]
+        total = sum(int(np.count_nonzero(c["kind"] == code)) for c in self.chunks(start, end))
+        step = max(1, math.ceil(total / max_points)) if max_points else 1
+        series, offset = [], 0
+        for chunk in self.chunks(start, end):
+            # Only the picked rows are copied out of the mapping
+            rows = np.flatnonzero(chunk["kind"] == code)
+            picked = chunk[rows[(-offset) % step::step]]
+            # Column-wise conversion; per-record access to structured rows is slow
+            columns = [picked[name].tolist() for name in ("timestamp", "level", "direction", "ear", "perclos",
+                                                          "pitch", "yaw", "roll")]
+            for timestamp, level, direction, ear, perclos, pitch, yaw, roll in zip(*columns):
+                series.append({"timestamp": timestamp, "level": _name(LEVELS, level),
+                               "direction": _name(DIRECTIONS, direction),
+                               "ear": _float(ear), "perclos": _float(perclos),
+                               "angles": [_float(pitch), _float(yaw), _float(roll)]})
+            offset += len(rows)
+        return series
+
+    def summary(self, start=None, end=None):
+        records = telemetry = blinks = microsleeps = 0
+        first = last = None
+        levels = {}
+        for chunk in self.chunks(start, end):
+            records += len(chunk)
+            first = float(chunk["timestamp"][0]) if first is None else first
+            last = float(chunk["timestamp"][-1])
+            kinds = chunk["kind"]
+            telemetry += int(np.count_nonzero(kinds == _KIND_CODES["telemetry"]))
+            blinks += int(np.count_nonzero(kinds == _KIND_CODES["blink"]))
+            microsleeps += int(np.count_nonzero(kinds == _KIND_CODES["microsleep"]))
+            changes = chunk["level"][kinds == _KIND_CODES["level"]]
+            for code, count in zip(*np.unique(changes, return_counts=True)):
+                name = _name(LEVELS, code) or "Unknown"
+                levels[name] = levels.get(name, 0) + int(count)
+        return {"records": records, "telemetry": telemetry, "blinks": blinks, "microsleeps": microsleeps,
+                "transitions": levels,
+                "first": first, "last": last, "segments": len(self.segments())}
+
+
+def _float(value):
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
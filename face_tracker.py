@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+# Face-oval extremes (forehead, chin, cheeks): enough for a face box
+BOX_IDX = (10, 152, 234, 454)
+
+DRIVER_POLICIES = ("largest", "left", "right")
+
+
+def face_box(face):
+    """Normalised (x0, y0, x1, y1) box of a MediaPipe landmark list or an
+    (N, 3) landmark array, from the four BOX_IDX points only"""
+    if isinstance(face, np.ndarray):
+        points = face[list(BOX_IDX), :2]
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        return float(x0), float(y0), float(x1), float(y1)
+    landmarks = getattr(face, "landmark", face)
+    xs = [landmarks[i].x for i in BOX_IDX]
+    ys = [landmarks[i].y for i in BOX_IDX]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def box_iou(a, b):
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    __slots__ = ("track_id", "box", "missed", "hits")
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+        self.hits = 1
+
+    @property
+    def area(self):
+        return (self.box[2] - self.box[0]) * (self.box[3] - self.box[1])
+
+    @property
+    def center(self):
+        return (self.box[0] + self.box[2]) / 2, (self.box[1] + self.box[3]) / 2
+
+
+class FaceTracker:
+    """Keeps face identities between frames and picks the driver.
+
+    Faces are matched to the previous frame's tracks greedily by box IoU,
+    falling back to centroid distance (relative to the face size) for fast
+    moves. Only four landmarks per face are read, so passengers cost next
+    to nothing. The driver is chosen by `driver_policy` -- the "largest"
+    face (closest to the camera), or the face nearest the "left" / "right"
+    edge of the image (the driver's seat) -- and kept while its track
+    lives, so a passenger leaning in does not take over.
+    """
+
+    def __init__(self, driver_policy="largest", iou_threshold=0.3, max_distance=0.5, max_missed=5):
+        if driver_policy not in DRIVER_POLICIES:
+            raise ValueError(f"driver_policy must be one of {DRIVER_POLICIES}")
+        self.driver_policy = driver_policy
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance    # centroid match radius, in face widths
+        self.max_missed = max_missed        # frames a track survives without a match
+
+        self.tracks = []
+        self.driver_id = None
+        self.driver_changed = False
+        self._next_id = 1
+
+    def update(self, faces):
+        """Match this frame's faces (MediaPipe landmark lists or (N, 3)
+        arrays). Returns the index of the driver's face, or None."""
+        boxes = [face_box(face) for face in faces]
+        assignment = self._match(boxes)
+
+        matched = set()
+        for track, index in assignment.items():
+            track.box = boxes[index]
+            track.missed = 0
+            track.hits += 1
+            matched.add(index)
+        for track in self.tracks:
+            if track not in assignment:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        for index, box in enumerate(boxes):
+            if index not in matched:
+                track = FaceTrack(self._next_id, box)
+                self._next_id += 1
+                self.tracks.append(track)
+                assignment[track] = index
+
+        previous = self.driver_id
+        driver = next((t for t in self.tracks if t.track_id == self.driver_id), None)
+        if driver is None:
+            # Driver track expired (or none yet): pick a new one
+            driver = self._select_driver(assignment)
+            self.driver_id = driver.track_id if driver is not None else None
+        self.driver_changed = self.driver_id != previous
+        # A driver missed for a few frames is not replaced by a passenger
+        return assignment.get(driver)
+
+    def _match(self, boxes):
+        """Greedy track -> face index assignment, best IoU first"""
+        candidates = []
+        for track in self.tracks:
+            cx, cy = track.center
+            width = max(track.box[2] - track.box[0], 1e-6)
+            for index, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    candidates.append((1.0 + iou, track, index))
+                    continue
+                distance = math.hypot((box[0] + box[2]) / 2 - cx, (box[1] + box[3]) / 2 - cy) / width
+                if distance <= self.max_distance:
+                    # Ranked below every IoU match
+                    candidates.append((1.0 - distance / self.max_distance, track, index))
+
+        assignment, used = {}, set()
+        for _, track, index in sorted(candidates, key=lambda c: c[0], reverse=True):
+            if track in assignment or index in used:
+                continue
+            assignment[track] = index
+            used.add(index)
+        return assignment
+
+    def _select_driver(self, visible):
+        """Driver among the tracks matched this frame"""
+        if not visible:
+            return None
+        if self.driver_policy == "left":
+            return min(visible, key=lambda t: t.center[0])
+        if self.driver_policy == "right":
+            return max(visible, key=lambda t: t.center[0])
+        return max(visible, key=lambda t: t.area)
+
+    def reset(self):
+        self.tracks = []
+        self.driver_id = None
+        self.driver_changed = False
+
+    def summary(self):
+        return {
+            "faces": sum(1 for t in self.tracks if t.missed == 0),
+            "driver_id": self.driver_id,
+            "driver_policy": self.driver_policy,
+        }
@@ -0,0 +1,61 @@
+from itertools import chain
+
+import numpy as np
+
+
+def landmarks_to_array(landmarks, indices=None, dtype=np.float64):
+    """(N, 3) array of normalised x, y, z from a MediaPipe landmark list.
+
+    Pulling 468 attributes out of protobuf objects dominates the cost, so
+    `indices` restricts the conversion to the landmarks a caller actually
+    reads; the other rows are left as NaN and the array keeps its shape,
+    so fancy indexing by landmark ID still works.
+
+    Arrays are passed through untouched, so callers can hand over either
+    MediaPipe results or landmarks that were already converted (e.g. by a
+    worker process).
+    """
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    n = len(landmarks)
+    if indices is None:
+        flat = np.fromiter(chain.from_iterable((lm.x, lm.y, lm.z) for lm in landmarks),
+                           dtype=dtype, count=3 * n)
+        return flat.reshape(n, 3)
+
+    points = np.full((n, 3), np.nan, dtype=dtype)
+    points[indices] = [(lm.x, lm.y, lm.z) for lm in map(landmarks.__getitem__, indices)]
+    return points
+
+
+def results_to_array(results, indices=None, dtype=np.float64):
+    """(F, N, 3) array with one row per detected face (F may be 0)"""
+    if not results.multi_face_landmarks:
+        return np.empty((0, 0, 3), dtype=dtype)
+    return np.stack([landmarks_to_array(face.landmark, indices, dtype)
+                     for face in results.multi_face_landmarks])
+
+
+def to_pixels(points, img_w, img_h):
+    """Normalised (..., 3) landmarks -> integer (..., 2) pixel coordinates.
+
+    Truncates like the original `int(lm.x * w)` so EAR thresholds keep
+    their meaning.
+    """
+    return (points[..., :2] * (img_w, img_h)).astype(np.int32)
+
+
+# p2-p6, p3-p5 (vertical) and p1-p4 (horizontal) pairs of the 6-point eye contour
+_EAR_FROM = np.array([1, 2, 0])
+_EAR_TO = np.array([5, 4, 3])
+
+
+def eye_aspect_ratio(eye_points):
+    """EAR for (..., 6, 2) eye contours ordered p1..p6.
+
+    EAR = (|p2 - p6| + |p3 - p5|) / (2 |p1 - p4|), evaluated for every
+    leading index at once (eyes, faces, frames).
+    """
+    diff = (eye_points[..., _EAR_FROM, :] - eye_points[..., _EAR_TO, :]).astype(np.float64)
+    dist = np.sqrt((diff * diff).sum(axis=-1))
+    return (dist[..., 0] + dist[..., 1]) / (2.0 * dist[..., 2])
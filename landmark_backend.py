@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from landmark_array import results_to_array
+
+# FaceMesh instance owned by each worker process
+_worker_detector = None
+
+
+def _init_worker(detector_kwargs):
+    global _worker_detector
+    # One process per core already saturates the CPU; stop OpenCV from
+    # spawning its own threads inside every worker
+    cv2.setNumThreads(1)
+
+    from FaceMeshDetector import FaceMeshDetector
+    _worker_detector = FaceMeshDetector(static_image_mode=True, **detector_kwargs)
+
+
+def _detect_in_worker(image):
+    """Run FaceMesh in a worker process and return plain arrays"""
+    start = time.perf_counter()
+    results = _worker_detector.detect_landmarks(image)
+    faces = results_to_array(results, dtype=np.float32)
+    return faces, time.perf_counter() - start
+
+
+def decode_frame(data):
+    """Decode JPEG/PNG bytes into a BGR image (None if undecodable)"""
+    arr = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+
+class ProcessPoolLandmarkBackend:
+    """Decodes frames on threads and runs FaceMesh on a pool of processes.
+
+    MediaPipe inference holds the GIL for most of its Python-side work, so a
+    thread pool serialises it; separate processes let a batch use every core.
+    """
+
+    def __init__(self, num_workers=None, decode_threads=None, **detector_kwargs):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.decode_threads = decode_threads or self.num_workers
+        self.detector_kwargs = detector_kwargs
+        self._executor = None
+        self._decoder = None
+
+    def _ensure_started(self):
+        # Workers are spawned lazily so importing the app stays cheap
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.detector_kwargs,),
+            )
+            # cv2.imdecode releases the GIL, so threads are enough for decoding
+            self._decoder = ThreadPoolExecutor(max_workers=self.decode_threads,
+                                               thread_name_prefix="decode")
+
+    def _timed_decode(self, data):
+        start = time.perf_counter()
+        image = decode_frame(data)
+        return image, time.perf_counter() - start
+
+    def decode_batch(self, payloads):
+        """Decode encoded frames concurrently, preserving order"""
+        self._ensure_started()
+        return list(self._decoder.map(self._timed_decode, payloads))
+
+    def detect_batch(self, images):
+        """Run FaceMesh over a list of images, preserving order.
+
+        Returns a list of (faces, inference_seconds) where faces is an
+        (F, 468, 3) float32 array in normalised coordinates.
+        """
+        self._ensure_started()
+        chunksize = max(1, len(images) // (self.num_workers * 4))
+        return list(self._executor.map(_detect_in_worker, images, chunksize=chunksize))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._decoder.shutdown(wait=True)
+            self._executor = None
+            self._decoder = None
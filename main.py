@@ -1,136 +1,316 @@
-import cv2
-import time
-import numpy as np
-from FaceMeshDetector import FaceMeshDetector 
-from HeadPoseEstimator import HeadPoseEstimator
-from EyeTracker import EyeTracker
-from drowsiness_logic import EnhancedDrowsinessDetector
-
-class FPSCounter:
-    def __init__(self):
-        self.start_time = time.time()
-        self.fps = 0
-        self.history = []
-        self.all_fps = []  # store all fps values for logging
-
-    def update(self):
-        end_time = time.time()
-        time_diff = end_time - self.start_time
-        inst_fps = 1 / time_diff if time_diff > 0 else 0
-        self.start_time = end_time
-
-        self.history.append(inst_fps)
-        if len(self.history) > 10:
-            self.history.pop(0)
-
-        self.fps = sum(self.history) / len(self.history)
-        self.all_fps.append(self.fps)
-        return self.fps
-
-    def get_metrics(self):
-        if not self.all_fps:
-            return 0, 0, 0
-        avg_fps = sum(self.all_fps) / len(self.all_fps)
-        min_fps = min(self.all_fps)
-        max_fps = max(self.all_fps)
-        return avg_fps, min_fps, max_fps
-
-
-class DisplayManager:
-    @staticmethod
-    def draw_drowsiness_box(image, drowsiness_level, color):
-        box_x, box_y = 20, 90
-        box_width, box_height = 300, 80
-        cv2.rectangle(image, (box_x, box_y), (box_x + box_width, box_y + box_height), (50, 50, 50), -1)
-        cv2.rectangle(image, (box_x, box_y), (box_x + box_width, box_y + box_height), color, 3)
-        text = f"DROWSINESS: {drowsiness_level}"
-        font_scale, thickness = 0.8, 2
-        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)[0]
-        text_x = box_x + (box_width - text_size[0]) // 2
-        text_y = box_y + (box_height + text_size[1]) // 2
-        cv2.putText(image, text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
-
-    @staticmethod
-    def draw_info(image, head_direction, ear, drowsiness_level, color, fps, perclos):
-        cv2.putText(image, f"Head Direction: {head_direction}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
-        cv2.putText(image, f'EAR: {np.round(ear, 3)}', (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        DisplayManager.draw_drowsiness_box(image, drowsiness_level, color)
-        cv2.putText(image, f'FPS: {int(fps)}', (20, 320), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        cv2.putText(image, f'PERCLOS: {perclos*100:.1f}%', 
-                (20, 360), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 2)
-
-
-class MainApplication:
-    def __init__(self):
-        self.face_detector = FaceMeshDetector()
-        self.head_pose_estimator = HeadPoseEstimator()
-        self.eye_tracker = EyeTracker()
-        self.drowsiness_detector = EnhancedDrowsinessDetector()
-        self.fps_counter = FPSCounter()
-        self.cap = cv2.VideoCapture(0)
-        self.target_fps = 30
-        self.frame_time = 1 / self.target_fps
-
-    def process_frame(self, image):
-        results = self.face_detector.detect_landmarks(image)
-        head_direction, ear = "Unknown", 0.0
-
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-              landmarks = face_landmarks.landmark
-              pose_data = self.head_pose_estimator.estimate_pose(image, landmarks)
-              if pose_data:
-                pitch, yaw, roll = pose_data['angles']
-                head_direction = pose_data['direction']
-
-                # Debug print
-                print(f"Head Direction: {head_direction:<15} | Pitch: {pitch:6.1f}° | Yaw: {yaw:6.1f}° | Roll: {roll:6.1f}°")
-
-                
-            
-            # EAR (eye aspect ratio)
-            ear, r_points, l_points = self.eye_tracker.calculate_ear(image, landmarks)
-            self.eye_tracker.draw_eye_boxes(image, r_points, l_points)
-
-        return head_direction, ear
-
-    def run(self):
-        print("Starting Enhanced Blink-based Drowsiness Detection System...")
-        print("Target FPS:", self.target_fps, "Press ESC to exit")
-
-        while self.cap.isOpened():
-            start_time = time.time()
-            success, image = self.cap.read()
-            if not success:
-                continue
-
-            fps = self.fps_counter.update()
-            image = cv2.flip(image, 1)
-
-            head_direction, ear = self.process_frame(image)
-
-            self.drowsiness_detector.update_blink(ear, head_direction)
-            self.drowsiness_detector.update_state(head_direction)
-            drowsiness_level, color, perclos = self.drowsiness_detector.get_status()
-
-            DisplayManager.draw_info(image, head_direction, ear, drowsiness_level, color, fps, perclos)
-            cv2.imshow("Enhanced Blink-based Drowsiness Detection", image)
-
-
-            if cv2.waitKey(1) & 0xFF == 27:
-                break
-
-            elapsed = time.time() - start_time
-            if elapsed < self.frame_time:
-                time.sleep(self.frame_time - elapsed)
-
-        self.cap.release()
-        cv2.destroyAllWindows()
-
-        avg_fps, min_fps, max_fps = self.fps_counter.get_metrics()
-        print(f"Application closed. Performance Metrics -> Avg FPS: {avg_fps:.2f}, Min FPS: {min_fps:.2f}, Max FPS: {max_fps:.2f}")
-
-
-if __name__ == "__main__":
-    app = MainApplication()
-    app.run()
+import argparse
+import cv2
+import logging
+import time
+import numpy as np
+from collections import deque
+from FaceMeshDetector import FaceMeshDetector 
+from HeadPoseEstimator import HeadPoseEstimator
+from EyeTracker import EyeTracker
+from drowsiness_logic import EnhancedDrowsinessDetector
+from calibration import AutoCalibrator, ProfileStore
+from pipeline import FramePipeline, FrameBufferPool
+from overlay import Sprite, SpriteCache, text_advance
+from preview import FramePreview, serve_preview
+from face_tracker import FaceTracker
+from event_log import EventStore
+from scheduler import AdaptiveScheduler
+from metrics import FPS, FACES_LOST, FRAMES_PROCESSED, RateLimitedLog
+from landmark_array import landmarks_to_array
+
+class FPSCounter:
+    def __init__(self, gauge=None):
+        self.start_time = time.time()
+        self.fps = 0
+        self.history = deque(maxlen=10)
+        # Running summary instead of every value, so memory stays constant
+        self.samples = 0
+        self.fps_sum = 0.0
+        self.min_fps = float("inf")
+        self.max_fps = 0.0
+        self.gauge = gauge
+
+    def update(self):
+        end_time = time.time()
+        time_diff = end_time - self.start_time
+        inst_fps = 1 / time_diff if time_diff > 0 else 0
+        self.start_time = end_time
+
+        self.history.append(inst_fps)
+        self.fps = sum(self.history) / len(self.history)
+
+        self.samples += 1
+        self.fps_sum += self.fps
+        self.min_fps = min(self.min_fps, self.fps)
+        self.max_fps = max(self.max_fps, self.fps)
+        if self.gauge is not None:
+            self.gauge.set(self.fps)
+        return self.fps
+
+    def get_metrics(self):
+        if not self.samples:
+            return 0, 0, 0
+        return self.fps_sum / self.samples, self.min_fps, self.max_fps
+
+
+class DisplayManager:
+    # Labels, head directions and the drowsiness box are rendered once and
+    # blitted; only the numbers are drawn with putText every frame
+    sprites = SpriteCache()
+
+    @staticmethod
+    def _drowsiness_box(drowsiness_level, color):
+        box_x, box_y = 20, 90
+        box_width, box_height = 300, 80
+        text = f"DROWSINESS: {drowsiness_level}"
+        font_scale, thickness = 0.8, 2
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)[0]
+        text_x = box_x + (box_width - text_size[0]) // 2
+        text_y = box_y + (box_height + text_size[1]) // 2
+
+        def draw(canvas, shift):
+            dx, dy = shift
+            top_left, bottom_right = (box_x + dx, box_y + dy), (box_x + box_width + dx, box_y + box_height + dy)
+            cv2.rectangle(canvas, top_left, bottom_right, (50, 50, 50), -1)
+            cv2.rectangle(canvas, top_left, bottom_right, color, 3)
+            cv2.putText(canvas, text, (text_x + dx, text_y + dy), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+
+        # The 3 px border reaches 2 px outside the rectangle; long levels
+        # spill past it
+        bounds = (min(box_x - 2, text_x - thickness - 2), box_y - 2,
+                  max(box_x + box_width + 3, text_x + text_size[0] + thickness + 2), box_y + box_height + 3)
+        return Sprite.render(bounds, draw)
+
+    @staticmethod
+    def draw_drowsiness_box(image, drowsiness_level, color):
+        color = tuple(color)
+        DisplayManager.sprites.get(("box", drowsiness_level, color),
+                                   lambda: DisplayManager._drowsiness_box(drowsiness_level, color)).draw(image)
+
+    @staticmethod
+    def draw_value(image, label, value, org, font_scale, color, thickness=2):
+        """putText(label + value) with the label blitted from the cache"""
+        sprite = DisplayManager.sprites.text(label, org, font_scale, color, thickness)
+        if not sprite.opaque:
+            # Anti-aliased text can't be split without changing pixels
+            cv2.putText(image, label + value, org, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+            return
+        sprite.draw(image)
+        x = org[0] + text_advance(label, font_scale, thickness)
+        cv2.putText(image, value, (x, org[1]), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+
+    @staticmethod
+    def draw_info(image, head_direction, ear, drowsiness_level, color, fps, perclos):
+        sprites = DisplayManager.sprites
+        sprites.text(f"Head Direction: {head_direction}", (20, 40), 0.8, (255, 255, 0), 2).draw(image)
+        DisplayManager.draw_value(image, 'EAR: ', f'{np.round(ear, 3)}', (20, 80), 0.8, (255, 255, 255))
+        DisplayManager.draw_drowsiness_box(image, drowsiness_level, color)
+        DisplayManager.draw_value(image, 'FPS: ', f'{int(fps)}', (20, 320), 0.8, (0, 255, 0))
+        DisplayManager.draw_value(image, 'PERCLOS: ', f'{perclos*100:.1f}%', (20, 360), 0.7, (200, 200, 200))
+
+    @staticmethod
+    def draw_pipeline_stats(image, latency_ms, queue_depths, inference_fps=None):
+        text = f'Latency: {latency_ms:.0f} ms  Queues: {queue_depths[0]}/{queue_depths[1]}'
+        if inference_fps is not None:
+            text += f'  Inference: {inference_fps:.0f} fps'
+        cv2.putText(image, text, (20, 400), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
+
+
+class MainApplication:
+    """Camera loop with a local window, or headless (no cv2.imshow, e.g. with
+    opencv-python-headless). With `preview_port` the rendered frames are
+    also served as MJPEG / snapshot over HTTP; headless, frames are only
+    rendered while someone watches that preview."""
+
+    def __init__(self, driver_id="default", profile_dir="profiles", headless=False, preview_port=None,
+                 preview_width=640, preview_quality=70, max_faces=3, driver_policy="largest", event_dir="events"):
+        # Crop to the tracked face(s) between periodic full-frame passes
+        self.face_detector = FaceMeshDetector(roi_tracking=True, max_num_faces=max_faces)
+        # Passengers are tracked but only the driver's face is analysed
+        self.face_tracker = FaceTracker(driver_policy)
+        self.head_pose_estimator = HeadPoseEstimator()
+        self.eye_tracker = EyeTracker()
+        self.drowsiness_detector = EnhancedDrowsinessDetector()
+        # Transitions and telemetry history, kept per driver
+        self.event_log = EventStore(event_dir).writer(driver_id) if event_dir else None
+        self.drowsiness_detector.event_log = self.event_log
+        # Only the eye and pose landmarks are ever read
+        self.used_landmarks = sorted(set(self.eye_tracker.used_idx) | set(self.head_pose_estimator.pose_idx.tolist()))
+        # Neutral pose and EAR threshold for this driver (learned on first use)
+        self.calibrator = AutoCalibrator(self.head_pose_estimator, self.drowsiness_detector,
+                                         driver_id=driver_id, store=ProfileStore(profile_dir))
+        self.fps_counter = FPSCounter(FPS.labels(stream="local"))
+        self.log = RateLimitedLog("drowsiness.main", interval=1.0)
+        self.face_present = False
+        self.last_angles = None      # (pitch, yaw, roll) of the last inferred frame
+        self.headless = headless
+        self.preview = None
+        if preview_port is not None:
+            self.preview = FramePreview(width=preview_width, quality=preview_quality)
+            self.preview_server = serve_preview(self.preview, preview_port)
+        self.cap = cv2.VideoCapture(0)
+        self.target_fps = 30
+        self.cap.set(cv2.CAP_PROP_FPS, self.target_fps)
+
+        # Sparse inference while the driver is steady, full rate when at risk
+        # or when the CPU allows it
+        self.scheduler = AdaptiveScheduler(max_fps=self.target_fps)
+
+        # capture -> inference -> render, always working on the newest frame.
+        # Frames are read into recycled buffers and mirrored in place.
+        self.pipeline = FramePipeline(self.cap, self.infer, preprocess_fn=lambda image: cv2.flip(image, 1, dst=image),
+                                      scheduler=self.scheduler, buffer_pool=FrameBufferPool())
+
+    def process_frame(self, image, timestamp=None):
+        results = self.face_detector.detect_landmarks(image)
+        FRAMES_PROCESSED.inc()
+        head_direction, ear, eye_points = "Unknown", 0.0, None
+        self.last_angles = None
+        faces = results.multi_face_landmarks or []
+        driver = self.face_tracker.update(faces)
+        # Next ROI around the driver only; full frame once they are lost
+        self.face_detector.follow(driver)
+
+        if driver is not None:
+            if self.face_tracker.driver_changed:
+                # Another person: don't smooth with the previous one's pose or EAR,
+                # nor calibrate on their samples
+                self.head_pose_estimator.reset_tracking()
+                self.eye_tracker.reset_tracking()
+                if self.calibrator.calibrating:
+                    self.calibrator.start()
+            img_h, img_w = image.shape[:2]
+            # One (468, 3) array shared by pose and EAR, for the driver only
+            points = landmarks_to_array(faces[driver].landmark, self.used_landmarks)
+            pose_data = self.head_pose_estimator.estimate_pose_from_array(points, img_w, img_h)
+            if pose_data:
+                pitch, yaw, roll = pose_data['angles']
+                head_direction = pose_data['direction']
+                self.last_angles = (pitch, yaw, roll)
+
+                # At most one line per second instead of one per frame
+                self.log.info("head_pose", direction=head_direction, pitch=pitch, yaw=yaw, roll=roll)
+
+            # EAR (eye aspect ratio)
+            ear, r_points, l_points = self.eye_tracker.calculate_ear_from_array(points, img_w, img_h)
+            eye_points = (r_points, l_points)
+            if pose_data and self.calibrator.update(pose_data['angles'], ear,
+                                                    time.time() if timestamp is None else timestamp):
+                offset = self.head_pose_estimator.calibration_offset
+                self.log.info("calibrated", ear_threshold=self.drowsiness_detector.ear_threshold,
+                              pitch=offset['pitch'], yaw=offset['yaw'], roll=offset['roll'])
+            self.face_present = True
+        else:
+            # Face lost: don't smooth the next pose with a stale one
+            self.head_pose_estimator.reset_tracking()
+            if self.face_present:
+                FACES_LOST.inc()
+                self.log.info("face_lost")
+            self.face_present = False
+
+        return head_direction, ear, eye_points
+
+    def infer(self, packet):
+        """Inference stage: landmarks, pose, EAR and drowsiness state"""
+        head_direction, ear, eye_points = self.process_frame(packet.image, packet.capture_time)
+
+        # Decisions run on the capture timestamp, not on when inference finished;
+        # frames skipped since the last inference still count towards PERCLOS
+        self.drowsiness_detector.update_blink(ear, head_direction, packet.capture_time, packet.skipped)
+        self.drowsiness_detector.update_state(head_direction, packet.capture_time)
+        drowsiness_level, color, perclos = self.drowsiness_detector.get_status()
+        self.scheduler.update_risk(ear, self.drowsiness_detector.ear_threshold, head_direction,
+                                   drowsiness_level, packet.capture_time)
+        blinks = self.drowsiness_detector.blink_detector
+        if blinks.in_microsleep(packet.capture_time):
+            self.log.warning("microsleep", closed_ms=round(blinks.closed_duration(packet.capture_time) * 1000))
+        if self.event_log is not None:
+            self.event_log.telemetry(packet.capture_time, drowsiness_level, head_direction, ear, perclos,
+                                     self.last_angles)
+
+        return head_direction, ear, eye_points, drowsiness_level, color, perclos
+
+    def render(self, packet, fps):
+        """Render stage: overlays, display and preview (runs on the main thread)"""
+        image = packet.image
+        head_direction, ear, eye_points, drowsiness_level, color, perclos = packet.result
+
+        if eye_points is not None:
+            self.eye_tracker.draw_eye_boxes(image, *eye_points)
+
+        DisplayManager.draw_info(image, head_direction, ear, drowsiness_level, color, fps, perclos)
+        latency_ms = (time.time() - packet.capture_time) * 1000
+        DisplayManager.draw_pipeline_stats(image, latency_ms, self.pipeline.queue_depths(),
+                                           self.scheduler.target_fps)
+        if self.calibrator.calibrating:
+            DisplayManager.sprites.text('Calibrating: look ahead with eyes open', (20, 440),
+                                        0.6, (0, 255, 255), 2).draw(image)
+        if self.preview is not None:
+            self.preview.submit(image)
+        if not self.headless:
+            cv2.imshow("Enhanced Blink-based Drowsiness Detection", image)
+
+    def run(self):
+        print("Starting Enhanced Blink-based Drowsiness Detection System...")
+        print("Target FPS:", self.target_fps, "Press Ctrl+C to exit" if self.headless else "Press ESC to exit")
+
+        self.pipeline.start()
+
+        try:
+            while self.pipeline.running:
+                packet = self.pipeline.next_frame()
+                if packet is None:
+                    continue
+
+                render_start = time.time()
+                fps = self.fps_counter.update()
+                # Headless frames nobody is watching are not drawn at all
+                if not self.headless or (self.preview is not None and self.preview.due()):
+                    self.render(packet, fps)
+                self.pipeline.frame_rendered(packet, render_start)
+                self.pipeline.release(packet)
+
+                if not self.headless and cv2.waitKey(1) & 0xFF == 27:
+                    break
+        except KeyboardInterrupt:
+            pass
+
+        self.pipeline.stop()
+        self.cap.release()
+        if self.event_log is not None:
+            self.event_log.close()
+        if self.preview is not None:
+            self.preview.close()
+            self.preview_server.shutdown()
+        if not self.headless:
+            cv2.destroyAllWindows()
+
+        avg_fps, min_fps, max_fps = self.fps_counter.get_metrics()
+        print(f"Application closed. Performance Metrics -> Avg FPS: {avg_fps:.2f}, Min FPS: {min_fps:.2f}, Max FPS: {max_fps:.2f}")
+        for stage, (avg_ms, max_ms) in self.pipeline.summary().items():
+            print(f"  {stage:<11} avg {avg_ms:7.1f} ms | max {max_ms:7.1f} ms")
+        print(f"  dropped frames: {self.pipeline.dropped_frames()}")
+        print(f"  scheduler: {self.scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blink-based drowsiness detection on the local camera")
+    parser.add_argument("--headless", action="store_true", help="no window (opencv-python-headless)")
+    parser.add_argument("--preview-port", type=int, default=None,
+                        help="serve /preview.mjpg and /snapshot.jpg on this port")
+    parser.add_argument("--preview-width", type=int, default=640)
+    parser.add_argument("--preview-quality", type=int, default=70)
+    parser.add_argument("--max-faces", type=int, default=3, help="faces to detect (driver + passengers)")
+    parser.add_argument("--driver-policy", choices=("largest", "left", "right"), default="largest",
+                        help="how the driver is picked when several faces are visible")
+    parser.add_argument("--driver-id", default="default")
+    parser.add_argument("--profile-dir", default="profiles")
+    parser.add_argument("--event-dir", default="events", help="event / telemetry history ('' to disable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    app = MainApplication(driver_id=args.driver_id, profile_dir=args.profile_dir, headless=args.headless,
+                          preview_port=args.preview_port, preview_width=args.preview_width,
+                          preview_quality=args.preview_quality, max_faces=args.max_faces,
+                          driver_policy=args.driver_policy, event_dir=args.event_dir)
+    app.run()
@@ -0,0 +1,239 @@
+"""Fixed-memory metrics with a Prometheus text exposition, plus rate-limited
+structured logging for the hot path.
+
+    from metrics import REGISTRY
+    STAGE = REGISTRY.histogram("drowsiness_stage_seconds", "Stage latency", ("stage",))
+    STAGE.labels(stage="inference").observe(0.012)
+    REGISTRY.render()   # text for GET /metrics
+
+Every metric keeps a constant amount of state per label set (histograms
+are bucket counters), so nothing grows with uptime.
+"""
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, 1 ms .. 2.5 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name):
+        yield name + "_total", (), self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from `function()` at scrape time instead"""
+        self._function = function
+
+    def samples(self, name):
+        yield name, (), self._function() if self._function is not None else self.value
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf if beyond the last bucket)"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return math.inf
+
+    def samples(self, name):
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield name + "_bucket", (("le", _format_value(bound)),), cumulative
+        yield name + "_sum", (), value_sum
+        yield name + "_count", (), total
+
+
+class MetricFamily:
+    """One metric name with a child per label-value combination"""
+
+    def __init__(self, name, help_text, kind, label_names, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._children[()] = factory()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._factory())
+        return child
+
+    def remove(self, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._children.pop(key, None)
+
+    # Unlabelled families act as their single child
+    def __getattr__(self, attr):
+        if self.label_names:
+            raise AttributeError(f"{self.name} has labels {self.label_names}; use .labels()")
+        return getattr(self._children[()], attr)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.copy().items()):
+            for sample_name, extra, value in child.samples(self.name):
+                lines.append(f"{sample_name}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, help_text, kind, label_names, factory):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, help_text, kind, label_names, factory)
+                self._families[name] = family
+            elif family.kind != kind:
+                raise ValueError(f"Metric '{name}' already registered as a {family.kind}")
+            return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(name, help_text, "counter", label_names, Counter)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(name, help_text, "gauge", label_names, Gauge)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(name, help_text, "histogram", label_names, lambda: Histogram(buckets))
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for family in list(self._families.values()):
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Metrics shared by main.py, the pipeline and the service
+STAGE_SECONDS = REGISTRY.histogram("drowsiness_stage_seconds", "Per-frame latency of each pipeline stage",
+                                   ("stage",))
+FRAMES_PROCESSED = REGISTRY.counter("drowsiness_frames_processed", "Frames run through landmark inference")
+FRAMES_DROPPED = REGISTRY.counter("drowsiness_frames_dropped", "Captured frames not inferred", ("reason",))
+FACES_LOST = REGISTRY.counter("drowsiness_faces_lost", "Times a tracked face disappeared")
+ENHANCEMENT_FAILURES = REGISTRY.counter("drowsiness_enhancement_failures",
+                                        "Frames that fell back to the raw image", ("reason",))
+QUEUE_DEPTH = REGISTRY.gauge("drowsiness_queue_depth", "Frames waiting between pipeline stages", ("queue",))
+FPS = REGISTRY.gauge("drowsiness_fps", "Rendered / processed frames per second", ("stream",))
+
+
+class RateLimitedLog:
+    """Structured `event key=value ...` log lines, at most one per
+    `interval` seconds per event; suppressed lines are counted and the
+    count is reported with the next line that gets through."""
+
+    def __init__(self, name, interval=1.0):
+        self.logger = logging.getLogger(name)
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def log(self, level, event, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        if now - self._last.get(event, -math.inf) < self.interval:
+            self._suppressed[event] = self._suppressed.get(event, 0) + 1
+            return
+        self._last[event] = now
+        suppressed = self._suppressed.pop(event, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self.logger.log(level, "%s %s", event, " ".join(f"{k}={_log_value(v)}" for k, v in fields.items()))
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+
+def _log_value(value):
+    if isinstance(value, float):
+        return f"{value:.3g}"
+    text = str(value)
+    return f'"{text}"' if " " in text else text
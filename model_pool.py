@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import RateLimitedLog
+
+log = RateLimitedLog("drowsiness.model_pool")
+
+
+class FaceMeshPool:
+    """FaceMesh instances shared by all streams, built on demand.
+
+    MediaPipe graphs are not thread-safe, so an instance is checked out
+    for one inference and handed back afterwards; whichever stream needs
+    one next reuses it. Up to `size` instances are built, the first time
+    they are needed. `warm_up()` builds `warm` of them ahead of time and
+    runs one inference through each, so the first real frame does not pay
+    for loading the models; `ready` is set once that is done.
+    """
+
+    def __init__(self, size=1, warm=0, warm_shape=(480, 640, 3), **detector_kwargs):
+        self.size = max(1, size)
+        self.warm = min(warm, self.size)
+        self.warm_shape = warm_shape
+        self.detector_kwargs = detector_kwargs
+
+        # LIFO: the most recently used (hot) instance is handed out first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+        self.built = 0
+        self.in_use = 0
+        self.waits = 0              # checkouts that had to wait for an instance
+        self.build_seconds = 0.0
+        self.warm_seconds = None
+        self.error = None
+
+    def _build(self):
+        # Imported here so importing the service does not load MediaPipe
+        from FaceMeshDetector import FaceMeshDetector
+        start = time.perf_counter()
+        detector = FaceMeshDetector(static_image_mode=True, **self.detector_kwargs)
+        with self._lock:
+            self.build_seconds += time.perf_counter() - start
+        return detector
+
+    def acquire(self):
+        try:
+            detector = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self.built < self.size
+                if grow:
+                    self.built += 1
+                else:
+                    self.waits += 1
+            if grow:
+                try:
+                    detector = self._build()
+                except Exception:
+                    with self._lock:
+                        self.built -= 1
+                    raise
+            else:
+                detector = self._idle.get()
+        with self._lock:
+            self.in_use += 1
+        return detector
+
+    def release(self, detector):
+        with self._lock:
+            self.in_use -= 1
+        self._idle.put(detector)
+
+    @contextmanager
+    def checkout(self):
+        detector = self.acquire()
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def warm_up(self):
+        """Build `warm` instances and run a blank frame through each (the
+        detection graph and model loading are exercised either way).
+        Returns False, and stays not ready, if that fails."""
+        start = time.perf_counter()
+        detectors = []
+        try:
+            frame = np.zeros(self.warm_shape, np.uint8)
+            for _ in range(self.warm):
+                detectors.append(self.acquire())
+                detectors[-1].detect_landmarks(frame)
+        except Exception as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+            log.warning("warmup_failed", error=self.error)
+            return False
+        finally:
+            for detector in detectors:
+                self.release(detector)
+        self.warm_seconds = time.perf_counter() - start
+        self.ready.set()
+        return True
+
+    def start_warm_up(self):
+        """warm_up() on a background thread, so the server can already
+        answer liveness checks"""
+        thread = threading.Thread(target=self.warm_up, name="facemesh-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def summary(self):
+        return {
+            "ready": self.ready.is_set(),
+            "size": self.size,
+            "warm": self.warm,
+            "built": self.built,
+            "idle": self._idle.qsize(),
+            "in_use": self.in_use,
+            "waits": self.waits,
+            "build_ms": round(self.build_seconds * 1000, 1),
+            "warm_up_ms": round(self.warm_seconds * 1000, 1) if self.warm_seconds is not None else None,
+            "error": self.error,
+        }
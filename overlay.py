@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class Sprite:
+    """A pre-rendered piece of overlay: colour patch plus coverage mask.
+
+    Drawing is a masked `np.copyto` into the frame, so it allocates
+    nothing and gives exactly the pixels the original cv2 calls would.
+    Anti-aliased drawing (putText in newer OpenCV builds) blends with
+    the frame underneath and cannot be cached that way; such sprites are
+    not `opaque` and simply replay the cv2 calls.
+    """
+
+    def __init__(self, x0, y0, patch, mask, draw_fn=None):
+        self.x0, self.y0 = x0, y0
+        self.patch = patch
+        self.mask = mask
+        self.draw_fn = draw_fn
+        self.opaque = draw_fn is None
+
+    @classmethod
+    def render(cls, bounds, draw):
+        """Record `draw(canvas, shift)` inside `bounds` (x0, y0, x1, y1 in
+        frame pixels); `shift` maps frame to canvas coordinates."""
+        x0, y0, x1, y1 = bounds
+        shape = (y1 - y0, x1 - x0, 3)
+        shift = (-x0, -y0)
+        # Draw on black and on white: touched pixels differ from the
+        # background, opaque ones come out the same on both
+        on_black, on_white = np.zeros(shape, np.uint8), np.full(shape, 255, np.uint8)
+        draw(on_black, shift)
+        draw(on_white, shift)
+        touched = (on_black != 0).any(-1) | (on_white != 255).any(-1)
+        if (on_black != on_white).any(-1)[touched].any():
+            return cls(x0, y0, None, None, draw_fn=draw)
+        return cls(x0, y0, on_black, touched[..., None])
+
+    def draw(self, image):
+        if not self.opaque:
+            self.draw_fn(image, (0, 0))
+            return
+        img_h, img_w = image.shape[:2]
+        h, w = self.patch.shape[:2]
+        # Clip against the frame so small frames don't raise
+        ix0, iy0 = max(self.x0, 0), max(self.y0, 0)
+        ix1, iy1 = min(self.x0 + w, img_w), min(self.y0 + h, img_h)
+        if ix0 >= ix1 or iy0 >= iy1:
+            return
+        px0, py0 = ix0 - self.x0, iy0 - self.y0
+        px1, py1 = px0 + ix1 - ix0, py0 + iy1 - iy0
+        np.copyto(image[iy0:iy1, ix0:ix1], self.patch[py0:py1, px0:px1], where=self.mask[py0:py1, px0:px1])
+
+
+def text_sprite(text, org, font_scale, color, thickness, font=FONT):
+    """Sprite of cv2.putText(image, text, org, font, font_scale, color, thickness)"""
+    (w, h), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    pad = thickness + 2
+    bounds = (org[0] - pad, org[1] - h - pad, org[0] + w + pad, org[1] + baseline + pad)
+
+    def draw(canvas, shift):
+        cv2.putText(canvas, text, (org[0] + shift[0], org[1] + shift[1]), font, font_scale, color, thickness)
+
+    return Sprite.render(bounds, draw)
+
+
+def text_advance(text, font_scale, thickness, font=FONT):
+    """x offset at which putText continues after `text`, so a label sprite
+    and a separately drawn value match putText of the joined string"""
+    return cv2.getTextSize(text, font, font_scale, thickness)[0][0] - 1
+
+
+class SpriteCache:
+    """Sprites keyed by what they show, built on first use. Bounded: when
+    full it is simply cleared, which only costs re-rendering."""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._sprites = {}
+
+    def get(self, key, build):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            if len(self._sprites) >= self.max_size:
+                self._sprites.clear()
+            sprite = build()
+            self._sprites[key] = sprite
+        return sprite
+
+    def text(self, text, org, font_scale, color, thickness):
+        return self.get(("text", text, org, font_scale, color, thickness),
+                        lambda: text_sprite(text, org, font_scale, color, thickness))
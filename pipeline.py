@@ -0,0 +1,250 @@
+import threading
+import time
+from collections import deque
+
+from metrics import STAGE_SECONDS, FRAMES_DROPPED, QUEUE_DEPTH
+
+
+class LatestFrameQueue:
+    """Bounded queue that drops the oldest item when full.
+
+    Stages always pick up the freshest frame instead of working through a
+    backlog, so a slow consumer costs dropped frames, not added latency.
+    """
+
+    def __init__(self, maxsize=1, drop_counter=None, on_drop=None):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.drop_counter = drop_counter
+        self.on_drop = on_drop      # called with each item pushed out
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            evicted = None
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                if self.drop_counter is not None:
+                    self.drop_counter.inc()
+                evicted = self._items[0]
+            self._items.append(item)
+            self._cond.notify()
+        if evicted is not None and self.on_drop is not None:
+            self.on_drop(evicted)
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None on timeout/close"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FrameBufferPool:
+    """Recycles frame arrays so capture does not allocate a new image per frame.
+
+    `acquire` hands out a previously released buffer (or None, in which case
+    cv2.VideoCapture.read allocates one); read() reuses a buffer whose shape
+    matches and silently replaces one that doesn't, so the pool follows
+    resolution changes by itself.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+        self.allocated += 1
+        return None
+
+    def release(self, buffer):
+        if buffer is None:
+            return
+        with self._lock:
+            if len(self._free) < self.size:
+                self._free.append(buffer)
+
+
+class StageStats:
+    """Rolling latency statistics for one pipeline stage (seconds), also
+    fed into a metrics histogram for /metrics-style export."""
+
+    def __init__(self, window=120, histogram=None):
+        self.samples = deque(maxlen=window)
+        self.histogram = histogram
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def avg_ms(self):
+        return 1000 * sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def max_ms(self):
+        return 1000 * max(self.samples) if self.samples else 0.0
+
+
+class FramePacket:
+    """A captured frame plus everything later stages attach to it."""
+
+    __slots__ = ("seq", "capture_time", "image", "result", "inference_done", "skipped", "inferred")
+
+    # With a FrameBufferPool, `image` is a pooled buffer: it is only valid
+    # until the packet is released (FramePipeline.release)
+
+    def __init__(self, seq, capture_time, image):
+        self.seq = seq
+        self.capture_time = capture_time
+        self.image = image
+        self.result = None
+        self.inference_done = None
+        self.skipped = 0          # captured frames not inferred since the previous inferred one
+        self.inferred = False     # False: result carried over from an earlier frame
+
+
+class FramePipeline:
+    """capture -> inference -> render, each stage joined by a LatestFrameQueue.
+
+    Capture and inference run on their own threads; rendering happens in the
+    caller's thread (cv2.imshow must stay on the main thread) via `next_frame`.
+
+    With a `buffer_pool`, frames are captured into recycled arrays, so
+    `preprocess_fn` should work in place (e.g. cv2.flip(image, 1, dst=image))
+    and the caller hands each packet back with `release` once rendered.
+
+    With a `scheduler` (AdaptiveScheduler) only some frames are inferred; the
+    rest are rendered with the latest result. Every inferred packet records
+    in `skipped` how many captured frames were not inferred before it,
+    whether the scheduler skipped them or a queue dropped them.
+    """
+
+    STAGES = ("capture", "queue_wait", "inference", "render", "end_to_end")
+
+    def __init__(self, cap, infer_fn, preprocess_fn=None, queue_size=1, scheduler=None, buffer_pool=None):
+        self.cap = cap
+        self.infer_fn = infer_fn
+        self.preprocess_fn = preprocess_fn
+        self.scheduler = scheduler
+        self.buffer_pool = buffer_pool
+
+        self.capture_queue = LatestFrameQueue(queue_size, FRAMES_DROPPED.labels(reason="capture_queue"),
+                                              on_drop=self.release)
+        self.render_queue = LatestFrameQueue(queue_size, FRAMES_DROPPED.labels(reason="render_queue"),
+                                             on_drop=self.release)
+        self.stats = {name: StageStats(histogram=STAGE_SECONDS.labels(stage=name)) for name in self.STAGES}
+        QUEUE_DEPTH.labels(queue="capture").set_function(lambda: len(self.capture_queue))
+        QUEUE_DEPTH.labels(queue="render").set_function(lambda: len(self.render_queue))
+
+        self.running = False
+        self._threads = []
+
+    def start(self):
+        self.running = True
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self.running = False
+        self.capture_queue.close()
+        self.render_queue.close()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    def _capture_loop(self):
+        seq = 0
+        while self.running and self.cap.isOpened():
+            start = time.time()
+            buffer = self.buffer_pool.acquire() if self.buffer_pool is not None else None
+            success, image = self.cap.read(buffer)
+            if not success:
+                self.release_buffer(buffer)
+                continue
+
+            capture_time = time.time()
+            if self.preprocess_fn is not None:
+                image = self.preprocess_fn(image)
+
+            self.stats["capture"].add(time.time() - start)
+            self.capture_queue.put(FramePacket(seq, capture_time, image))
+            seq += 1
+
+        self.running = False
+        self.capture_queue.close()
+
+    def _inference_loop(self):
+        last_seq, last_result = None, None
+        while self.running:
+            packet = self.capture_queue.get(timeout=0.5)
+            if packet is None:
+                continue
+
+            if (self.scheduler is not None and last_result is not None
+                    and not self.scheduler.should_infer(packet.capture_time)):
+                packet.result = last_result
+                self.render_queue.put(packet)
+                continue
+
+            start = time.time()
+            self.stats["queue_wait"].add(start - packet.capture_time)
+            packet.skipped = packet.seq - last_seq - 1 if last_seq is not None else 0
+            packet.inferred = True
+            packet.result = last_result = self.infer_fn(packet)
+            packet.inference_done = time.time()
+            last_seq = packet.seq
+            self.stats["inference"].add(packet.inference_done - start)
+            if self.scheduler is not None:
+                self.scheduler.record_latency(packet.inference_done - start)
+            self.render_queue.put(packet)
+
+        self.render_queue.close()
+
+    def next_frame(self, timeout=0.5):
+        """Block until an inferred frame is ready for rendering"""
+        return self.render_queue.get(timeout=timeout)
+
+    def release_buffer(self, buffer):
+        if self.buffer_pool is not None:
+            self.buffer_pool.release(buffer)
+
+    def release(self, packet):
+        """Return a packet's frame buffer to the pool (no-op without one)"""
+        if self.buffer_pool is not None and packet.image is not None:
+            self.buffer_pool.release(packet.image)
+            packet.image = None
+
+    def frame_rendered(self, packet, render_start):
+        now = time.time()
+        self.stats["render"].add(now - render_start)
+        self.stats["end_to_end"].add(now - packet.capture_time)
+
+    def queue_depths(self):
+        return len(self.capture_queue), len(self.render_queue)
+
+    def dropped_frames(self):
+        return self.capture_queue.dropped + self.render_queue.dropped
+
+    def summary(self):
+        return {name: (s.avg_ms(), s.max_ms()) for name, s in self.stats.items()}
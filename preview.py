@@ -0,0 +1,180 @@
+import asyncio
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BOUNDARY = "frame"
+MJPEG_CONTENT_TYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+
+
+class FramePreview:
+    """Latest rendered frame of one stream as JPEG, for MJPEG / snapshot viewers.
+
+    Producers call `submit` for every processed frame. Unless someone is
+    watching (an attached viewer, or a snapshot within the last `linger`
+    seconds) that is a single check. Otherwise, at most `fps` times per
+    second, the frame is scaled to `width`, overlays are drawn on the
+    scaled copy and it is JPEG-encoded once; all viewers get those bytes.
+    """
+
+    def __init__(self, width=640, quality=70, fps=10.0, linger=5.0):
+        self.width = width          # None = source resolution
+        self.quality = quality
+        self.fps = fps
+        self.linger = linger
+
+        self.viewers = 0
+        self.generation = 0
+        self.jpeg = None
+        self.encoded = 0
+        self.closed = False
+
+        self._last_request = -math.inf
+        self._last_encode = -math.inf
+        self._buffer = None
+        self._cond = threading.Condition()
+
+    @property
+    def watching(self):
+        return self.viewers > 0 or time.monotonic() - self._last_request < self.linger
+
+    def due(self):
+        """True if the next submitted frame would be encoded"""
+        return self.watching and time.monotonic() - self._last_encode >= 1.0 / self.fps
+
+    def submit(self, image, draw=None):
+        """Offer a frame; `draw(frame)` adds overlays to the scaled copy"""
+        if not self.due():
+            return False
+        self._last_encode = time.monotonic()
+        frame = self._scale(image)
+        if draw is not None:
+            draw(frame)
+        success, jpeg = cv2.imencode(".jpg", frame, (cv2.IMWRITE_JPEG_QUALITY, self.quality))
+        if not success:
+            return False
+        with self._cond:
+            self.jpeg = jpeg.tobytes()
+            self.generation += 1
+            self.encoded += 1
+            self._cond.notify_all()
+        return True
+
+    def _scale(self, image):
+        # Always into our own buffer: overlays must not touch the caller's frame
+        h, w = image.shape[:2]
+        if self.width is None or w <= self.width:
+            if self._buffer is None or self._buffer.shape != image.shape:
+                self._buffer = image.copy()
+            else:
+                np.copyto(self._buffer, image)
+            return self._buffer
+        size = (self.width, max(1, round(h * self.width / w)))
+        if self._buffer is None or self._buffer.shape[:2] != (size[1], size[0]):
+            self._buffer = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        else:
+            cv2.resize(image, size, dst=self._buffer, interpolation=cv2.INTER_AREA)
+        return self._buffer
+
+    def attach(self):
+        with self._cond:
+            self.viewers += 1
+
+    def detach(self):
+        with self._cond:
+            self.viewers -= 1
+
+    def wait_frame(self, after_generation=0, timeout=None):
+        """Block until a frame newer than `after_generation` is encoded.
+        Returns (generation, jpeg), or (generation, None) on timeout/close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.generation > after_generation or self.closed, timeout)
+            if self.generation > after_generation:
+                return self.generation, self.jpeg
+            return self.generation, None
+
+    def snapshot(self, timeout=2.0):
+        """A fresh JPEG: the latest one if it is recent, else the next one"""
+        self._last_request = time.monotonic()
+        with self._cond:
+            generation, jpeg = self.generation, self.jpeg
+        if jpeg is not None and time.monotonic() - self._last_encode < 2.0 / self.fps:
+            return jpeg
+        return self.wait_frame(generation, timeout)[1]
+
+    async def frames(self):
+        """Yield each new JPEG while the caller keeps iterating"""
+        self.attach()
+        try:
+            generation = 0
+            while not self.closed:
+                if self.generation != generation:
+                    generation, jpeg = self.generation, self.jpeg
+                    yield jpeg
+                await asyncio.sleep(0.5 / self.fps)
+        finally:
+            self.detach()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+def mjpeg_part(jpeg):
+    """One part of a multipart/x-mixed-replace MJPEG response"""
+    header = f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+    return header.encode() + jpeg + b"\r\n"
+
+
+async def mjpeg_stream(preview):
+    async for jpeg in preview.frames():
+        yield mjpeg_part(jpeg)
+
+
+def serve_preview(preview, port, host="0.0.0.0"):
+    """Serve /preview.mjpg and /snapshot.jpg from a background thread
+    (for main.py; the FastAPI service has its own endpoints)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/snapshot.jpg"):
+                jpeg = preview.snapshot()
+                if jpeg is None:
+                    self.send_error(504, "No frame rendered yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+            elif self.path in ("/", "/preview.mjpg"):
+                self.send_response(200)
+                self.send_header("Content-Type", MJPEG_CONTENT_TYPE)
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                preview.attach()
+                try:
+                    generation = 0
+                    while not preview.closed:
+                        generation, jpeg = preview.wait_frame(generation, timeout=5.0)
+                        if jpeg is not None:
+                            self.wfile.write(mjpeg_part(jpeg))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    preview.detach()
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="preview", daemon=True).start()
+    return server
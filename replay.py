@@ -0,0 +1,339 @@
+"""Replay recorded landmark traces through the decision logic and diff the alerts.
+
+    python replay.py traces/ --save golden.json
+    python replay.py traces/ --compare golden.json --set detector.perclos_medium=0.22
+
+A trace is an .npz with the same keys as the benchmark fixtures:
+
+    timestamps  (T,)        float64 capture times in seconds
+    landmarks   (T, K, 3)   float32 normalised x, y, z of the driver's face,
+                            NaN on frames without one
+    width, height           frame size the landmarks refer to
+    indices     (K,)        optional: FaceMesh IDs of the K stored landmarks
+                            (all 468 when absent)
+    drowsy_onset            optional label: seconds into the trace at which
+                            the driver is drowsy, NaN for an alert drive
+    driver_changes (T,)     optional: True on frames where another person
+                            became the driver (smoothing and a running
+                            calibration are reset there, as live)
+
+Each trace is run through HeadPoseEstimator -> EyeTracker -> AutoCalibrator
+-> EnhancedDrowsinessDetector exactly as a live stream would, on the trace's
+own timestamps, so a trace replays hundreds of times faster than real time
+and traces are spread over worker processes. The result is an alert
+timeline per trace: level changes and microsleep onsets, in seconds from
+the start of the trace.
+
+--save writes the timelines as golden outputs; --compare diffs against
+them (events within --tolerance seconds match) and exits non-zero when
+any trace changed or a golden trace was not replayed (--allow-missing
+to compare a subset). For labelled traces it also reports latency-to-alert
+and false alerts per hour, so threshold changes (--set) can be judged on
+data. Traces are recorded from footage with
+`batch_process.py --save-traces`.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NUM_LANDMARKS = 468
+ALERT_LEVELS = ("MEDIUM", "CRITICAL")
+
+# Objects of the chain that --set can reach (see replay_trace)
+SET_TARGETS = ("detector", "blinks", "pose", "eyes", "calibrator")
+
+
+def load_trace(path):
+    with np.load(path) as data:
+        trace = {"timestamps": data["timestamps"], "landmarks": data["landmarks"],
+                 "width": int(data["width"]), "height": int(data["height"])}
+        trace["indices"] = data["indices"] if "indices" in data else None
+        trace["drowsy_onset"] = float(data["drowsy_onset"]) if "drowsy_onset" in data else None
+        trace["driver_changes"] = data["driver_changes"].astype(bool) if "driver_changes" in data else None
+    return trace
+
+
+def save_trace(path, timestamps, landmarks, width, height, indices=None, drowsy_onset=None, driver_changes=None):
+    """Write a trace; `landmarks` holds NaN rows for frames without a face"""
+    arrays = {"timestamps": np.asarray(timestamps, dtype=np.float64),
+              "landmarks": np.asarray(landmarks, dtype=np.float32),
+              "width": width, "height": height}
+    if indices is not None:
+        arrays["indices"] = np.asarray(indices, dtype=np.int16)
+    if drowsy_onset is not None:
+        arrays["drowsy_onset"] = drowsy_onset
+    if driver_changes is not None:
+        arrays["driver_changes"] = np.asarray(driver_changes, dtype=bool)
+    np.savez_compressed(path, **arrays)
+
+
+def parse_overrides(items):
+    """['detector.perclos_medium=0.22', ...] -> {('detector', 'perclos_medium'): 0.22}"""
+    overrides = {}
+    for item in items or ():
+        name, sep, value = item.partition("=")
+        target, dot, attr = name.partition(".")
+        if not sep or not dot or target not in SET_TARGETS:
+            raise ValueError(f"--set expects <{'|'.join(SET_TARGETS)}>.<attribute>=<value>, got '{item}'")
+        overrides[(target, attr)] = json.loads(value)
+    return overrides
+
+
+def replay_trace(path, overrides=None, calibrate=True):
+    """Run one trace through the decision chain; returns its alert timeline"""
+    from HeadPoseEstimator import HeadPoseEstimator
+    from EyeTracker import EyeTracker
+    from drowsiness_logic import EnhancedDrowsinessDetector
+    from calibration import AutoCalibrator
+
+    trace = load_trace(path)
+    timestamps, landmarks = trace["timestamps"], trace["landmarks"]
+    img_w, img_h = trace["width"], trace["height"]
+
+    head_pose_estimator = HeadPoseEstimator()
+    eye_tracker = EyeTracker()
+    drowsiness_detector = EnhancedDrowsinessDetector()
+    calibrator = AutoCalibrator(head_pose_estimator, drowsiness_detector) if calibrate else None
+    targets = {"detector": drowsiness_detector, "blinks": drowsiness_detector.blink_detector,
+               "pose": head_pose_estimator, "eyes": eye_tracker, "calibrator": calibrator}
+    for (target, attr), value in (overrides or {}).items():
+        obj = targets[target]
+        if obj is None or not hasattr(obj, attr):
+            raise ValueError(f"unknown setting {target}.{attr}")
+        setattr(obj, attr, value)
+
+    # Subset traces are scattered into one full-size array per frame
+    indices = trace["indices"]
+    points = np.full((NUM_LANDMARKS, 3), np.nan) if indices is not None else None
+    present = ~np.isnan(landmarks[:, :, 0]).all(axis=1)
+    driver_changes = trace["driver_changes"]
+    if driver_changes is None:
+        driver_changes = np.zeros(len(timestamps), dtype=bool)
+
+    start = time.perf_counter()
+    t0 = float(timestamps[0]) if len(timestamps) else 0.0
+    events = []
+    level, microsleep = "NOT DROWSY", False
+    for i, timestamp in enumerate(timestamps.tolist()):
+        head_direction, ear = "Unknown", 0.0
+        if driver_changes[i]:
+            # Another person: same resets as the live chain
+            head_pose_estimator.reset_tracking()
+            eye_tracker.reset_tracking()
+            if calibrator is not None and calibrator.calibrating:
+                calibrator.start()
+        if present[i]:
+            if indices is None:
+                points = landmarks[i]
+            else:
+                points[indices] = landmarks[i]
+            pose_data = head_pose_estimator.estimate_pose_from_array(points, img_w, img_h)
+            if pose_data:
+                head_direction = pose_data['direction']
+            ear, _, _ = eye_tracker.calculate_ear_from_array(points, img_w, img_h)
+            if pose_data and calibrator is not None:
+                calibrator.update(pose_data['angles'], ear, timestamp)
+        else:
+            # Face lost: don't smooth with the previous pose
+            head_pose_estimator.reset_tracking()
+
+        drowsiness_detector.update_blink(ear, head_direction, timestamp)
+        drowsiness_detector.update_state(head_direction, timestamp)
+        t = round(timestamp - t0, 3)
+        if drowsiness_detector.drowsiness_level != level:
+            level = drowsiness_detector.drowsiness_level
+            events.append({"t": t, "event": "level", "value": level})
+        if drowsiness_detector.blink_detector.in_microsleep(timestamp) != microsleep:
+            microsleep = not microsleep
+            if microsleep:
+                events.append({"t": t, "event": "microsleep"})
+
+    duration = float(timestamps[-1]) - t0 if len(timestamps) else 0.0
+    return {"trace": path, "frames": len(timestamps), "duration": duration,
+            "seconds": time.perf_counter() - start, "drowsy_onset": trace["drowsy_onset"],
+            "events": events}
+
+
+def _replay_worker(job):
+    path, overrides, calibrate = job
+    try:
+        return replay_trace(path, overrides, calibrate)
+    except Exception as exc:
+        return {"trace": path, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def diff_timelines(golden, current, tolerance=0.5):
+    """Match events of the same kind and value within `tolerance` seconds.
+    Returns {"missing": [...], "added": [...], "max_shift": seconds}."""
+    unmatched = list(current)
+    missing, max_shift = [], 0.0
+    for event in golden:
+        key = (event["event"], event.get("value"))
+        best = None
+        for candidate in unmatched:
+            if (candidate["event"], candidate.get("value")) != key:
+                continue
+            shift = abs(candidate["t"] - event["t"])
+            if shift <= tolerance and (best is None or shift < abs(best["t"] - event["t"])):
+                best = candidate
+        if best is None:
+            missing.append(event)
+        else:
+            unmatched.remove(best)
+            max_shift = max(max_shift, abs(best["t"] - event["t"]))
+    return {"missing": missing, "added": unmatched, "max_shift": round(max_shift, 3)}
+
+
+def alert_metrics(results, alert_levels=ALERT_LEVELS):
+    """Latency-to-alert over drowsy traces and false alerts per hour of
+    alert driving, from traces that carry a drowsy_onset label"""
+    latencies, missed, false_alerts, alert_hours = [], 0, 0, 0.0
+    for result in results:
+        onset = result.get("drowsy_onset")
+        if onset is None:
+            continue
+        drowsy = not np.isnan(onset)
+        # Alert onsets: entering an alert level from a non-alert one
+        alerts, alerting = [], False
+        for event in result["events"]:
+            if event["event"] != "level":
+                continue
+            if event["value"] in alert_levels and not alerting:
+                alerts.append(event["t"])
+            alerting = event["value"] in alert_levels
+
+        end = onset if drowsy else result["duration"]
+        false_alerts += sum(1 for t in alerts if t < end)
+        alert_hours += end / 3600.0
+        if drowsy:
+            after = [t for t in alerts if t >= onset]
+            if after:
+                latencies.append(after[0] - onset)
+            else:
+                missed += 1
+
+    if not latencies and not missed and alert_hours == 0:
+        return None
+    return {
+        "drowsy_traces": len(latencies) + missed,
+        "detected": len(latencies),
+        "latency_p50": float(np.median(latencies)) if latencies else None,
+        "latency_p90": float(np.percentile(latencies, 90)) if latencies else None,
+        "false_alerts": false_alerts,
+        "false_alerts_per_hour": false_alerts / alert_hours if alert_hours > 0 else None,
+    }
+
+
+def find_traces(inputs):
+    traces = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                traces.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(".npz"))
+        else:
+            traces.append(item)
+    return traces
+
+
+def trace_key(path, inputs):
+    """Golden key: path relative to the input directory it was found in"""
+    for item in inputs:
+        if os.path.isdir(item) and os.path.abspath(path).startswith(os.path.abspath(item) + os.sep):
+            return os.path.relpath(path, item).replace(os.sep, "/")
+    return os.path.basename(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="trace files (.npz) and/or directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--save", help="write the alert timelines as golden outputs (JSON)")
+    parser.add_argument("--compare", help="golden outputs to diff against")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="don't fail on golden traces that were not replayed (comparing a subset)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="seconds an event may move and still match")
+    parser.add_argument("--set", action="append", metavar="TARGET.ATTR=VALUE",
+                        help=f"override a parameter before replay; TARGET is one of {', '.join(SET_TARGETS)}")
+    parser.add_argument("--no-calibration", action="store_true", help="keep the default pose / EAR threshold")
+    parser.add_argument("--alert-levels", nargs="+", default=list(ALERT_LEVELS),
+                        help="levels that count as an alert for the metrics")
+    parser.add_argument("--show", type=int, default=10, help="changed traces to print in detail")
+    args = parser.parse_args()
+
+    try:
+        overrides = parse_overrides(args.set)
+    except ValueError as exc:
+        parser.error(str(exc))
+    traces = find_traces(args.inputs)
+    if not traces:
+        parser.error("no traces found")
+
+    print(f"Replaying {len(traces)} trace(s) on {args.workers} worker(s)")
+    start = time.perf_counter()
+    jobs = [(path, overrides, not args.no_calibration) for path in traces]
+    chunksize = max(1, len(jobs) // (args.workers * 4))
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(_replay_worker, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if "error" in r]
+    for result in failed:
+        print(f"⚠️ {result['trace']}: {result['error']}")
+    results = [r for r in results if "error" not in r]
+    frames = sum(r["frames"] for r in results)
+    duration = sum(r["duration"] for r in results)
+    print(f"Replayed {frames} frames ({duration / 3600:.2f} h of driving) in {elapsed:.1f}s "
+          f"({frames / elapsed if elapsed else 0:.0f} fps, {duration / elapsed if elapsed else 0:.0f}x real time)")
+
+    metrics = alert_metrics(results, args.alert_levels)
+    if metrics is not None:
+        latency = "n/a" if metrics["latency_p50"] is None else \
+            f"p50 {metrics['latency_p50']:.2f}s, p90 {metrics['latency_p90']:.2f}s"
+        rate = "n/a" if metrics["false_alerts_per_hour"] is None else f"{metrics['false_alerts_per_hour']:.2f}/h"
+        print(f"Detected {metrics['detected']}/{metrics['drowsy_traces']} drowsy traces, latency-to-alert {latency}; "
+              f"{metrics['false_alerts']} false alerts ({rate})")
+
+    timelines = {trace_key(r["trace"], args.inputs): r["events"] for r in results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"settings": {"set": args.set or [], "calibration": not args.no_calibration},
+                       "timelines": timelines}, f, indent=1, sort_keys=True)
+        print(f"Saved {len(timelines)} golden timelines to {args.save}")
+
+    changed = 0
+    if args.compare:
+        with open(args.compare) as f:
+            golden = json.load(f)["timelines"]
+        for key in sorted(timelines):
+            if key not in golden:
+                print(f"  {key}: no golden output")
+                changed += 1
+                continue
+            diff = diff_timelines(golden[key], timelines[key], args.tolerance)
+            if diff["missing"] or diff["added"]:
+                changed += 1
+                if changed <= args.show:
+                    print(f"  {key}: {len(diff['missing'])} missing, {len(diff['added'])} added")
+                    for event in diff["missing"]:
+                        print(f"    - {event['t']:9.3f}s {event['event']} {event.get('value', '')}")
+                    for event in diff["added"]:
+                        print(f"    + {event['t']:9.3f}s {event['event']} {event.get('value', '')}")
+        absent = sorted(set(golden) - set(timelines))
+        for key in absent[:args.show]:
+            print(f"  {key}: golden trace not replayed")
+        print(f"{changed} of {len(timelines)} trace(s) changed vs {args.compare}"
+              + (f", {len(absent)} golden trace(s) not replayed" if absent else ""))
+        # A trace that was not found must not pass as unchanged
+        if not args.allow_missing:
+            changed += len(absent)
+
+    if failed or changed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+# Result fields sent as telemetry (state changes carry the full result)
+TELEMETRY_FIELDS = ("stream_id", "timestamp", "drowsiness_level", "ear", "perclos", "angles", "blink_rate",
+                    "microsleep")
+
+
+class ResultChannel:
+    """Push side of one stream's results.
+
+    The detection thread calls `publish` for every frame; it only swaps in
+    the latest result, bumps a generation counter and, if anything is
+    listening, schedules one wake-up on the event loop, so its cost does
+    not depend on the number of subscribers (and frames that nobody is
+    waiting for skip even that). Subscribers share one event per
+    generation and read the newest result when they get to it: a slow
+    client skips intermediate telemetry instead of queueing it. State
+    changes go into a short log so no subscriber misses one.
+    """
+
+    def __init__(self, history=256):
+        self.generation = 0
+        self.latest = None
+        self.transitions = deque(maxlen=history)   # (seq, encoded message)
+        self.transition_seq = 0
+        self.subscribers = 0
+        self.closed = False
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._event = None          # set on every publish
+        self._state_event = None    # set on state changes only
+        self._waiting = False       # someone waits on _event (not just _state_event)
+        self._telemetry_cache = (None, None)      # (generation, encoded message)
+
+    def publish(self, result, state_changed=False):
+        """Called from the detection thread; never blocks on subscribers"""
+        with self._lock:
+            self.generation += 1
+            self.latest = result
+            if state_changed:
+                self.transition_seq += 1
+                self.transitions.append((self.transition_seq, encode_message("state", result)))
+            # Most frames need no wake-up: subscribers between telemetry
+            # sends only listen for state changes
+            notify = self.subscribers > 0 and (state_changed or self._waiting)
+        if notify:
+            self._notify(state_changed)
+
+    def close(self):
+        self.closed = True
+        self._notify(True)
+
+    def _notify(self, state_changed):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, state_changed)
+        except RuntimeError:
+            # Event loop already shut down; the next subscriber binds a new one
+            self._loop = None
+
+    def _wake(self, state_changed):
+        # Swap in fresh events first, so waiters that re-arm after this
+        # wake-up wait for the next publish
+        event, self._event = self._event, asyncio.Event()
+        self._waiting = False
+        event.set()
+        if state_changed:
+            event, self._state_event = self._state_event, asyncio.Event()
+            event.set()
+
+    def _attach(self):
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+            self._state_event = asyncio.Event()
+        self.subscribers += 1
+
+    def _detach(self):
+        self.subscribers -= 1
+
+    def transitions_since(self, seq):
+        """State-change messages after `seq`, and the newest sequence number"""
+        with self._lock:
+            return [message for s, message in self.transitions if s > seq], self.transition_seq
+
+    def telemetry(self):
+        """Encoded telemetry for the latest result, shared by all subscribers"""
+        with self._lock:
+            generation, latest = self.generation, self.latest
+        cached_generation, message = self._telemetry_cache
+        if cached_generation != generation:
+            message = encode_message("telemetry", {k: latest.get(k) for k in TELEMETRY_FIELDS})
+            self._telemetry_cache = (generation, message)
+        return message, generation
+
+    async def subscribe(self, rate=2.0, keepalive=15.0):
+        """Yield encoded messages: every state change as it happens, plus
+        telemetry at most `rate` times per second (0 = state changes only).
+        Yields None as a keepalive after `keepalive` idle seconds."""
+        self._attach()
+        try:
+            interval = 1.0 / rate if rate > 0 else None
+            seen_transition = self.transition_seq
+            sent_generation = self.generation
+            last_telemetry = last_sent = time.monotonic()
+
+            while not self.closed:
+                # Grab the events before checking state so no wake-up is lost
+                event, state_event = self._event, self._state_event
+                now = time.monotonic()
+
+                if self.transition_seq != seen_transition:
+                    messages, seen_transition = self.transitions_since(seen_transition)
+                    for message in messages:
+                        yield message
+                    last_sent = now
+                    continue
+
+                if interval is not None and self.generation != sent_generation:
+                    wait = last_telemetry + interval - now
+                    if wait <= 0:
+                        message, sent_generation = self.telemetry()
+                        last_telemetry = last_sent = now
+                        yield message
+                        continue
+                    # Telemetry is pending: only a state change cuts the wait short
+                    event = state_event
+                else:
+                    wait = last_sent + keepalive - now
+                    if wait <= 0:
+                        last_sent = now
+                        yield None
+                        continue
+                    if interval is None:
+                        event = state_event
+                    else:
+                        self._waiting = True
+
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._detach()
+
+
+def encode_message(kind, result):
+    return json.dumps({"type": kind, **result}, default=float)
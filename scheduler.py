@@ -0,0 +1,97 @@
+import time
+
+from metrics import FRAMES_DROPPED
+
+
+class AdaptiveScheduler:
+    """Decides which captured frames get FaceMesh inference.
+
+    The inference rate follows the current risk: `min_fps` while the driver
+    has been steady, forward-facing and NOT DROWSY for `steady_seconds`,
+    rising to `max_fps` as EAR approaches the threshold, and jumping to
+    `max_fps` as soon as the head leaves "Looking Forward" or an alert is
+    raised. It is also capped by what the machine can sustain, measured
+    from recent inference latency, so an overloaded CPU skips frames evenly
+    instead of building a backlog.
+
+    Callers count the frames they skip and pass that number on to
+    EnhancedDrowsinessDetector.update_blink so PERCLOS stays a per-frame
+    measure.
+    """
+
+    def __init__(self, max_fps=30.0, min_fps=8.0, steady_seconds=2.0, ear_margin=0.10,
+                 headroom=0.85, latency_alpha=0.2):
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.steady_seconds = steady_seconds   # calm time before dropping to min_fps
+        self.ear_margin = ear_margin           # raise the rate below threshold * (1 + margin)
+        self.headroom = headroom               # fraction of measured capacity to use
+        self.latency_alpha = latency_alpha     # EMA weight of the newest latency sample
+
+        self.latency = None           # smoothed seconds per inference
+        self.risk = 1.0               # 0 = steady, 1 = full rate; start at full rate
+        self.last_risky_time = None
+        self.last_run_time = None
+
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self._skip_counter = FRAMES_DROPPED.labels(reason="scheduler")
+
+    @property
+    def capacity_fps(self):
+        if not self.latency:
+            return self.max_fps
+        return self.headroom / self.latency
+
+    @property
+    def target_fps(self):
+        desired = self.min_fps + self.risk * (self.max_fps - self.min_fps)
+        return max(min(desired, self.capacity_fps, self.max_fps), 1e-3)
+
+    def should_infer(self, timestamp=None):
+        """True if the frame captured at `timestamp` should be run"""
+        now = time.time() if timestamp is None else timestamp
+        # Small tolerance so a 30 fps camera is not throttled to 15 fps by jitter
+        if self.last_run_time is not None and now - self.last_run_time < 0.9 / self.target_fps:
+            self.frames_skipped += 1
+            self._skip_counter.inc()
+            return False
+        self.last_run_time = now
+        self.frames_inferred += 1
+        return True
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.latency_alpha * (seconds - self.latency)
+
+    def update_risk(self, ear, ear_threshold, head_direction, drowsiness_level, timestamp=None):
+        """Fold one inferred frame's outcome into the risk level"""
+        now = time.time() if timestamp is None else timestamp
+        if head_direction != "Looking Forward" or drowsiness_level != "NOT DROWSY":
+            risk = 1.0
+        else:
+            # Linear ramp from threshold * (1 + margin) (0) down to the threshold (1)
+            band = ear_threshold * self.ear_margin
+            risk = (ear_threshold + band - ear) / band
+            risk = min(max(float(risk), 0.0), 1.0)
+
+        if self.last_risky_time is None:
+            # First frame: stay at full rate until the driver has proven steady
+            self.last_risky_time = now
+        if risk > 0.0:
+            self.last_risky_time = now
+            self.risk = risk
+        elif now - self.last_risky_time >= self.steady_seconds:
+            self.risk = 0.0
+        return self.risk
+
+    def stats(self):
+        return {
+            "target_fps": round(self.target_fps, 1),
+            "capacity_fps": round(self.capacity_fps, 1),
+            "risk": round(self.risk, 2),
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_skipped,
+        }
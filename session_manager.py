@@ -0,0 +1,387 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from HeadPoseEstimator import HeadPoseEstimator
+from EyeTracker import EyeTracker
+from drowsiness_logic import EnhancedDrowsinessDetector
+from calibration import AutoCalibrator
+from scheduler import AdaptiveScheduler
+from result_stream import ResultChannel
+from preview import FramePreview
+from metrics import STAGE_SECONDS, FRAMES_PROCESSED, FACES_LOST, QUEUE_DEPTH, FPS
+from face_tracker import FaceTracker
+from landmark_array import landmarks_to_array
+from model_pool import FaceMeshPool
+
+
+# Consecutive failed reads after which a file/URL source counts as ended
+MAX_FAILED_READS = 30
+
+
+class SessionLimitError(RuntimeError):
+    """Raised when a new stream would exceed the configured capacity."""
+
+
+class LandmarkWorkerPool:
+    """Runs FaceMesh for all streams on a fixed number of worker threads."""
+
+    def __init__(self, num_workers=None, max_pending=None, warm=0, **detector_kwargs):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        # MediaPipe graphs are not thread-safe: each inference checks one out.
+        # Frames from different streams interleave, so tracking is disabled.
+        self.models = FaceMeshPool(size=self.num_workers, warm=warm, **detector_kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=self.num_workers,
+                                            thread_name_prefix="facemesh")
+        # Bound the number of frames waiting for a worker so a burst of
+        # streams applies backpressure instead of growing the queue forever
+        self._slots = threading.BoundedSemaphore(max_pending or self.num_workers * 2)
+        self._pending = QUEUE_DEPTH.labels(queue="facemesh_pool")
+
+    def _detect(self, image):
+        try:
+            with self.models.checkout() as detector:
+                return detector.detect_landmarks(image)
+        finally:
+            self._pending.dec()
+            self._slots.release()
+
+    def submit(self, image):
+        """Queue a frame for landmark detection and return a Future"""
+        self._slots.acquire()
+        self._pending.inc()
+        try:
+            return self._executor.submit(self._detect, image)
+        except Exception:
+            self._pending.dec()
+            self._slots.release()
+            raise
+
+    def detect(self, image):
+        return self.submit(image).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class StreamSession:
+    """Detection state owned by a single stream (camera / vehicle)."""
+
+    def __init__(self, stream_id, source=None, driver_id=None, profile_store=None, preview_settings=None,
+                 driver_policy="largest", event_store=None):
+        self.stream_id = stream_id
+        self.source = source
+        self.driver_id = driver_id or stream_id
+
+        # Per-stream state: EAR smoothing, PERCLOS history, head pose
+        self.head_pose_estimator = HeadPoseEstimator()
+        self.eye_tracker = EyeTracker()
+        self.drowsiness_detector = EnhancedDrowsinessDetector()
+        # Only the eye and pose landmarks are ever read
+        self.used_landmarks = sorted(set(self.eye_tracker.used_idx) | set(self.head_pose_estimator.pose_idx.tolist()))
+        # Face identities across frames; only the driver's face is analysed
+        self.face_tracker = FaceTracker(driver_policy)
+        # Neutral pose / EAR threshold: stored profile, or learned from the first seconds
+        self.calibrator = AutoCalibrator(self.head_pose_estimator, self.drowsiness_detector,
+                                         driver_id=self.driver_id, store=profile_store)
+        # How many of this stream's frames get inferred (capture loop only)
+        self.scheduler = AdaptiveScheduler()
+
+        self.latest_result = {"drowsiness_level": "Not Started"}
+        # Pushes results to WebSocket / SSE subscribers
+        self.channel = ResultChannel()
+        # On-disk history: level transitions and downsampled telemetry
+        self.event_log = event_store.writer(stream_id) if event_store is not None else None
+        self.drowsiness_detector.event_log = self.event_log
+        # Rendered JPEG preview; costs nothing while nobody watches
+        self.preview = FramePreview(**(preview_settings or {}))
+        self.frames_processed = 0
+        self.fps = 0.0                  # smoothed processed frames per second
+        self.last_timestamp = None
+        self.face_present = False
+        self._fps_gauge = FPS.labels(stream=stream_id)
+        self.created_at = time.time()
+        self.last_update = None
+
+        # Capture loop (only used for streams with a local source)
+        self.running = False
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def update(self, image, results, timestamp=None, skipped_frames=0):
+        """Fold one frame's FaceMesh results into this stream's state"""
+        return self.update_faces(image, results.multi_face_landmarks or [], timestamp, skipped_frames)
+
+    def update_faces(self, image, faces, timestamp=None, skipped_frames=0):
+        """Update state from per-face (N, 3) landmark arrays or MediaPipe
+        landmark lists. Only the driver's face (see FaceTracker) is analysed.
+
+        `timestamp` is the frame's capture time in seconds; it defaults to
+        the time of the call. `skipped_frames` is the number of captured
+        frames of this stream that were not inferred since the last update.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        head_direction, ear, angles = "Unknown", 0.0, None
+        img_h, img_w = image.shape[:2]
+
+        with self._lock:
+            driver = self.face_tracker.update(faces)
+            if driver is None or self.face_tracker.driver_changed:
+                # Face lost or another person: don't smooth with their pose
+                self.head_pose_estimator.reset_tracking()
+            if driver is not None and self.face_tracker.driver_changed:
+                # Nor with their EAR, and drop their half-collected calibration
+                self.eye_tracker.reset_tracking()
+                if self.calibrator.calibrating:
+                    self.calibrator.start()
+            if driver is not None:
+                face = faces[driver]
+                points = landmarks_to_array(getattr(face, "landmark", face), self.used_landmarks)
+                pose_data = self.head_pose_estimator.estimate_pose_from_array(points, img_w, img_h)
+                if pose_data:
+                    head_direction = pose_data['direction']
+                    angles = [round(float(a), 1) for a in pose_data['angles']]
+                ear, _, _ = self.eye_tracker.calculate_ear_from_array(points, img_w, img_h)
+                if pose_data:
+                    self.calibrator.update(pose_data['angles'], ear, timestamp)
+            elif self.face_present:
+                FACES_LOST.inc()
+            self.face_present = driver is not None
+
+            self.drowsiness_detector.update_blink(ear, head_direction, timestamp, skipped_frames)
+            self.drowsiness_detector.update_state(head_direction, timestamp)
+            drowsiness_level, _, perclos = self.drowsiness_detector.get_status()
+            blinks = self.drowsiness_detector.blink_status(timestamp)
+            self.scheduler.update_risk(ear, self.drowsiness_detector.ear_threshold, head_direction,
+                                       drowsiness_level, timestamp)
+
+            previous = self.latest_result
+            self.frames_processed += 1
+            self.last_update = time.time()
+            if self.last_timestamp is not None and timestamp > self.last_timestamp:
+                inst_fps = 1.0 / (timestamp - self.last_timestamp)
+                self.fps = inst_fps if not self.fps else self.fps + 0.1 * (inst_fps - self.fps)
+                self._fps_gauge.set(self.fps)
+            self.last_timestamp = timestamp
+            FRAMES_PROCESSED.inc()
+            if self.event_log is not None:
+                self.event_log.telemetry(timestamp, drowsiness_level, head_direction, ear, perclos, angles)
+            self.latest_result = {
+                "stream_id": self.stream_id,
+                "timestamp": timestamp,
+                "drowsiness_level": drowsiness_level,
+                "head_direction": head_direction,
+                "ear": round(ear, 3),
+                "perclos": round(perclos, 3),
+                "angles": angles,
+                "calibrated": self.calibrator.is_calibrated,
+                "faces": len(faces),
+                **blinks,
+            }
+            state_changed = (drowsiness_level != previous["drowsiness_level"]
+                             or head_direction != previous.get("head_direction")
+                             or blinks["microsleep"] != previous.get("microsleep", False))
+            self.channel.publish(self.latest_result, state_changed)
+            result = self.latest_result
+
+        if self.preview.due():
+            self.preview.submit(image, self.draw_overlay)
+        return result
+
+    def draw_overlay(self, frame):
+        """DisplayManager overlay of the latest result (preview frames only)"""
+        # main is only needed once someone watches; keeps it out of service startup
+        from main import DisplayManager
+        result = self.latest_result
+        drowsiness_level, color, perclos = self.drowsiness_detector.get_status()
+        DisplayManager.draw_info(frame, result["head_direction"], result["ear"], drowsiness_level, color,
+                                 self.fps, perclos)
+
+    def stop_capture(self, timeout=5.0):
+        """Stop the capture thread and wait for its frame in progress"""
+        self.running = False
+        thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def close_event_log(self):
+        with self._lock:
+            if self.event_log is not None:
+                self.event_log.close()
+                # A late update (thread that missed the join, /frames request)
+                # must not reopen a segment after close
+                self.event_log = self.drowsiness_detector.event_log = None
+
+    def summary(self):
+        return {
+            "stream_id": self.stream_id,
+            "source": self.source,
+            "calibration": self.calibrator.summary(),
+            "faces": self.face_tracker.summary(),
+            "scheduler": self.scheduler.stats(),
+            "running": self.running,
+            "frames_processed": self.frames_processed,
+            "fps": round(self.fps, 1),
+            "last_result": self.latest_result,
+        }
+
+
+class SessionManager:
+    """Keeps one StreamSession per stream ID on top of a shared worker pool."""
+
+    def __init__(self, max_streams=64, num_workers=None, max_pending=None, profile_store=None,
+                 preview_settings=None, max_faces=1, driver_policy="largest", event_store=None, warm_models=0):
+        self.max_streams = max_streams
+        self.profile_store = profile_store
+        self.preview_settings = preview_settings
+        self.driver_policy = driver_policy
+        self.event_store = event_store
+        self.pool = LandmarkWorkerPool(num_workers=num_workers, max_pending=max_pending, warm=warm_models,
+                                       max_num_faces=max_faces)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stage_enhance = STAGE_SECONDS.labels(stage="enhance")
+        self._stage_inference = STAGE_SECONDS.labels(stage="inference")
+        self._stage_update = STAGE_SECONDS.labels(stage="update")
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, stream_id):
+        return self._sessions.get(stream_id)
+
+    def get_or_create(self, stream_id, source=None, driver_id=None):
+        with self._lock:
+            session = self._sessions.get(stream_id)
+            if session is None:
+                if len(self._sessions) >= self.max_streams:
+                    raise SessionLimitError(
+                        f"Stream limit reached ({self.max_streams}), cannot admit '{stream_id}'")
+                session = StreamSession(stream_id, source, driver_id, self.profile_store, self.preview_settings,
+                                        self.driver_policy, self.event_store)
+                self._sessions[stream_id] = session
+            return session
+
+    def remove(self, stream_id):
+        with self._lock:
+            session = self._sessions.pop(stream_id, None)
+        if session is not None:
+            session.stop_capture()
+            session.channel.close()
+            session.preview.close()
+            session.close_event_log()
+            FPS.remove(stream=stream_id)
+        return session
+
+    def list_sessions(self):
+        return [session.summary() for session in list(self._sessions.values())]
+
+    def start(self, stream_id, source=0, preprocess=None, driver_id=None, enhancer_factory=None):
+        """Start a capture thread for a local camera / URL source.
+
+        `enhancer_factory` builds an EnhancementClient for this stream alone,
+        used instead of a blocking `preprocess`: up to its `max_in_flight`
+        frames are on the wire, and its deadlines and cooldown only ever see
+        this stream's requests. It is closed when the capture thread ends.
+        """
+        session = self.get_or_create(stream_id, source, driver_id)
+        if session.running:
+            return False
+
+        session.source = source
+        session.running = True
+        enhancer = enhancer_factory() if enhancer_factory is not None else None
+        session.thread = threading.Thread(target=self._capture_loop,
+                                          args=(session, preprocess, enhancer), daemon=True)
+        session.thread.start()
+        return True
+
+    def stop(self, stream_id):
+        session = self.get(stream_id)
+        if session is None or not session.running:
+            return False
+        session.running = False
+        return True
+
+    def _infer(self, session, frame, capture_time, skipped, start):
+        """FaceMesh and state update for one (already enhanced) frame;
+        `start` is when its processing began"""
+        enhanced = time.perf_counter()
+        results = self.pool.detect(frame)
+        inferred = time.perf_counter()
+        session.update(frame, results, capture_time, skipped)
+        done = time.perf_counter()
+
+        self._stage_enhance.observe(enhanced - start)
+        self._stage_inference.observe(inferred - enhanced)
+        self._stage_update.observe(done - inferred)
+        session.scheduler.record_latency(done - start)
+
+    def _capture_loop(self, session, preprocess, enhancer=None):
+        cap = cv2.VideoCapture(session.source)
+        scheduler = session.scheduler
+        skipped = 0
+        failed_reads = 0
+        # Cameras may drop a frame; files and URLs fail for good at EOF
+        is_camera = isinstance(session.source, int)
+
+        # Frames waiting for Module 1: (future, raw frame, capture time, skipped, start)
+        pending = deque()
+
+        while session.running and cap.isOpened():
+            success, frame = cap.read()
+            if not success:
+                failed_reads += 1
+                if not is_camera and failed_reads >= MAX_FAILED_READS:
+                    break
+                time.sleep(0.01)
+                continue
+            failed_reads = 0
+            capture_time = time.time()
+
+            # Skipped frames cost neither enhancement nor FaceMesh
+            if not scheduler.should_infer(capture_time):
+                skipped += 1
+                continue
+
+            if enhancer is None:
+                start = time.perf_counter()
+                if preprocess is not None:
+                    frame = preprocess(frame)
+                self._infer(session, frame, capture_time, skipped, start)
+            else:
+                pending.append((enhancer.submit(frame), frame, capture_time, skipped, time.perf_counter()))
+                # Frames are handled in capture order: the oldest as soon as
+                # it is back, or when max_in_flight requests are out
+                while pending and (len(pending) >= enhancer.max_in_flight
+                                   or pending[0][0] is None or pending[0][0].done()):
+                    future, raw, frame_time, frame_skipped, start = pending.popleft()
+                    self._infer(session, enhancer.result(future, raw), frame_time, frame_skipped, start)
+            skipped = 0
+
+        # Source ended: finish the frames still at Module 1
+        while pending and enhancer is not None:
+            future, raw, frame_time, frame_skipped, start = pending.popleft()
+            self._infer(session, enhancer.result(future, raw), frame_time, frame_skipped, start)
+        if enhancer is not None:
+            enhancer.close()
+        cap.release()
+        session.running = False
+
+    def shutdown(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.running = False
+        # Capture threads finish their current frame before anything is closed
+        for session in sessions:
+            session.stop_capture()
+            session.channel.close()
+            session.preview.close()
+            session.close_event_log()
+        self.pool.shutdown()